@@ -3,15 +3,17 @@ from __future__ import annotations
 from custom_components.eforsyning.coordinator import EforsyningUpdateCoordinator
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.const import Platform, EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant
 
-from .const import DOMAIN
+from .const import DOMAIN, API_POOL_SIZE, CONF_HISTORY_YEARS, DEFAULT_HISTORY_YEARS
 
 # The eForsyning integration - not on PyPi, just bundled here.
 # Contrary to:
 # https://developers.home-assistant.io/docs/creating_component_code_review#4-communication-with-devicesservices
-from custom_components.eforsyning.pyeforsyning.eforsyning import Eforsyning
+from custom_components.eforsyning.pyeforsyning.eforsyning import AsyncEforsyning
+from custom_components.eforsyning.pyeforsyning.metadata import EforsyningMetadata
+from .store import EforsyningStore, async_get_ledger_store
 
 # Development help
 import logging
@@ -38,12 +40,37 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     _LOGGER.debug(f"eForsyning ConfigData: {entry.data}")
 
     # Use the coordinator which handles regular fetch of API data.
-    api = Eforsyning(username, password, supplierid, billing_period_skew, is_water_supply)
-    coordinator = EforsyningUpdateCoordinator(hass, api, entry)
+    # The API runs on the event loop and owns a pooled keep-alive session.
+    # The session is closed when the entry is unloaded or Home Assistant stops.
+    # Metadata from the API (API server, installation etc.) is cached between restarts.
+    store = EforsyningStore(hass, entry.entry_id)
+    await store.async_load()
+    # All entries share the request scheduler per API host.  Its ledger of calls is persisted too.
+    ledger_store = await async_get_ledger_store(hass)
+    api = AsyncEforsyning(username, password, supplierid, billing_period_skew, is_water_supply,
+                          pool_size=API_POOL_SIZE,
+                          metadata=EforsyningMetadata.from_dict(store.get("metadata")),
+                          year_totals=store.get("year_totals"),
+                          daily_series=store.get("daily_series"),
+                          history_years=entry.options.get(CONF_HISTORY_YEARS, DEFAULT_HISTORY_YEARS))
+
+    async def _async_close_api(event: Event) -> None:
+        await api.close()
+
+    # The unload callbacks are called without being awaited, so the session is closed in
+    # async_unload_entry().  Only the removal of the stop listener is registered here.
+    entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_close_api))
+
+    coordinator = EforsyningUpdateCoordinator(hass, api, entry, store, ledger_store)
     # If you do not want to retry setup on failure, use
     #await coordinator.async_refresh()
     # This one repeats connecting to the API until first success.
-    await coordinator.async_config_entry_first_refresh()
+    # The entry is not loaded if it fails, so async_unload_entry() will not close the session.
+    try:
+        await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        await api.close()
+        raise
 
     # Add the HomeAssistant specific API to the eForsyning integration.
     # The Sensor entity in the integration will call function here to do its thing.
@@ -53,15 +80,27 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     }
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    # Reload the entry when the options are changed
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
     return True
 
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry to apply changed options."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)["coordinator"]
+        await coordinator.api.close()
 
     return unload_ok
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the stored data of a config entry when it is deleted."""
+    await EforsyningStore(hass, entry.entry_id).async_remove()
+
 async def async_migrate_entry(hass, config_entry: ConfigEntry) -> bool:
     """Handle migration of setup entry data from one version to the next."""
     _LOGGER.info("Migrating from version %s", config_entry.version)
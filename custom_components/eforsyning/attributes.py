@@ -0,0 +1,84 @@
+"""Encoding of the daily data in the sensor attributes.
+
+The attributes are written to the recorder with every state change, so the size of the daily
+data attribute matters.  The attribute mode option selects how it is made:
+  full        - every data point as {"date", "value"}, like it has always been
+  window      - only the data points of the last days
+  downsample  - at most a number of data points picked to keep the shape of the curve (LTTB)
+  compact     - {"start", "values"} with one value per day from the start date
+"""
+from __future__ import annotations
+from datetime import date
+from typing import Any, Sequence
+
+from .const import ATTRIBUTE_MODE_WINDOW, ATTRIBUTE_MODE_DOWNSAMPLE, ATTRIBUTE_MODE_COMPACT
+from .pyeforsyning.series import DailySeries
+
+def build_attribute_data(series: DailySeries, field: str, mode: str, days: int, points: int) -> Any:
+    """The attribute data of a field of the daily data in the given mode."""
+    if mode == ATTRIBUTE_MODE_WINDOW:
+        series = series[-days:]
+    elif mode == ATTRIBUTE_MODE_DOWNSAMPLE and len(series) > points:
+        ordinals = series.ordinals("DateTo")
+        values = series.column(field)
+        return [
+            {"date": series.format_date(ordinals[index]), "value": values[index]}
+            for index in downsample_indices(ordinals, values, points)
+        ]
+    elif mode == ATTRIBUTE_MODE_COMPACT:
+        return compact(series.ordinals("DateTo"), series.column(field))
+
+    return [
+        {"date": date_to, "value": value}
+        for date_to, value in zip(series.dates("DateTo"), series.column(field))
+    ]
+
+def compact(ordinals: Sequence[int], values: Sequence[float]) -> dict[str, Any]:
+    """Values by day from the first date.  A day without a data point gets None."""
+    if not ordinals:
+        return {"start": None, "values": []}
+    first = ordinals[0]
+    if ordinals[-1] - first == len(ordinals) - 1:
+        day_values = list(values)
+    else:
+        day_values = [None] * (ordinals[-1] - first + 1)
+        for ordinal, value in zip(ordinals, values):
+            day_values[ordinal - first] = value
+    return {"start": date.fromordinal(first).isoformat(), "values": day_values}
+
+def downsample_indices(x: Sequence[float], y: Sequence[float], threshold: int) -> list[int]:
+    """Indices of at most threshold points keeping the visual shape of y over x.
+       Largest-Triangle-Three-Buckets (Steinarsson, 2013): the first and last point are kept,
+       from each bucket in between the point making the largest triangle with the point picked
+       in the previous bucket and the average of the next bucket.
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return list(range(length)) if threshold >= length else [0, length - 1][:max(threshold, 0)]
+
+    indices = [0]
+    bucket_size = (length - 2) / (threshold - 2)
+    picked = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        # Average of the next bucket, or the last point for the last bucket
+        if end < next_end:
+            average_x = sum(x[end:next_end]) / (next_end - end)
+            average_y = sum(y[end:next_end]) / (next_end - end)
+        else:
+            average_x, average_y = x[length - 1], y[length - 1]
+
+        point_x, point_y = x[picked], y[picked]
+        largest = -1.0
+        for index in range(start, end):
+            area = abs((point_x - average_x) * (y[index] - point_y)
+                       - (point_x - x[index]) * (average_y - point_y))
+            if area > largest:
+                largest = area
+                picked_in_bucket = index
+        picked = picked_in_bucket
+        indices.append(picked)
+    indices.append(length - 1)
+    return indices
@@ -6,17 +6,20 @@ from typing import Any
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.const import CONF_NAME
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from .const import DEFAULT_NAME, DOMAIN
+from .const import DEFAULT_NAME, DOMAIN, CONF_HISTORY_YEARS, DEFAULT_HISTORY_YEARS
+from .const import CONF_ATTRIBUTE_MODE, ATTRIBUTE_MODES, DEFAULT_ATTRIBUTE_MODE
+from .const import CONF_ATTRIBUTE_DAYS, DEFAULT_ATTRIBUTE_DAYS, CONF_ATTRIBUTE_POINTS, DEFAULT_ATTRIBUTE_POINTS
 
 import logging
 _LOGGER = logging.getLogger(__name__)
 
-from custom_components.eforsyning.pyeforsyning.eforsyning import Eforsyning, LoginFailed, HTTPFailed
+from custom_components.eforsyning.pyeforsyning.eforsyning import AsyncEforsyning, LoginFailed, HTTPFailed
 
 # Username/password are the ones for the website
 # supplierID is found by following the README.md instruction
@@ -37,11 +40,11 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
 
     Data has the keys from STEP_USER_DATA_SCHEMA with values provided by the user.
     """
-    # Returns True or False.  The API is not built for async operation
-    # therefore it is wrapped in an async executor function.
+    # Returns True or False.
     try:
-        api = Eforsyning(data["username"], data["password"], data["supplierid"], data["billing_period_skew"], data["is_water_supply"])
-        await hass.async_add_executor_job(api.authenticate)
+        api = AsyncEforsyning(data["username"], data["password"], data["supplierid"], data["billing_period_skew"], data["is_water_supply"],
+                              session=async_get_clientsession(hass))
+        await api.authenticate()
     except LoginFailed:
         raise InvalidAuth
     except HTTPFailed:
@@ -85,6 +88,36 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
         )
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> config_entries.OptionsFlow:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler(config_entry)
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle the options of an Eforsyning entry."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize options flow."""
+        self._config_entry = config_entry
+
+    async def async_step_init(self, user_input: dict[str, Any] | None = None) -> FlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self._config_entry.options
+        options_schema = vol.Schema(
+            {
+                vol.Required(CONF_HISTORY_YEARS, default=options.get(CONF_HISTORY_YEARS, DEFAULT_HISTORY_YEARS)) : vol.All(vol.Coerce(int), vol.Range(min=0, max=30)),
+                vol.Required(CONF_ATTRIBUTE_MODE, default=options.get(CONF_ATTRIBUTE_MODE, DEFAULT_ATTRIBUTE_MODE)) : vol.In(ATTRIBUTE_MODES),
+                vol.Required(CONF_ATTRIBUTE_DAYS, default=options.get(CONF_ATTRIBUTE_DAYS, DEFAULT_ATTRIBUTE_DAYS)) : vol.All(vol.Coerce(int), vol.Range(min=1, max=366)),
+                vol.Required(CONF_ATTRIBUTE_POINTS, default=options.get(CONF_ATTRIBUTE_POINTS, DEFAULT_ATTRIBUTE_POINTS)) : vol.All(vol.Coerce(int), vol.Range(min=3, max=366)),
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=options_schema)
+
 
 class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect."""
@@ -8,8 +8,10 @@ from homeassistant.components.sensor import SensorDeviceClass
 from homeassistant.const import UnitOfTemperature
 from homeassistant.const import UnitOfEnergy
 from homeassistant.const import UnitOfVolume
+from homeassistant.const import UnitOfTime
+from homeassistant.helpers.entity import EntityCategory
 
-from .model import EforsyningSensorDescription
+from .model import EforsyningSensorDescription, EforsyningStatisticDescription
 
 DOMAIN = "eforsyning"
 
@@ -34,6 +36,48 @@ DEFAULT_NAME = "eForsyning"
 MIN_TIME_BETWEEN_UPDATES = timedelta(hours=6)
 # Smallest appropriate interval.  Only relevant for development use.
 #MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=15)
+FAIR_USE_MIN_INTERVAL = timedelta(minutes=15)
+
+# Adaptive polling (see polling.py).  The coordinator learns when new data is published
+# and polls shortly after.  MIN_TIME_BETWEEN_UPDATES is only used for the first poll.
+# Interval while no publish time has been observed yet
+POLL_LEARNING_INTERVAL = timedelta(hours=1)
+# Poll this long after the expected publish time
+POLL_PUBLISH_MARGIN = timedelta(minutes=15)
+# First interval when data is late, doubled for each poll without new data
+POLL_CATCH_UP_INTERVAL = timedelta(minutes=30)
+POLL_CATCH_UP_MAX_INTERVAL = MIN_TIME_BETWEEN_UPDATES
+POLL_MAX_INTERVAL = timedelta(hours=25)
+# Number of observed publish times used for the estimate
+POLL_OBSERVATIONS = 7
+
+# Number of pooled keep-alive connections each config entry keeps to the API servers.
+API_POOL_SIZE = 4
+
+# Options: number of past billing years to show on the year-to-date sensor attributes
+CONF_HISTORY_YEARS = "history_years"
+DEFAULT_HISTORY_YEARS = 5
+# Options: how the daily data is put in the sensor attributes (see attributes.py)
+CONF_ATTRIBUTE_MODE = "attribute_mode"
+ATTRIBUTE_MODE_FULL = "full"
+ATTRIBUTE_MODE_WINDOW = "window"
+ATTRIBUTE_MODE_DOWNSAMPLE = "downsample"
+ATTRIBUTE_MODE_COMPACT = "compact"
+ATTRIBUTE_MODES = [ATTRIBUTE_MODE_FULL, ATTRIBUTE_MODE_WINDOW, ATTRIBUTE_MODE_DOWNSAMPLE, ATTRIBUTE_MODE_COMPACT]
+DEFAULT_ATTRIBUTE_MODE = ATTRIBUTE_MODE_FULL
+# Number of days in the window mode, and max. number of data points in the downsample mode
+CONF_ATTRIBUTE_DAYS = "attribute_days"
+DEFAULT_ATTRIBUTE_DAYS = 31
+CONF_ATTRIBUTE_POINTS = "attribute_points"
+DEFAULT_ATTRIBUTE_POINTS = 60
+
+# Storage of data kept between restarts (like the cached API metadata)
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+# Large sections kept in a store file of their own, so saving the other sections does not write them again
+STORAGE_SEPARATE_SECTIONS = ("daily_series",)
+# Key of the request ledger shared by all entries (in storage and hass.data)
+LEDGER_STORE = "ledger"
 
 # Sensors:
 # NOTE: For ALL sensors it is NOT the current day number which is received.
@@ -358,3 +402,125 @@ BILLING_SENSOR_TYPES: Final[tuple[EforsyningSensorDescription, ...]] = (
         attribute_data = None # This one has a separate data entry with attributes.
     ),
 )
+
+# Diagnostic sensors of the API calls, one set per config entry.  The key is that of the
+# metrics summary (see pyeforsyning/metrics.py), attribute_data another key of it shown as attribute.
+DIAGNOSTIC_SENSOR_TYPES: Final[tuple[EforsyningSensorDescription, ...]] = (
+    EforsyningSensorDescription(
+        key = "requests",
+        name = "API requests",
+        entity_registry_enabled_default = True,
+        entity_category = EntityCategory.DIAGNOSTIC,
+        icon = "mdi:api",
+        state_class = SensorStateClass.TOTAL_INCREASING,
+        attribute_data = "endpoints"
+    ),
+    EforsyningSensorDescription(
+        key = "failed_requests",
+        name = "API failed requests",
+        entity_registry_enabled_default = True,
+        entity_category = EntityCategory.DIAGNOSTIC,
+        icon = "mdi:api-off",
+        state_class = SensorStateClass.TOTAL_INCREASING,
+        attribute_data = None
+    ),
+    EforsyningSensorDescription(
+        key = "mean_latency_ms",
+        name = "API latency",
+        entity_registry_enabled_default = True,
+        entity_category = EntityCategory.DIAGNOSTIC,
+        native_unit_of_measurement = UnitOfTime.MILLISECONDS,
+        device_class = SensorDeviceClass.DURATION,
+        icon = "mdi:timer-outline",
+        state_class = SensorStateClass.MEASUREMENT,
+        attribute_data = None
+    ),
+    EforsyningSensorDescription(
+        key = "response_bytes",
+        name = "API response size",
+        entity_registry_enabled_default = False,
+        entity_category = EntityCategory.DIAGNOSTIC,
+        native_unit_of_measurement = "B",
+        icon = "mdi:download-network",
+        state_class = SensorStateClass.TOTAL_INCREASING,
+        attribute_data = None
+    ),
+    EforsyningSensorDescription(
+        key = "failed_logins",
+        name = "Failed logins",
+        entity_registry_enabled_default = True,
+        entity_category = EntityCategory.DIAGNOSTIC,
+        icon = "mdi:account-alert",
+        state_class = SensorStateClass.TOTAL_INCREASING,
+        attribute_data = None
+    ),
+    EforsyningSensorDescription(
+        key = "last_update_seconds",
+        name = "Update duration",
+        entity_registry_enabled_default = True,
+        entity_category = EntityCategory.DIAGNOSTIC,
+        native_unit_of_measurement = UnitOfTime.SECONDS,
+        device_class = SensorDeviceClass.DURATION,
+        icon = "mdi:timer-sand",
+        state_class = SensorStateClass.MEASUREMENT,
+        attribute_data = "parse_ms"
+    ),
+    EforsyningSensorDescription(
+        key = "last_update_requests",
+        name = "Update requests",
+        entity_registry_enabled_default = False,
+        entity_category = EntityCategory.DIAGNOSTIC,
+        icon = "mdi:counter",
+        state_class = SensorStateClass.MEASUREMENT,
+        attribute_data = None
+    ),
+)
+
+# Long-term statistics imported from the daily data (see statistics.py).
+# On first setup the history is fetched from the move-in year, this many billing years per update.
+STATISTICS_BACKFILL_YEARS = 3
+
+HEATING_STATISTICS: Final[tuple[EforsyningStatisticDescription, ...]] = (
+    EforsyningStatisticDescription(
+        key = "energy",
+        name = "Energy",
+        field = "kWh-Used",
+        unit = UnitOfEnergy.KILO_WATT_HOUR,
+        state_field = "kWh-End",
+    ),
+    EforsyningStatisticDescription(
+        key = "water",
+        name = "Water",
+        field = "M3-Used",
+        unit = UnitOfVolume.CUBIC_METERS,
+        state_field = "M3-End",
+    ),
+    EforsyningStatisticDescription(
+        key = "temp_forward",
+        name = "Water temperature forward",
+        field = "Temp-Forward",
+        unit = UnitOfTemperature.CELSIUS,
+    ),
+    EforsyningStatisticDescription(
+        key = "temp_return",
+        name = "Water temperature return",
+        field = "Temp-Return",
+        unit = UnitOfTemperature.CELSIUS,
+    ),
+    EforsyningStatisticDescription(
+        key = "temp_cooling",
+        name = "Water temperature cooling",
+        field = "Temp-Cooling",
+        unit = UnitOfTemperature.CELSIUS,
+    ),
+)
+
+WATER_STATISTICS: Final[tuple[EforsyningStatisticDescription, ...]] = (
+    EforsyningStatisticDescription(
+        key = "water",
+        name = "Water",
+        field = "Used",
+        unit = UnitOfVolume.CUBIC_METERS,
+        state_field = "End",
+    ),
+)
@@ -1,16 +1,26 @@
 """DataUpdateCoordinator for Novafos."""
 from __future__ import annotations
+from typing import Any
 
-from custom_components.eforsyning.pyeforsyning.eforsyning import Eforsyning
+from custom_components.eforsyning.pyeforsyning.eforsyning import AsyncEforsyning
 from .sensor import EforsyningSensor
+from .store import EforsyningStore
+from .polling import PublishTimeEstimator
+from .statistics import EforsyningStatistics
+from .attributes import build_attribute_data
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
 
-from .const import MIN_TIME_BETWEEN_UPDATES
+from .const import MIN_TIME_BETWEEN_UPDATES, STORAGE_SAVE_DELAY
+from .const import CONF_ATTRIBUTE_MODE, DEFAULT_ATTRIBUTE_MODE, CONF_ATTRIBUTE_DAYS, DEFAULT_ATTRIBUTE_DAYS
+from .const import CONF_ATTRIBUTE_POINTS, DEFAULT_ATTRIBUTE_POINTS
+from .pyeforsyning.scheduler import ledgers
 
 import logging
 _LOGGER = logging.getLogger(__name__)
@@ -20,13 +30,29 @@ class EforsyningUpdateCoordinator(DataUpdateCoordinator):
     def __init__(
         self,
         hass: HomeAssistant,
-        api: Eforsyning,
+        api: AsyncEforsyning,
         entry: ConfigEntry,
+        store: EforsyningStore,
+        ledger_store: Store,
     ) -> None:
         """Initialize DataUpdateCoordinator"""
         self.api = api
+        self.store = store
+        self.ledger_store = ledger_store
+        self.polling = PublishTimeEstimator(store.get("polling"))
+        self.entry = entry
+        # Statistics import by installation, created when the installations are known
+        self.statistics: dict[str, EforsyningStatistics] = {}
         self.hass = hass
         self.supplierid = entry.data['supplierid']
+        # Attribute series of the daily data by installation and field, see attribute_series()
+        self._attribute_series: dict[str, tuple[Any, dict[str, Any]]] = {}
+        self._attribute_mode = entry.options.get(CONF_ATTRIBUTE_MODE, DEFAULT_ATTRIBUTE_MODE)
+        self._attribute_days = entry.options.get(CONF_ATTRIBUTE_DAYS, DEFAULT_ATTRIBUTE_DAYS)
+        self._attribute_points = entry.options.get(CONF_ATTRIBUTE_POINTS, DEFAULT_ATTRIBUTE_POINTS)
+        # Revisions of the API data in the store, see AsyncEforsyning.revisions.  The API object
+        # starts from the stored data, so that is its first revision.
+        self._stored_revisions = api.revisions
         
         super().__init__(
             hass,
@@ -36,11 +62,27 @@ class EforsyningUpdateCoordinator(DataUpdateCoordinator):
         )
 
     async def _async_update_data(self):
-        """Get the data for eForsyning."""
+        """Get the data for eForsyning.
+           The requests and parsing of the update, login included, are traced for the diagnostics.
+        """
+        self.api.start_trace()
+        data = None
         try:
-            if not await self.hass.async_add_executor_job(self.api.authenticate):
+            data = await self._async_fetch_data()
+            return data
+        finally:
+            self.api.finish_trace(bool(data) and all(installation_data is not None
+                                                     for installation_data in data.values()))
+
+    async def _async_fetch_data(self):
+        """Login if needed and get the latest data of all installations."""
+        # The access token is kept between updates.  The API object logs in again by itself
+        # if the token is rejected, so only login here when there is no token yet.
+        try:
+            if not self.api.is_authenticated and not await self.api.authenticate():
                 raise InvalidAuth
         except InvalidAuth as error:
+            self.update_interval = self.polling.failed()
             return False
             # That one requires the config step to have a reauth step
             # https://developers.home-assistant.io/docs/config_entries_config_flow_handler/
@@ -48,15 +90,78 @@ class EforsyningUpdateCoordinator(DataUpdateCoordinator):
         except:
             _LOGGER.error(f"Some error occurred!")
 
-        # Retrieve latest data from the API
+        # Retrieve latest data of all installations of the account from the API.
+        # The data is keyed by installation, the first one is the default installation.
         try:
-            data = await self.hass.async_add_executor_job(self.api.get_latest)
+            data = await self.api.get_latest_all()
         except Exception as error:
-            raise ConfigEntryNotReady from error
+            # Do not wait for the interval planned after the last good poll
+            self.update_interval = self.polling.failed()
+            _LOGGER.debug(f"Update failed, next try in {self.update_interval}")
+            raise UpdateFailed(f"Error getting data from eForsyning: {error}") from error
+
+        # Keep the (possibly refreshed) API metadata, closed year totals and daily series for the next restart.
+        # Only what changed is written.  The daily series is the large one and most updates add
+        # one day or nothing.
+        metadata = self.api.metadata.to_dict()
+        if metadata != self.store.get("metadata"):
+            self.store.set("metadata", metadata)
+        revisions = self.api.revisions
+        if revisions["year_totals"] != self._stored_revisions["year_totals"]:
+            self.store.set("year_totals", self.api.year_totals)
+        if revisions["daily_series"] != self._stored_revisions["daily_series"]:
+            self.store.set("daily_series", self.api.daily_series)
+        self._stored_revisions = revisions
+        self.ledger_store.async_delay_save(ledgers, STORAGE_SAVE_DELAY)
+
+        # Import the new daily data into the long-term statistics.  Not being able to is no reason
+        # to fail the update, it is tried again on the next one.
+        for index, (installation, installation_data) in enumerate(data.items()):
+            statistics = self.statistics.get(installation)
+            if statistics is None:
+                statistics = self.statistics[installation] = EforsyningStatistics(
+                    self.hass, self.entry, self.store, installation, default=index == 0)
+            try:
+                await statistics.async_update(self.api, installation_data)
+            except Exception as error:
+                _LOGGER.warning(f"Importing statistics of installation {installation} failed: {error}")
+        _LOGGER.debug(f"API budget usage: {self.api.scheduler_usage()}")
+        _LOGGER.debug(f"API response decoding: {self.api.decode_stats}")
+        _LOGGER.debug(f"API metrics: {self.api.metrics.summary()}")
+
+        # Plan the next poll shortly after the supplier is expected to publish new data.
+        # The data of all installations is published together, so follow the first one with data.
+        latest = next((installation_data for installation_data in data.values()
+                       if installation_data and installation_data.get("data")), None)
+        if latest:
+            now = dt_util.now()
+            self.polling.observe(latest["data"][-1]["DateTo"], now)
+            self.update_interval = self.polling.next_interval(now)
+            self.store.set("polling", self.polling.as_dict())
+            _LOGGER.debug(f"Next update in {self.update_interval}")
 
         # Return the data
         # The data is stored in the coordinator as a .data field.
         return data
 
+    def attribute_series(self, installation: str, field: str) -> Any:
+        """A field of the daily data of an installation for the sensor attributes, encoded as set by
+           the attribute mode option.  Each series is built once per update and shared by all sensors
+           using it, so it must not be modified.
+        """
+        installation_data = self.data.get(installation) if self.data else None
+        data_points = installation_data["data"] if installation_data else None
+        source, built = self._attribute_series.get(installation, (None, {}))
+        if data_points is not source:
+            built = {}
+            self._attribute_series[installation] = (data_points, built)
+        if data_points is None:
+            return []
+        series = built.get(field)
+        if series is None:
+            series = built[field] = build_attribute_data(data_points, field, self._attribute_mode,
+                                                         self._attribute_days, self._attribute_points)
+        return series
+
 class InvalidAuth(HomeAssistantError):
     """Error to indicate there is invalid auth."""
@@ -0,0 +1,84 @@
+"""Diagnostics support for Eforsyning.
+
+The download holds the last update traces of the config entry: every request of the login and
+the data calls with start offset, duration, status and size, and the time spent parsing each section.
+The sizes of the sections of the coordinator data and of the sensor attributes are only measured
+when the diagnostics are downloaded.  They are those of the last good update, so they are added
+to its trace.
+"""
+from __future__ import annotations
+import json
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.json import JSONEncoder
+
+from .const import DOMAIN
+
+# Credentials, tokens and what identifies the consumer
+TO_REDACT = {"username", "password", "user_id", "meter_id", "address", "token", "access_token"}
+
+def _json_size(value: Any) -> int:
+    return len(json.dumps(value, cls=JSONEncoder).encode())
+
+def section_sizes(data: dict[str, Any] | None) -> dict[str, Any]:
+    """Sizes of the sections of the coordinator data by installation.
+       The daily data has its number of days and size, the other sections their size as JSON.
+       The single values are only counted.
+    """
+    sizes: dict[str, Any] = {}
+    for installation, installation_data in (data or {}).items():
+        if not installation_data:
+            sizes[installation] = None
+            continue
+        installation_sizes: dict[str, Any] = {"values": 0}
+        for key, value in installation_data.items():
+            if key == "data":
+                installation_sizes[key] = {"days": len(value), "bytes": _json_size(value.as_dict())}
+            elif isinstance(value, (dict, list)):
+                installation_sizes[key] = {"bytes": _json_size(value)}
+            else:
+                installation_sizes["values"] += 1
+        sizes[installation] = installation_sizes
+    return sizes
+
+def _attribute_sizes(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, int | None]:
+    """Size of the attributes of each sensor of the entry, as stored by the recorder."""
+    sizes: dict[str, int | None] = {}
+    for registry_entry in er.async_entries_for_config_entry(er.async_get(hass), entry.entry_id):
+        state = hass.states.get(registry_entry.entity_id)
+        sizes[registry_entry.entity_id] = None if state is None else _json_size(dict(state.attributes))
+    return sizes
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    api = coordinator.api
+
+    traces = [dict(trace) for trace in api.traces]
+    last_good = next((trace for trace in reversed(traces) if trace["ok"]), None)
+    if last_good is not None:
+        last_good["data_sizes"] = section_sizes(coordinator.data)
+        last_good["attribute_sizes"] = _attribute_sizes(hass, entry)
+
+    return async_redact_data(
+        {
+            "entry": {
+                "title": entry.title,
+                "data": dict(entry.data),
+                "options": dict(entry.options),
+            },
+            "metadata": api.metadata.to_dict(),
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": str(coordinator.update_interval),
+            "token_stats": api.token_stats,
+            "connections": api.connection_stats,
+            "scheduler": api.scheduler_usage(),
+            "metrics": api.metrics.summary(),
+            "traces": traces,
+        },
+        TO_REDACT,
+    )
@@ -26,3 +26,19 @@ class EforsyningSensorDescription(SensorEntityDescription):
     attribute_data: str | None = None
 
 
+@dataclass
+class EforsyningStatisticDescription:
+    """Class describing a long-term statistic imported from the daily data.
+
+         key         - suffix of the statistic id
+         name        - suffix of the statistic name
+         field       - field of the daily data points
+         unit        - unit of measurement
+         state_field - meter reading field.  If set, the statistic has a sum of the field values,
+                       otherwise it has a mean (like temperatures).
+    """
+    key: str
+    name: str
+    field: str
+    unit: str
+    state_field: str | None = None
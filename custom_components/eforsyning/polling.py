@@ -0,0 +1,114 @@
+"""Adaptive polling for the Eforsyning integration.
+
+The dataset is updated once every morning, but the time differs between suppliers.
+The estimator learns the time of day new data is published from the polls where the
+latest DateTo changed, and plans the next poll close to that time.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from statistics import median
+from typing import Any
+
+from .const import (
+    FAIR_USE_MIN_INTERVAL,
+    POLL_LEARNING_INTERVAL,
+    POLL_CATCH_UP_INTERVAL,
+    POLL_CATCH_UP_MAX_INTERVAL,
+    POLL_MAX_INTERVAL,
+    POLL_PUBLISH_MARGIN,
+    POLL_OBSERVATIONS,
+)
+
+class PublishTimeEstimator:
+    """Estimate the publish time of new data and plan the next poll.
+
+       observations   - minutes after midnight new data was seen published
+       last_date_to   - the latest DateTo seen
+       last_poll      - time of the latest poll
+       last_change    - time of the poll where DateTo last changed
+       overdue_polls  - polls after the expected publish time without new data
+       failed_polls   - failed polls in a row.  Not persisted, a restart polls right away anyway.
+    """
+    def __init__(self, data: dict[str, Any] | None = None) -> None:
+        data = data or {}
+        self._observations: list[int] = data.get("observations", [])
+        self._last_date_to: str | None = data.get("last_date_to")
+        self._last_poll = _parse_time(data.get("last_poll"))
+        self._last_change = _parse_time(data.get("last_change"))
+        self._overdue_polls: int = data.get("overdue_polls", 0)
+        self._failed_polls = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "observations": self._observations,
+            "last_date_to": self._last_date_to,
+            "last_poll": self._last_poll.isoformat() if self._last_poll else None,
+            "last_change": self._last_change.isoformat() if self._last_change else None,
+            "overdue_polls": self._overdue_polls,
+        }
+
+    def observe(self, date_to: str | None, now: datetime) -> None:
+        """Register the latest DateTo seen by a poll at the time now."""
+        if date_to is None:
+            return
+        self._failed_polls = 0
+        if date_to != self._last_date_to:
+            if self._last_date_to is not None and self._last_poll is not None:
+                if self._last_poll >= _midnight(now):
+                    # Data was published between the previous poll and now.  Use the middle.
+                    published = self._last_poll + (now - self._last_poll) / 2
+                    self._add_observation(published)
+                else:
+                    # Only known to be published before now.  Guess a bit earlier, so the
+                    # estimate moves earlier until a poll finds no data and brackets it again.
+                    self._add_observation(max(now - 2 * POLL_PUBLISH_MARGIN, _midnight(now)))
+            self._last_date_to = date_to
+            self._last_change = now
+            self._overdue_polls = 0
+        else:
+            publish_time = self.publish_time(now)
+            if publish_time is not None and now >= publish_time:
+                self._overdue_polls += 1
+        self._last_poll = now
+
+    def _add_observation(self, published: datetime) -> None:
+        self._observations.append(int((published - _midnight(published)).total_seconds() // 60))
+        del self._observations[:-POLL_OBSERVATIONS]
+
+    def publish_time(self, now: datetime) -> datetime | None:
+        """The expected publish time on the day of now, or None while still learning."""
+        if not self._observations:
+            return None
+        return _midnight(now) + timedelta(minutes=median(self._observations))
+
+    def next_interval(self, now: datetime) -> timedelta:
+        """Time until the next poll."""
+        publish_time = self.publish_time(now)
+        if publish_time is None:
+            interval = POLL_LEARNING_INTERVAL
+        elif self._last_change is not None and self._last_change >= _midnight(now):
+            # Today's data has arrived - wait for tomorrow's
+            interval = publish_time + timedelta(days=1) + POLL_PUBLISH_MARGIN - now
+        elif now < publish_time + POLL_PUBLISH_MARGIN:
+            interval = publish_time + POLL_PUBLISH_MARGIN - now
+        else:
+            # Data is late.  Poll again, backing off each time nothing new arrived.
+            interval = min(POLL_CATCH_UP_INTERVAL * 2 ** min(max(self._overdue_polls - 1, 0), 8), POLL_CATCH_UP_MAX_INTERVAL)
+
+        return min(max(interval, FAIR_USE_MIN_INTERVAL), POLL_MAX_INTERVAL)
+
+    def failed(self) -> timedelta:
+        """Register a failed poll and return the time until the next try.
+           The interval planned after the last good poll may be most of a day, so a failed poll
+           is retried at the catch-up interval instead, backing off for each failure in a row.
+        """
+        self._failed_polls += 1
+        interval = POLL_CATCH_UP_INTERVAL * 2 ** min(self._failed_polls - 1, 8)
+        return min(max(interval, FAIR_USE_MIN_INTERVAL), POLL_CATCH_UP_MAX_INTERVAL)
+
+def _midnight(time: datetime) -> datetime:
+    return time.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _parse_time(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
@@ -1,6 +1,6 @@
 '''
 Init file for pyeforsyning
 '''
-from .eforsyning import Eforsyning
+from .eforsyning import AsyncEforsyning, Eforsyning
 
 __version__ = '1.0.0'
@@ -1,9 +1,35 @@
 '''
 Main for pyeforsyning
+
+Fetch the latest data of many accounts:
+  python -m pyeforsyning --accounts accounts.csv [--output results.jsonl] [--concurrency 8] [--metrics FILE]
+
+The accounts file is CSV with a header, or JSON (a list of objects), with the fields:
+  username, password, supplierid, is_water_supply (true/false), billing_period_skew (optional)
+One JSON Lines record is written per account, and the throughput and latency percentiles
+are printed at the end.  With --metrics the request, login and parse metrics of all accounts
+together are written to a file in the OpenMetrics text format.
 '''
 import argparse
+import asyncio
+import csv
+import json
 import logging
-from . import Eforsyning
+import sys
+import time
+
+import aiohttp
+
+from . import scheduler
+from .eforsyning import AsyncEforsyning, DEFAULT_BASE_URL
+from .metrics import EforsyningMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+# Values of the boolean account fields read as true
+TRUE_VALUES = ("1", "true", "yes", "y", "water")
+
+LATENCY_PERCENTILES = (50, 90, 95, 99)
 
 def main():
     '''
@@ -11,32 +37,161 @@ def main():
     '''
     parser = argparse.ArgumentParser("pyeforsyning")
     parser.add_argument("--log", action="store", required=False)
-    parser.add_argument("--refresh-token", action="store", required=True)
-    parser.add_argument('--metering-point', action='store', required=True)
+    parser.add_argument("--accounts", action="store", required=True,
+                        help="CSV or JSON file of accounts")
+    parser.add_argument("--output", action="store", default="-",
+                        help="JSON Lines file of the results, - for stdout")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Max. number of accounts fetched at the same time")
+    parser.add_argument("--per-host", type=int, default=8,
+                        help="Max. number of connections to each API host")
+    parser.add_argument("--rate", type=float, default=scheduler.DEFAULT_RATE,
+                        help="Requests per second to each API host")
+    parser.add_argument("--burst", type=int, default=scheduler.DEFAULT_BURST,
+                        help="Requests to each API host allowed in a burst")
+    parser.add_argument("--daily-budget", type=int, default=scheduler.DEFAULT_DAILY_BUDGET,
+                        help="Calls per API host per day before warning")
+    parser.add_argument("--daily", action="store_true",
+                        help="Include the daily data points in the records")
+    parser.add_argument("--base-url", action="store", default=DEFAULT_BASE_URL,
+                        help="Base URL of eforsyning.dk, like that of python -m pyeforsyning.fakeserver")
+    parser.add_argument("--metrics", action="store",
+                        help="Write the metrics of all accounts to this file in the OpenMetrics text format")
 
     args = parser.parse_args()
 
     _configureLogging(args)
 
-    result = Eforsyning(args.refresh_token).get_latest(args.metering_point)
-    if result.status == 200:
-        total = 0
-        _LOGGER.debug(f"Date: {result.data_date}")
-        for hour in range(24):
-            data = result.get_metering_data(hour)
-            total += data
-            _LOGGER.debug(f"Hour {hour}-{hour+1}: {data} MWh")
+    accounts = read_accounts(args.accounts)
+    scheduler.configure(rate=args.rate, burst=args.burst, daily_budget=args.daily_budget)
+    metrics = EforsyningMetrics()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        latencies, failures, elapsed = asyncio.run(fetch_accounts(accounts, output, args, metrics))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print_summary(latencies, failures, elapsed)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as file:
+            file.write(metrics.openmetrics())
+
+def read_accounts(path):
+    '''
+    Read the accounts from a CSV or JSON file.
+    '''
+    with open(path, encoding="utf-8") as file:
+        if path.lower().endswith(".json"):
+            rows = json.load(file)
+        else:
+            rows = list(csv.DictReader(file))
+    accounts = []
+    for row in rows:
+        accounts.append({
+            "username": str(row["username"]).strip(),
+            "password": str(row["password"]),
+            "supplierid": str(row["supplierid"]).strip(),
+            "is_water_supply": _flag(row.get("is_water_supply")),
+            "billing_period_skew": _flag(row.get("billing_period_skew")),
+        })
+    return accounts
 
-        _LOGGER.debug(f"Total: {total} MWh")
-    else:
-        _LOGGER.debug(f"Error getting data. Status: {result.status}. Error: {result.detailed_status}")
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+async def fetch_accounts(accounts, output, args, metrics=None):
+    '''
+    Authenticate and get the latest data of all accounts, at most args.concurrency at a time.
+    All accounts share one session limited to args.per_host connections per host, and the
+    process wide scheduler spreads out the requests to each API host.
+    The accounts record into metrics if given.
+    Returns the latencies of the successful accounts, the number of failed ones and the elapsed time.
+    '''
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+    connector = aiohttp.TCPConnector(limit_per_host=args.per_host, ttl_dns_cache=300)
+    # The accounts must not share cookies
+    async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar()) as session:
+        async def fetch(account):
+            async with semaphore:
+                return await fetch_account(account, session, args.daily, args.base_url, metrics)
+
+        start = time.monotonic()
+        for task in asyncio.as_completed([fetch(account) for account in accounts]):
+            record = await task
+            output.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            if record["ok"]:
+                latencies.append(record["seconds"])
+            else:
+                failures += 1
+        elapsed = time.monotonic() - start
+    return latencies, failures, elapsed
+
+async def fetch_account(account, session, include_daily=False, base_url=DEFAULT_BASE_URL, metrics=None):
+    '''
+    Authenticate and get the latest data of all installations of one account as a result record.
+    '''
+    api = AsyncEforsyning(account["username"], account["password"], account["supplierid"],
+                          account["billing_period_skew"], account["is_water_supply"], session=session,
+                          base_url=base_url, metrics=metrics)
+    record = {"username": account["username"], "supplierid": account["supplierid"], "ok": False, "error": None}
+    start = time.monotonic()
+    try:
+        if not await api.authenticate():
+            record["error"] = "Login failed"
+        else:
+            installations = await api.get_latest_all()
+            record["installations"] = {key: _installation_record(data, include_daily)
+                                       for key, data in installations.items()}
+            record["ok"] = all(data is not None for data in installations.values())
+            if not record["ok"]:
+                record["error"] = "No data"
+    except Exception as err:
+        _LOGGER.debug(f"Fetching {account['username']} failed", exc_info=True)
+        record["error"] = f"{type(err).__name__}: {err}"
+    finally:
+        await api.close()
+    record["seconds"] = round(time.monotonic() - start, 3)
+    return record
+
+def _installation_record(data, include_daily):
+    if data is None:
+        return None
+    record = {key: value for key, value in data.items() if key != "data"}
+    record["days"] = len(data["data"])
+    if include_daily:
+        record["data"] = data["data"].to_rows()
+    return record
+
+def percentile(values, percent):
+    '''
+    Nearest-rank percentile of sorted values.
+    '''
+    if not values:
+        return None
+    rank = max(1, -(-percent * len(values) // 100))
+    return values[int(rank) - 1]
+
+def print_summary(latencies, failures, elapsed):
+    latencies = sorted(latencies)
+    total = len(latencies) + failures
+    print(f"{total} accounts, {failures} failed, in {elapsed:.1f} s: "
+          f"{total / elapsed if elapsed else 0.0:.2f} accounts/s", file=sys.stderr)
+    if latencies:
+        percentiles = ", ".join(f"p{percent} {percentile(latencies, percent):.2f} s" for percent in LATENCY_PERCENTILES)
+        print(f"Latency: {percentiles}, max {latencies[-1]:.2f} s", file=sys.stderr)
+    for host, usage in scheduler.usage().items():
+        print(f"{host}: {usage}", file=sys.stderr)
 
 def _configureLogging(args):
     if args.log:
         numeric_level = getattr(logging, args.log.upper(), None)
         if not isinstance(numeric_level, int):
             raise ValueError('Invalid log level: %s' % args.log)
-        
+
         logging.basicConfig(level=numeric_level)
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+'''
+Benchmark of the parsers of the API responses.
+
+Run with: python -m pyeforsyning.benchmark [--repeat N] [--baseline FILE] [--save-baseline FILE] [--threshold 0.25]
+
+Each parser is run on synthetic responses (see synthetic.py) with daily lines of a week, a full
+year and ten years.  The time and the memory allocated per daily line (row) are reported:
+  us/row     - best time of the repeats
+  peak B/row - peak memory allocated while parsing, traced by tracemalloc
+  kept B/row - memory still held by the result afterwards
+The totals line and billing parsers take one response of a fixed size, so a row is one response.
+
+With --save-baseline the results are written to a JSON file.  With --baseline the results are
+compared to such a file, and the exit status is 1 if a case is slower, or allocates more, than the
+baseline by more than the threshold.  The times are compared relative to a reference workload run
+along with the cases, which evens out the speed of the machine drifting between runs.
+
+python -m pyeforsyning.benchmark --decoders [--years N] compares the column decoders of decoders.py
+to decoding one value at a time.
+'''
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+
+from .decoders import decode_number, decode_numbers, decode_dates
+from .eforsyning import (AsyncEforsyning, _DailySeriesSync, HEATING_SERIES_FIELDS, STREAM_BATCH_LINES,
+                         STREAM_CHUNK_SIZE)
+from .responses import decode_json
+from .series import DATE_FORMAT_DAY
+from .streaming import JSONArrayStream
+from .synthetic import (synthetic_billing_result, synthetic_heating_result, synthetic_water_result,
+                        synthetic_year_result)
+
+# Number of daily lines of the payload sizes
+PAYLOAD_SIZES = {"week": 7, "year": 365, "ten-years": 3650}
+
+# Each timing runs a case this many rows at least, so the small payloads are timed precisely
+MIN_ROWS_PER_TIMING = 3650
+
+DEFAULT_THRESHOLD = 0.25
+
+# Name of the fixed workload the times are compared relative to
+REFERENCE_CASE = "reference"
+
+BASELINE_VERSION = 1
+
+# Fields of a daily line holding Danish formatted numbers
+LINE_NUMBER_FIELDS = ("Tempfrem", "TempRetur", "Forv_Retur", "Afkoling",
+                      "ForventetForbrugM3", "ForventetAflaesningM3",
+                      "ForventetForbrugENG1", "ForventetAflaesningENG1")
+
+def decode_number_replace(text, filter_above=None, scale=1):
+    '''
+    The number decoding as it was before decoders.py, for comparison.
+    '''
+    if text == "":
+        return 0.0
+    value = float(text.replace('.','').replace(',', '.'))
+    if filter_above and value > filter_above:
+        return 0.0
+    return round(value*scale, 3)
+
+def _columns(result):
+    lines = result["ForbrugsLinjer"]["TForbrugsLinje"]
+    columns = [[line[field] for line in lines] for field in LINE_NUMBER_FIELDS]
+    for index in range(2):
+        for field in ("Start", "Slut", "Forbrug"):
+            columns.append([line["TForbrugsTaellevaerk"][index][field] for line in lines])
+    return columns
+
+def _best(function, repeat, number=1):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+def _parse_streamed(api, body):
+    '''
+    Parse a heating response the way it is fetched: decoded while it arrives in chunks.
+    '''
+    sync = _DailySeriesSync(None, api._parse_heating_lines, HEATING_SERIES_FIELDS, DATE_FORMAT_DAY)
+    consumer = JSONArrayStream("TForbrugsLinje", sync.add_lines, STREAM_BATCH_LINES)
+    for start in range(0, len(body), STREAM_CHUNK_SIZE):
+        consumer.feed(body[start:start + STREAM_CHUNK_SIZE])
+    return api._parse_result_heating(decode_json("getforbrug", consumer.close()), sync=sync)
+
+def parser_cases():
+    '''
+    The benchmark cases: {name: (rows, function)}.
+    '''
+    api = AsyncEforsyning("", "", "", False, False)
+    cases = {}
+    for size, days in PAYLOAD_SIZES.items():
+        heating = synthetic_heating_result(days)
+        water = synthetic_water_result(days)
+        body = json.dumps(heating).encode()
+        texts = [text for column in _columns(heating) for text in column]
+        # The steady state of an update: the lines synced into the series last time are not parsed again
+        series = {}
+        api._parse_result_heating(heating, series)
+        cases[f"heating/{size}"] = (days, lambda heating=heating: api._parse_result_heating(heating))
+        cases[f"heating-streamed/{size}"] = (days, lambda body=body: _parse_streamed(api, body))
+        cases[f"heating-resumed/{size}"] = (days, lambda heating=heating, series=series:
+                                            api._parse_result_heating(heating, series))
+        cases[f"water/{size}"] = (days, lambda water=water: api._parse_result_water(water))
+        cases[f"stof/{size}"] = (days, lambda texts=texts: [api._stof(text) for text in texts])
+    year = synthetic_heating_result(PAYLOAD_SIZES["year"])
+    totals = synthetic_year_result(year)
+    cases["totals-line"] = (1, lambda: api._parse_result_totals_line(totals))
+    for layout in ("mwh", "gj"):
+        billing = synthetic_billing_result(year, layout)
+        cases[f"billing-{layout}"] = (1, lambda billing=billing: api._parse_result_billing(billing))
+    return cases
+
+def _allocations(function):
+    '''
+    Peak bytes allocated while running function, and bytes still held by its result.
+    '''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak - before, current - before
+
+def reference_case():
+    '''
+    A fixed workload timed along with the cases, see compare().
+    '''
+    texts = [text for column in _columns(synthetic_heating_result(PAYLOAD_SIZES["year"])) for text in column]
+    return PAYLOAD_SIZES["year"], lambda: [decode_number_replace(text) for text in texts]
+
+def run_cases(repeat):
+    '''
+    Run all cases.  Returns {name: {"rows", "us_per_row", "peak_bytes_per_row", "kept_bytes_per_row"}}.
+    The repeats take turns between the cases, so a slow spell of the machine does not hit
+    all repeats of one case.
+    '''
+    cases = {REFERENCE_CASE: reference_case()} | parser_cases()
+    seconds = {}
+    for _ in range(repeat):
+        for name, (rows, function) in cases.items():
+            number = max(1, MIN_ROWS_PER_TIMING // rows)
+            timing = timeit.timeit(function, number=number) / number
+            seconds[name] = min(seconds.get(name, timing), timing)
+    results = {}
+    for name, (rows, function) in cases.items():
+        peak, kept = _allocations(function)
+        results[name] = {
+            "rows": rows,
+            "us_per_row": round(seconds[name] * 1e6 / rows, 3),
+            "peak_bytes_per_row": round(peak / rows),
+            "kept_bytes_per_row": round(kept / rows),
+        }
+    return results
+
+def print_results(results):
+    print(f"{'case':28} {'rows':>6} {'ms':>9} {'us/row':>9} {'peak B/row':>11} {'kept B/row':>11}")
+    for name, result in results.items():
+        print(f"{name:28} {result['rows']:6} {result['us_per_row'] * result['rows'] / 1000:9.3f} "
+              f"{result['us_per_row']:9.2f} {result['peak_bytes_per_row']:11} {result['kept_bytes_per_row']:11}")
+
+def compare(results, baseline, threshold):
+    '''
+    The regressions of the results against the baseline, as lines of text.
+    The speed of a machine drifts from run to run, so the times are compared relative to the time
+    of the reference case of the same run.  Allocations are compared as they are.
+    '''
+    speed = baseline[REFERENCE_CASE]["us_per_row"] / results[REFERENCE_CASE]["us_per_row"]
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or name == REFERENCE_CASE:
+            continue
+        for key, label, scale in (("us_per_row", "time", speed), ("peak_bytes_per_row", "peak allocation", 1)):
+            value = result[key] * scale
+            if base[key] and value > base[key] * (1 + threshold):
+                regressions.append(f"{name}: {label} per row {base[key]} -> {round(value, 3)} "
+                                   f"(+{(value / base[key] - 1) * 100:.0f}%)")
+    return regressions
+
+def compare_decoders(years, repeat):
+    result = synthetic_heating_result(365 * years)
+    columns = _columns(result)
+    values = sum(len(column) for column in columns)
+    api = AsyncEforsyning("", "", "", False, False)
+
+    replace = _best(lambda: [[decode_number_replace(text, 150) for text in column] for column in columns], repeat)
+    scalar = _best(lambda: [[decode_number(text, 150) for text in column] for column in columns], repeat)
+    batch = _best(lambda: [decode_numbers(column, 150) for column in columns], repeat)
+    lines = result["ForbrugsLinjer"]["TForbrugsLinje"]
+    date_texts = [line["FraDatoStr"] for line in lines] + [line["TilDatoStr"] for line in lines]
+    strptime = _best(lambda: [datetime.strptime(text, "%d-%m-%Y").toordinal() for text in date_texts], repeat)
+    sliced = _best(lambda: decode_dates(date_texts), repeat)
+    parse = _best(lambda: api._parse_result_heating(result), repeat)
+
+    print(f"{years} years, {len(columns[0])} daily lines, {values} numbers")
+    print(f"  numbers, str.replace   {replace * 1000:8.1f} ms")
+    print(f"  numbers one at a time  {scalar * 1000:8.1f} ms  ({replace / scalar:.1f}x)")
+    print(f"  numbers by column      {batch * 1000:8.1f} ms  ({replace / batch:.1f}x)")
+    print(f"  dates, strptime        {strptime * 1000:8.1f} ms")
+    print(f"  dates, sliced and memo {sliced * 1000:8.1f} ms  ({strptime / sliced:.1f}x)")
+    print(f"  full heating parse     {parse * 1000:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser("pyeforsyning.benchmark")
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--baseline", action="store", help="Compare to the results in this file")
+    parser.add_argument("--save-baseline", action="store", help="Save the results to this file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Share a case may be slower than the baseline")
+    parser.add_argument("--decoders", action="store_true", help="Compare the decoders instead")
+    parser.add_argument("--years", type=int, default=10, help="Years of daily lines for --decoders")
+    args = parser.parse_args()
+
+    if args.decoders:
+        compare_decoders(args.years, args.repeat)
+        return
+
+    results = run_cases(args.repeat)
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump({"version": BASELINE_VERSION, "python": platform.python_version(), "cases": results},
+                      file, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("version") != BASELINE_VERSION:
+            raise ValueError(f"Unsupported baseline version: {baseline.get('version')}")
+        regressions = compare(results, baseline["cases"], args.threshold)
+        for regression in regressions:
+            print(f"Regression {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold * 100:.0f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+'''
+Classification of the billing lines (faktlini) of getberegnregnskab.
+
+The suppliers lay out the billing report differently, so a line is recognized by its linieType
+and tekst rather than by its position.  The rules saying what to do with each kind of line are a
+table.  It is compiled once into an index by linieType with one precompiled pattern per rule, and
+the classification of each (linieType, tekst) is remembered, so a report is classified with a
+dictionary lookup per line.
+
+A supplier with its own layout gets rules in SUPPLIER_BILLING_RULES, which are tried before the
+default rules.  Lines matching no rule are reported back, so an unknown layout can be spotted.
+'''
+from __future__ import annotations
+
+from dataclasses import dataclass
+import re
+
+from .decoders import decode_number
+
+# Scaling factors to kWh from the energy units of the billing lines
+ENERGY_UNITS = {"MWh": 1000, "Gj": 227.78}
+
+# Max. number of (linieType, tekst) classifications remembered by a classifier
+CLASSIFICATION_MEMO_SIZE = 1024
+
+@dataclass(frozen=True)
+class BillingRule:
+    '''
+    A billing line of line_type is handled by the BillingTotals method named action.
+    With texts, only lines with one of the texts in their tekst match (or equal to one of them,
+    with exact=True).  The first rule matching a line is used.
+    '''
+    line_type: str
+    action: str
+    texts: tuple[str, ...] = ()
+    exact: bool = False
+
+# See the docstring of AsyncEforsyning._parse_result_billing() for the line types
+DEFAULT_BILLING_RULES = (
+    BillingRule("0", "ignore"),                 # Text only
+    BillingRule("1", "fixed_water"),            # Fixed m3 contribution
+    BillingRule("3", "ignore", ("Afkøling",)),  # Average cooling - not used
+    BillingRule("3", "prognosis", ("Prognose", "Forventet forbrug")),
+    BillingRule("3", "consumption"),
+    BillingRule("10", "vat"),
+    BillingRule("12", "energy_amount", ("Samlet varmeforbrug",), exact=True),
+    BillingRule("12", "total_amount", ("Total (incl.moms)", "Total, inkl. moms")),
+    BillingRule("12", "total_amount", ("Årets forventede resultat",), exact=True),
+    BillingRule("12", "refund", ("Til udbetaling", "Tilbagebetaling")),
+    BillingRule("12", "payment_due", ("Til indbetaling", "For lidt opkrævet", "Foreløbig beregnet efterbetaling")),
+    BillingRule("13", "ignore"),                # Empty
+    BillingRule("18", "ignore", ("Restance",)), # Amount in arrears - not used
+    BillingRule("18", "advance_payment"),
+    BillingRule("20", "ignore"),                # Expected future payments or paid-back - not used
+    BillingRule("22", "ignore"),                # Return temperature fee - not used
+)
+
+# Rules of suppliers with their own layout, by supplier id.  They are tried before the default rules.
+# Example: {"<supplier id>": (BillingRule("12", "total_amount", ("I alt inkl. moms",)),)}
+SUPPLIER_BILLING_RULES: dict[str, tuple[BillingRule, ...]] = {}
+
+class BillingClassifier:
+    '''
+    Finds the rule of a billing line.  Compile it once and reuse it for all reports.
+    '''
+    def __init__(self, rules):
+        self._index = {}
+        for rule in rules:
+            if not callable(getattr(BillingTotals, rule.action, None)):
+                raise ValueError(f"Unknown billing rule action: {rule.action}")
+            self._index.setdefault(rule.line_type, []).append((self._compile(rule), rule))
+        self._memo = {}
+
+    @staticmethod
+    def _compile(rule):
+        if not rule.texts:
+            return None
+        pattern = re.compile("|".join(re.escape(text) for text in rule.texts))
+        return pattern.fullmatch if rule.exact else pattern.search
+
+    def classify(self, record):
+        '''
+        The rule of a billing line, or None if no rule matches it.
+        '''
+        key = (record['linieType'], record['tekst'])
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        rule = None
+        for matches, candidate in self._index.get(key[0], ()):
+            if matches is None or matches(key[1]):
+                rule = candidate
+                break
+        if len(self._memo) < CLASSIFICATION_MEMO_SIZE:
+            self._memo[key] = rule
+        return rule
+
+_classifiers: dict[str, BillingClassifier] = {}
+
+def get_billing_classifier(supplierid):
+    '''
+    The classifier with the rules of the supplier, compiled on first use.
+    '''
+    classifier = _classifiers.get(supplierid)
+    if classifier is None:
+        rules = SUPPLIER_BILLING_RULES.get(supplierid, ()) + DEFAULT_BILLING_RULES
+        classifier = _classifiers[supplierid] = BillingClassifier(rules)
+    return classifier
+
+class BillingTotals:
+    '''
+    The amounts collected from the billing lines.  Each action of the rules is a method taking the line.
+    '''
+    def __init__(self):
+        self.energy_prognosis = 0.0
+        self.energy_price = 0.0
+        self.energy_total_used = 0.0
+        self.energy_total_used_price = 0.0
+        self.m3_prognosis = 0.0
+        self.m3_price = 0.0
+        self.m3_total_used = 0.0
+        self.m3_prognosis_price = 0.0
+        self.amount_vat = 0.0
+        self.amount_energy = 0.0
+        self.amount_total = 0.0
+        self.amount_advance = 0.0
+        self.amount_remaining = 0.0
+
+    def ignore(self, record):
+        pass
+
+    def fixed_water(self, record):
+        # Fixed payment - differences here, some have a unit price
+        self.m3_prognosis_price = decode_number(record['ialt'])
+        if record['enhed'] == "m3":
+            self.m3_prognosis = decode_number(record['antalEnheder'])
+            self.m3_price = round(self.m3_prognosis_price/self.m3_prognosis, 2)
+
+    def prognosis(self, record):
+        # Prognosis heating scaled to kWh.  A prognosis in another unit is not used.
+        scale = ENERGY_UNITS.get(record['enhed'])
+        if scale is not None:
+            self.energy_prognosis = decode_number(record['antalEnheder'], scale=scale)
+
+    def consumption(self, record):
+        scale = ENERGY_UNITS.get(record['enhed'])
+        if scale is not None:
+            # Price of comsumption of energy.
+            # If there are more records like these, it would seen the price may have been adjusted.
+            # Calculate the average price in that case.
+            self.energy_total_used_price += decode_number(record['ialt'])
+            self.energy_total_used += decode_number(record['antalEnheder'], scale=scale)
+            self.energy_price = round(scale*self.energy_total_used_price/self.energy_total_used, 2)
+        elif record['enhed'] == "M3":
+            # Consumption in M3 (water passed through the system)
+            self.m3_total_used += decode_number(record['antalEnheder'])
+
+    def vat(self, record):
+        self.amount_vat = decode_number(record['ialt'])
+
+    def energy_amount(self, record):
+        # Price of MWh totalled
+        self.amount_energy = decode_number(record['ialt'])
+
+    def total_amount(self, record):
+        # Price totalled incl. VAT
+        self.amount_total = decode_number(record['ialt'])
+
+    def refund(self, record):
+        # Remaining expected remuneration (indicated by a negative number)
+        self.amount_remaining = -decode_number(record['ialt'])
+
+    def payment_due(self, record):
+        # Remaining expected payment (indicated by a positive number)
+        self.amount_remaining = decode_number(record['ialt'])
+
+    def advance_payment(self, record):
+        # Advance payments (negative number in the report)
+        self.amount_advance = -decode_number(record['ialt'])
+
+def classify_billing_lines(lines, classifier):
+    '''
+    Collect the amounts of the billing lines by the rules of the classifier.
+    Returns the BillingTotals and the lines no rule matched.
+    '''
+    totals = BillingTotals()
+    unmatched = []
+    for record in lines:
+        rule = classifier.classify(record)
+        if rule is None:
+            unmatched.append(record)
+        else:
+            getattr(totals, rule.action)(record)
+    return totals, unmatched
@@ -0,0 +1,93 @@
+'''
+Decoders for the text values in the API responses.
+
+Numbers are Danish formatted strings like "1.458,00": "." separates thousands and "," is the
+decimal comma.  decode_numbers() decodes a whole column of them in one pass.  The column is
+joined and turned into Python float syntax by one pair of str.replace() calls, and the rounding
+is skipped when it can not change a value.
+
+Dates are "dd-mm-yyyy" strings.  decode_dates() slices them directly instead of using strptime
+and remembers the dates seen, giving day ordinals.  iso_dates() formats ordinals as ISO dates.
+'''
+from datetime import date, datetime
+import re
+
+# A number with more than 3 decimals, which the rounding changes
+_MORE_DECIMALS = re.compile(r",\d{4}")
+
+def decode_number(text, filter_above=None, scale=1):
+    '''
+    Convert a Danish formatted number to float.
+    If the string is empty just return 0.0.
+    If the value is above the filter_above value, return 0.0
+    The scaling factor multiplies the value and rounds off to 3 decimals.
+    '''
+    if text == "":
+        return 0.0
+
+    # Remove thousand . and convert decimal , to . - then convert to float value
+    value = float(text.replace('.','').replace(',', '.'))
+
+    # Cull values above filter_above.  Some times data deliverd are missing decimal comma!
+    if filter_above and value > filter_above:
+        return 0.0
+
+    # Scale value and round value to remove float artifacts resulting in small decimal errors
+    return round(value*scale, 3)
+
+def decode_numbers(texts, filter_above=None, scale=1):
+    '''
+    Convert a sequence of Danish formatted numbers to a list of floats.
+    The values are exactly those of decode_number() on each text.
+    '''
+    if not texts:
+        return []
+    joined = "\n".join(texts)
+    texts = joined.replace('.','').replace(',', '.').split("\n")
+    try:
+        values = list(map(float, texts))
+    except ValueError:
+        # Empty strings are 0.0
+        values = [float(text) if text else 0.0 for text in texts]
+
+    if filter_above and max(values) > filter_above:
+        values = [0.0 if value > filter_above else value for value in values]
+
+    # A number with at most 3 decimals is already the float nearest to itself rounded to 3 decimals,
+    # so unscaled values only need rounding if there are more decimals.
+    if scale != 1 or _MORE_DECIMALS.search(joined):
+        values = [round(value*scale, 3) for value in values]
+    return values
+
+def decode_date(text, memo=None):
+    '''
+    Convert a "dd-mm-yyyy" date to a day ordinal (date.toordinal()).
+    The fields are sliced directly, other layouts fall back to strptime.
+    Give a dict as memo to reuse the results for repeated dates.
+    '''
+    if memo is not None:
+        ordinal = memo.get(text)
+        if ordinal is None:
+            ordinal = memo[text] = decode_date(text)
+        return ordinal
+    if len(text) == 10 and text[2] == "-" and text[5] == "-":
+        return date(int(text[6:10]), int(text[3:5]), int(text[0:2])).toordinal()
+    return datetime.strptime(text, "%d-%m-%Y").toordinal()
+
+def decode_dates(texts, memo=None):
+    '''
+    Convert a sequence of "dd-mm-yyyy" dates to day ordinals.
+    The dates of the daily lines repeat (TilDatoStr of a line is FraDatoStr of the next), so
+    decode FraDatoStr and TilDatoStr with the same memo.
+    '''
+    memo = {} if memo is None else memo
+    return [decode_date(text, memo) for text in texts]
+
+def iso_dates(ordinals, suffix=""):
+    '''
+    Format day ordinals as ISO dates: "yyyy-mm-dd" followed by the suffix.
+    '''
+    fromordinal = date.fromordinal
+    if suffix:
+        return [fromordinal(ordinal).isoformat() + suffix for ordinal in ordinals]
+    return [fromordinal(ordinal).isoformat() for ordinal in ordinals]
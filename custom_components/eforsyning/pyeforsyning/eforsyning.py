@@ -3,49 +3,377 @@ Primary public module for eforsyning.dk API wrapper.
 '''
 from datetime import datetime
 from datetime import timedelta
+from collections import deque
+from typing import NamedTuple
+from urllib.parse import urlsplit
+import asyncio
 import json
-import requests
-import http
+import aiohttp
 import logging
 import hashlib
+import time
+
+from .metadata import EforsyningMetadata
+from .scheduler import get_scheduler
+from .series import DailySeries, DATE_FORMAT_DAY, DATE_FORMAT_TIMESTAMP
+from .decoders import decode_number, decode_numbers, decode_dates
+from .streaming import JSONArrayStream
+from .billing import get_billing_classifier, classify_billing_lines
+from .responses import HTTPFailed, HTTPStatusError, InvalidResponse, DecodeStats, check_status, decode_json
+from .metrics import EforsyningMetrics
 
 # Test
 import random
 
 _LOGGER = logging.getLogger(__name__)
 
+# The site asked for the API server of a supplier
+DEFAULT_BASE_URL = 'https://eforsyning.dk/'
+
+# Connection pool defaults.  The calls in an update are sequential, so a small pool is enough
+# to keep a connection alive to both eforsyning.dk and the supplier API server.
+DEFAULT_POOL_SIZE = 4
+DEFAULT_KEEPALIVE_TIMEOUT = 60
+
+# Number of past billing years included in the year data of get_latest()
+DEFAULT_HISTORY_YEARS = 5
+
+# Number of daily lines before the latest one which are parsed again on every update,
+# because the supplier may still revise them.
+SERIES_REVISION_WINDOW = 7
+
+# Fields of the daily data points, in the order they are returned
+HEATING_SERIES_FIELDS = ("kWh-Start", "kWh-End", "kWh-Used", "kWh-ExpUsed", "kWh-ExpEnd",
+                         "M3-Start", "M3-End", "M3-Used", "M3-ExpUsed", "M3-ExpEnd",
+                         "Temp-Forward", "Temp-Return", "Temp-ExpReturn", "Temp-Cooling")
+WATER_SERIES_FIELDS = ("Start", "End", "Used", "ExpUsed", "ExpEnd")
+
+# The daily lines are decoded while the response arrives, in chunks of this many bytes,
+# and parsed in batches of this many lines.
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_BATCH_LINES = 256
+
+# Max. number of API requests in flight at the same time for one object
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Returned by the fetch methods when the response is byte-identical to the one parsed last time
+UNCHANGED = object()
+
+# Number of observed access token lifetimes to keep
+TOKEN_LIFETIME_HISTORY = 20
+
+# Number of update traces kept, see AsyncEforsyning.start_trace()
+TRACE_HISTORY = 5
+# Texts in a {"response": ...} body telling the token is no longer accepted
+TOKEN_EXPIRED_MARKERS = ("token", "ugyldig id", "invalid id", "not logged in", "ikke logget ind")
+
 class LoginFailed(Exception):
     """"Exception class for bad credentials"""
 
-class HTTPFailed(Exception):
-    """Exception class for API HTTP failures"""
+class _RequestContext(NamedTuple):
+    '''
+    Snapshot of the metadata used by the requests of one update.
+    Passed to the request methods so concurrent calls do not depend on shared mutable state.
+    '''
+    installation_id: str
+    asset_id: str
+    latest_year: int
+    first_year: int
+
+    @property
+    def installation_key(self):
+        return f"{self.installation_id}-{self.asset_id}"
 
-class Eforsyning:
+def _failure_status(err):
+    '''
+    The status recorded in the metrics for a request which got no response.
+    '''
+    return "timeout" if isinstance(err, asyncio.TimeoutError) else "error"
+
+class _DailySeriesSync:
+    '''
+    Turn the daily lines of a getforbrug result into a DailySeries of data points, as the lines arrive.
+
+    The API returns every line from the start of the billing period, but only the last few
+    lines change (readings are averaged out when a missing reading arrives).  With a series
+    dictionary the data points are kept between calls and only the lines from the revision
+    window before the high-water mark and onwards are parsed again:
+      period       - AarStart of the billing period.  A new period starts over.
+      rows         - the DailySeries of data points
+      seed_index   - the first line parsed on the next call
+      seed_date    - TilDatoStr of the line before seed_index, checked before trusting the rows
+      seed_state   - the line state before seed_index
+    Without a series, or with resume=False, all lines are parsed.
+
+    The lines are given to add_lines() in batches.  The last SERIES_REVISION_WINDOW lines are held
+    back until finish(), so the line state at the next seed is known, and the lines before them are
+    parsed right away and dropped.  The period is only known at the end of the result, so a stored
+    series which turns out not to match the lines makes finish() return None, and the lines must be
+    synced again by a sync with resume=False.
+    '''
+    def __init__(self, series, parse_lines, fields, date_format, resume=True):
+        self._series = series
+        self._parse_lines = parse_lines
+        self._rows = DailySeries(fields, date_format)
+        self._state = {}
+        self._start = 0
+        if resume and series is not None and series.get('rows') is not None and series['rows'].fields == self._rows.fields:
+            self._start = series['seed_index']
+            self._state = dict(series['seed_state'])
+            # A new series, so a result returned earlier is left as it was
+            self._rows = series['rows'][:self._start]
+        self._line_count = 0
+        self._seed_date = ""
+        self._matches = True
+        self._window = deque()
+        self.first_line = None
+        self.last_line = None
+        # Time spent parsing lines while they arrive, finish() not included
+        self.parse_seconds = 0.0
+        # Set by finish(): True if days were added to or revised in the stored series
+        self.changed = False
+
+    def add_lines(self, lines):
+        if not lines:
+            return
+        if self.first_line is None:
+            self.first_line = lines[0]
+        self.last_line = lines[-1]
+
+        parse = []
+        for line in lines:
+            index = self._line_count
+            self._line_count += 1
+            if index < self._start:
+                if index == self._start - 1:
+                    self._seed_date = line['TilDatoStr']
+                    self._matches = self._seed_date == self._series['seed_date']
+                continue
+            if self._matches:
+                self._window.append(line)
+                if len(self._window) > SERIES_REVISION_WINDOW:
+                    parse.append(self._window.popleft())
+        if parse:
+            started = time.perf_counter()
+            self._seed_date = parse[-1]['TilDatoStr']
+            self._rows.extend(self._parse_lines(parse, self._state))
+            self.parse_seconds += time.perf_counter() - started
+
+    def finish(self, period):
+        '''
+        Parse the held back lines and update the series.
+        Returns the data points and the line state after the last line, or None if the stored
+        series did not match the lines.
+        '''
+        if self._start and (not self._matches or self._line_count < self._start or period != self._series['period']):
+            _LOGGER.debug(f"Daily series does not match the stored series.  Parsing all lines.")
+            return None
+
+        # The state before the held back lines is the state at the next seed
+        seed_state = dict(self._state)
+        self._rows.extend(self._parse_lines(list(self._window), self._state))
+        next_seed_index = self._line_count - len(self._window)
+        _LOGGER.debug(f"Parsed {self._line_count - self._start} of {self._line_count} daily lines")
+
+        if self._series is not None:
+            # Only the rows from the resume point were parsed again, so only those can differ
+            stored = self._series.get('rows')
+            self.changed = (stored is None or len(stored) != len(self._rows) or period != self._series.get('period')
+                            or stored[self._start:] != self._rows[self._start:])
+            self._series['period'] = period
+            self._series['rows'] = self._rows
+            self._series['seed_index'] = next_seed_index
+            self._series['seed_date'] = self._seed_date if next_seed_index > 0 else ""
+            self._series['seed_state'] = seed_state
+
+        return self._rows, self._state
+
+class AsyncEforsyning:
     '''
     Primary exported interface for eforsyning.dk API wrapper.
+    All API calls are coroutines running on the event loop using aiohttp.
+    If no session is given, the object owns a pooled keep-alive session which is created on
+    first use and must be closed by close().  All calls to eforsyning.dk and the supplier
+    API server then reuse the same pool of connections.
     '''
-    def __init__(self, username, password, supplierid, billing_period_skew, is_water_supply):
+    def __init__(self, username, password, supplierid, billing_period_skew, is_water_supply, session=None,
+                 pool_size=DEFAULT_POOL_SIZE, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT, metadata=None,
+                 year_totals=None, history_years=DEFAULT_HISTORY_YEARS, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 daily_series=None, base_url=DEFAULT_BASE_URL, metrics=None):
         self._username = username
         self._password = password
         self._supplierid = supplierid
         self._billing_period_skew = billing_period_skew
         self._is_water_supply = is_water_supply
-        self._base_url = 'https://eforsyning.dk/'
-        self._api_server = ""
-        ## Assume people only have a single metering device.
-        ## Feel free to expand the code to find all metering devices
-        ## and iterate over them.
-        ## Must be a string - see where it is used.
-        self._asset_id = "1"
-        self._user_id = None
-        self._first_year = None
-        self._installation_id = "1"
+        # Another base URL points the object to a stand-in for eforsyning.dk, like fakeserver.py
+        self._base_url = base_url if base_url.endswith('/') else base_url + '/'
+        ## API server, user info, installation and year marker are cached in the metadata
+        ## and only fetched again when they are stale.
+        self._metadata = EforsyningMetadata() if metadata is None else metadata
         self._access_token = ""
-        self._latest_year = 2000
-        self._latest_year_begin = ""
-        self._latest_year_end = ""
+        # Totals of closed billing years and how many years back to include in the year data
+        self._year_totals = {} if year_totals is None else year_totals
+        self._history_years = history_years
+        # Parsed daily data points per installation, kept so only new lines are parsed
+        self._daily_series = {}
+        for key, series in (daily_series or {}).items():
+            # Series persisted before the data points were columnar are parsed again
+            if isinstance(series.get('rows'), dict):
+                self._daily_series[key] = series | {'rows': DailySeries.from_dict(series['rows'])}
+        # Fingerprints of the latest responses and what was parsed from them, both by
+        # "<installation key>/<section>".  Unchanged responses are not decoded or parsed again.
+        self._fingerprints = {}
+        self._parsed = {}
+        self._unchanged_responses = 0
+        # Counted up when the data to persist changes, see revisions
+        self._revisions = {"year_totals": 0, "daily_series": 0}
+        self._decode_stats = DecodeStats()
+        self._billing_classifier = get_billing_classifier(supplierid)
+        self._unmatched_billing_lines = []
+        # Metrics of the requests, logins, parsing and updates.  A registry may be shared by many objects.
+        self._metrics = EforsyningMetrics() if metrics is None else metrics
+        self._api_calls = 0
+        # The open trace of the requests and parsing of an update, and the last finished ones
+        self._trace = None
+        self._trace_started = 0.0
+        self._traces = deque(maxlen=TRACE_HISTORY)
+        # The object keeps no per-request state, so calls may run concurrently.
+        # The semaphore bounds the number of requests in flight, the lock serialises metadata refresh.
+        self._request_semaphore = asyncio.Semaphore(max_concurrency)
+        self._metadata_lock = asyncio.Lock()
+        self._x_session_id = ""
+        # Token bookkeeping.  The access token is kept between updates and renewed only when rejected.
+        self._auth_lock = asyncio.Lock()
+        self._authenticated_at = None
+        self._logins = 0
+        self._reauthentications = 0
+        self._token_lifetimes = deque(maxlen=TOKEN_LIFETIME_HISTORY)
+        # A session handed in by the caller (like Home Assistant's shared session) is never closed here.
+        self._session = session
+        self._owns_session = session is None
+        self._pool_size = pool_size
+        self._keepalive_timeout = keepalive_timeout
+        # Connection statistics for the owned session.  Requests divided by connections shows the reuse.
+        self._connections_opened = 0
+        self._requests_sent = 0
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._pool_size,
+                                             keepalive_timeout=self._keepalive_timeout,
+                                             ttl_dns_cache=300)
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_create_end)
+            trace_config.on_request_start.append(self._on_request_start)
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+        return self._session
+
+    async def _on_connection_create_end(self, session, trace_config_ctx, params):
+        self._connections_opened += 1
+
+    async def _on_request_start(self, session, trace_config_ctx, params):
+        self._requests_sent += 1
+
+    @property
+    def connection_stats(self):
+        '''
+        Number of requests sent and TCP connections opened by the owned session, and the
+        number of responses which were the same as last time and not parsed again.
+        '''
+        return {
+            "requests": self._requests_sent,
+            "connections": self._connections_opened,
+            "unchanged_responses": self._unchanged_responses,
+        }
+
+    @property
+    def unmatched_billing_lines(self):
+        '''
+        The lines of the last billing report which no billing rule recognized, see billing.py.
+        '''
+        return self._unmatched_billing_lines
+
+    @property
+    def decode_stats(self):
+        '''
+        Number of responses, bytes and time spent decoding them per endpoint, see responses.DecodeStats.
+        The time of a streamed getforbrug response is that of decoding the lines, not parsing them.
+        '''
+        return self._decode_stats.as_dict()
+
+    @property
+    def metrics(self):
+        '''
+        The metrics registry of the object, see metrics.EforsyningMetrics.
+        metrics.openmetrics() gives them in the OpenMetrics text format.
+        '''
+        return self._metrics
+
+    def _record_request(self, endpoint, started, status, size=None):
+        seconds = time.monotonic() - started
+        self._api_calls += 1
+        self._metrics.record_request(endpoint, status, seconds, size)
+        if self._trace is not None:
+            self._trace["requests"].append({
+                "endpoint": endpoint,
+                "offset_ms": round((started - self._trace_started) * 1000, 1),
+                "ms": round(seconds * 1000, 1),
+                "status": status,
+                "bytes": size,
+            })
+
+    def _record_parse(self, section, seconds):
+        self._metrics.record_parse(section, seconds)
+        if self._trace is not None:
+            self._trace["parse"].append({"section": section, "ms": round(seconds * 1000, 3)})
+
+    def start_trace(self):
+        '''
+        Start recording a trace of an update: every request with its start offset, duration, status
+        and size, and the time spent parsing each section.  get_latest_all() traces itself, start the
+        trace before it to include the login as well.  A trace already open is left open.
+        '''
+        if self._trace is not None:
+            return False
+        self._trace_started = time.monotonic()
+        self._trace = {
+            "started": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "seconds": None,
+            "ok": None,
+            "requests": [],
+            "parse": [],
+        }
+        return True
+
+    def finish_trace(self, ok):
+        '''
+        Finish the open trace and keep it in traces.  Returns the trace, or None if none was open.
+        '''
+        trace = self._trace
+        if trace is None:
+            return None
+        self._trace = None
+        trace["seconds"] = round(time.monotonic() - self._trace_started, 3)
+        trace["ok"] = ok
+        self._traces.append(trace)
+        return trace
+
+    @property
+    def traces(self):
+        '''
+        The last finished update traces, oldest first.  They hold no credentials or tokens.
+        '''
+        return list(self._traces)
 
-    def _get_ebrugerinfo(self):
+    async def close(self):
+        '''
+        Close the HTTP session if it was created by this object.
+        '''
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_ebrugerinfo(self):
         '''
         This method returns the "ebrugerid" which is different from the username.
         This id is used to get the installations.
@@ -54,60 +382,37 @@ class Eforsyning:
           so that data is not retrieved before the consumer moved in.
         '''
         _LOGGER.debug(f"Getting userinfo from API (ebrugerinfo)")
-        userinfoURL = self._api_server + "api/getebrugerinfo?id=" + self._access_token
-        _LOGGER.debug(f"Trying: {userinfoURL}")
-        result = requests.get(userinfoURL,
-                                timeout = 5
-                              )
-        # Instead of converting with result.json() this is also possible:
-        #    euser_id = str(result_dict['id'])
-
-        result_json = result.json()
-
-        if result.status_code == 200:
-            _LOGGER.debug(f"Response from userinfo API. ebrugerinfo: {result.status_code}, Body: {result.text}, ebruger: {result_json['id']}")
-        else:
-            _LOGGER.error(f"Response from userinfo API. ebrugerinfo: {result.status_code}, Body: {result.text}")
+        status_code, result_text = await self._api_request("GET", "getebrugerinfo", timeout=5)
 
-        self._user_id = result_json['id']
-        self._first_year = datetime.strptime(result_json['indflyttet'], '%d-%m-%Y').year
+        result_json = self._decode("getebrugerinfo", result_text)
+        _LOGGER.debug(f"Response from userinfo API. ebrugerinfo: {status_code}, Body: {result_text}, ebruger: {result_json['id']}")
 
-    def _get_installations(self):
+        self._metadata.user_id = result_json['id']
+        self._metadata.first_year = datetime.strptime(result_json['indflyttet'], '%d-%m-%Y').year
+        self._metadata.mark_fetched("user_info")
+
+    async def _get_installations(self):
         '''
-        Get the installations to set installation_id and asset_id
-        Restriction:  We will find the first installation_id == 1 and
-        extract the asset_id from this only.
-        TODO: Consider enumeration of installations, or make a field in the
-        configuration to set the metering number, which is tied to the
-        installation_id and asset_id in the API.
-        This implementation is the path of least effort, so be warned about this.
+        Get the installations of the account.  All of them are kept in the metadata, and the
+        first one sets installation_id and asset_id of the default installation.
+        The installation_id and asset_id pairs are used in the API calls.
         '''
         # https://api2.dff-edb.dk/kongerslev/api/FindInstallationer?id=fec53bccc22d0d92a9ab7e439188bd3f
         _LOGGER.debug(f"Getting installations at supplier: {self._supplierid}")
  
-        ## Get the URL to the REST API service
-        installationsURL=self._api_server + "api/FindInstallationer?id=" + self._access_token
-        _LOGGER.debug(f"Trying: {installationsURL}")
         data = {
                 "Soegetekst": "",
                 "Skip": "0",
                 "Take": "10000",
-                "EBrugerId": self._user_id,
+                "EBrugerId": self._metadata.user_id,
                 "Huskeliste": "null",
                 "MedtagTilknyttede": "true"
                 }
 
-        headers = self._create_headers()
-
-        result = requests.post(installationsURL,
-                                data = json.dumps(data),
-                                timeout = 10,
-                                headers=headers
-                              )
+        status_code, result_text = await self._api_request("POST", "FindInstallationer", data=data)
 
-        _LOGGER.debug(f"Response from API. Status: {result.status_code}, Body: {result.text}")
+        _LOGGER.debug(f"Response from API. Status: {status_code}, Body: {result_text}")
 
-        result_json = result.json()
         # Data looks like this:
         #{"Installationer":[
         #  {"EjendomNr":<int>,
@@ -121,16 +426,28 @@ class Eforsyning:
         #   "Målertype":"<str>"
         #  }
         # ]}
-        result_json = result.json()
-        installations = result_json['Installationer'][0]
-        self._installation_id = str(installations['InstallationNr'])
-        self._asset_id = str(installations['AktivNr'])
+        result_json = self._decode("FindInstallationer", result_text)
+        installations = result_json['Installationer']
+        if not installations:
+            raise HTTPFailed(f"No installations found at supplier {self._supplierid}")
+        self._metadata.installations = [
+            {
+                "installation_id": str(installation['InstallationNr']),
+                "asset_id": str(installation['AktivNr']),
+                "meter_id": str(installation.get('MålerNr', "")),
+                "address": str(installation.get('Adresse', "")),
+            }
+            for installation in installations
+        ]
+        self._metadata.installation_id = self._metadata.installations[0]['installation_id']
+        self._metadata.asset_id = self._metadata.installations[0]['asset_id']
+        self._metadata.mark_fetched("installation")
 
-        _LOGGER.debug(f"Done getting installatons[0] {installations}")
+        _LOGGER.debug(f"Done getting {len(installations)} installations {installations}")
 
         return installations
 
-    def _get_latest_year(self):
+    async def _get_latest_year(self):
         ''' Retrieve the latest available year.  This is the latest year data can be retrieved from.
             When passing over a payment period, which could be New Year or even July or October depending
             on the supplier financial year, data are reset and we start over.
@@ -139,41 +456,36 @@ class Eforsyning:
         '''
         _LOGGER.debug(f"Getting installations at supplier: {self._supplierid}")
  
-        ## Get the URL to the REST API service
-        getaktuelaarsmaerkeURL=self._api_server + "api/getaktuelaarsmaerke?id=" + self._access_token
-        _LOGGER.debug(f"Trying: {getaktuelaarsmaerkeURL}")
-        headers = self._create_headers()
+        status_code, result_text = await self._api_request("POST", "getaktuelaarsmaerke")
 
-        result = requests.post(getaktuelaarsmaerkeURL,
-                                timeout = 10,
-                                headers=headers
-                              )
+        _LOGGER.debug(f"Response from API. Status: {status_code}, Body: {result_text}")
 
-        _LOGGER.debug(f"Response from API. Status: {result.status_code}, Body: {result.text}")
-
-        result_json = result.json()
         # Data looks like this:
         #{"aarsmaerke":2022,
         # "aarsmaerke_start":"01-01-2022",
         # "aarsmaerke_slut":"31-12-2022"
         #}
-        result_json = result.json()
-        self._latest_year = int(result_json['aarsmaerke'])
-        self._latest_year_begin = str(result_json['aarsmaerke_start'])
-        self._latest_year_end = str(result_json['aarsmaerke_slut'])
+        result_json = self._decode("getaktuelaarsmaerke", result_text)
+        self._metadata.latest_year = int(result_json['aarsmaerke'])
+        self._metadata.latest_year_begin = str(result_json['aarsmaerke_start'])
+        self._metadata.latest_year_end = str(result_json['aarsmaerke_slut'])
+        self._metadata.mark_fetched("year_marker")
 
-        _LOGGER.debug(f"Done getting latest year data {self._latest_year}")
+        _LOGGER.debug(f"Done getting latest year data {self._metadata.latest_year}")
 
         return result_json
 
-    def _get_time_series(self,
-                        from_date=None,
-                        to_date=None,
-                        year = "0",
-                        month = False,
-                        day = False,
-                        include_expected_reading = True
-                       ):
+    async def _get_time_series(self,
+                               context,
+                               from_date=None,
+                               to_date=None,
+                               year = "0",
+                               month = False,
+                               day = False,
+                               include_expected_reading = True,
+                               fingerprint = None,
+                               sync = None
+                              ):
         '''
         Call time series API on eforsyning.dk. Defaults to yesterdays data.
         NOTE: The API service actually don't care about the dates at this point in time.
@@ -187,6 +499,13 @@ class Eforsyning:
               0  returns yearly reading
               2  returns latest reading
               10 returns reading per date
+
+        If a fingerprint key is given and the response is the same as the one parsed
+        for that key last time, UNCHANGED is returned instead of the data.
+
+        If a _DailySeriesSync is given, the daily lines are decoded and handed to it while the
+        response arrives, and the returned data has an empty TForbrugsLinje list.  This keeps
+        the memory used by a response of many years about the same as for a few days.
         '''
         _LOGGER.debug(f"Getting time series")
 
@@ -199,9 +518,7 @@ class Eforsyning:
             parsed_to_date = to_date.strftime(date_format)
 
 
-        headers = self._create_headers()
-
-        post_meter_data_url = "api/getforbrug?id="+self._access_token+"&unr="+self._username+"&anr="+self._asset_id+"&inr="+self._installation_id # POST
+        params = {"unr": self._username, "anr": context.asset_id, "inr": context.installation_id}
 
         include_data_in_between = "false"
         if month or day:
@@ -227,8 +544,8 @@ class Eforsyning:
 
         data = {
                 "Ejendomnr":self._username,
-                "AktivNr":self._asset_id,
-                "I_Nr":self._installation_id,
+                "AktivNr":context.asset_id,
+                "I_Nr":context.installation_id,
                 "AarsMaerke":year,
                 "ForbrugsAfgraensning_FraDato":parsed_from_date,
                 "ForbrugsAfgraensning_TilDato":parsed_to_date,
@@ -261,87 +578,97 @@ class Eforsyning:
             }
 
         _LOGGER.debug(f"POST data to API. {data}")
-        result = None
+        consumer = None
+        if sync is not None:
+            consumer = JSONArrayStream("TForbrugsLinje", sync.add_lines, STREAM_BATCH_LINES)
         try:
-            result = requests.post(self._api_server + post_meter_data_url,
-                                    data = json.dumps(data),
-                                    timeout = 10,
-                                    headers=headers
-                                )
-        except requests.exceptions.Timeout:
+            status_code, result_text = await self._api_request("POST", "getforbrug", params=params, data=data,
+                                                               consumer=consumer)
+        except asyncio.TimeoutError:
             _LOGGER.warning(f"API access timed out.  No data retrieved")
-            return result
-
-        except requests.exceptions.RequestException:
-            _LOGGER.warning(f"RequestException {result}")
-            raise HTTPFailed(result.raise_for_status())
+            return None
 
-        _LOGGER.debug(f"Done getting time series {result.status_code}, Body: {result.text}")
+        _LOGGER.debug(f"Done getting time series {status_code}, Body: {result_text}")
 
-        return result.json()
+        if consumer is None:
+            if self._is_unchanged(fingerprint, result_text):
+                return UNCHANGED
+            return self._decode("getforbrug", result_text)
+        if self._is_unchanged(fingerprint, result_text, consumer.fingerprint):
+            return UNCHANGED
+        return self._decode("getforbrug", result_text, size=consumer.size, seconds=consumer.decode_seconds)
 
-    def _get_billing_details(self):
+    async def _get_billing_details(self, context, fingerprint=None):
         ## Prices of the energy used can be fetched as well
         # https://<server URL>/vaerksid>/api/getberegnregnskab?id=<id>&unr=<forbrugernummer>&anr=0&inr=<installationsnummer>
         _LOGGER.debug(f"Getting billing details at supplier {self._supplierid}")
-        ## Get the URL to the REST API service
-        post_billing_data_url = "api/getberegnregnskab?id="+self._access_token+"&unr="+self._username+"&anr="+self._asset_id+"&inr="+self._installation_id # POST
-        headers = self._create_headers()
+        params = {"unr": self._username, "anr": context.asset_id, "inr": context.installation_id}
         data = {
                 "aktivnr" : 0,
                 "beregnetVarmeRegnskab" : "faktisk"
                 }
  
         _LOGGER.debug(f"POST to API")
-        result = None
         try:
-            result = requests.post(self._api_server + post_billing_data_url,
-                                    data = json.dumps(data),
-                                    timeout = 10,
-                                    headers=headers
-                                )
-        except requests.exceptions.RequestException:
-            raise HTTPFailed(result.raise_for_status())
-
-        _LOGGER.debug(f"Done getting billing details {result.status_code}") #, Body: {result.text}")
-        _LOGGER.debug(json.dumps(result.json(), sort_keys = False, indent = 4))
-        return result.json()
+            status_code, result_text = await self._api_request("POST", "getberegnregnskab", params=params, data=data)
+        except asyncio.TimeoutError as err:
+            raise HTTPFailed(err)
+
+        if self._is_unchanged(fingerprint, result_text):
+            _LOGGER.debug(f"Billing details unchanged")
+            return UNCHANGED
+        result_json = self._decode("getberegnregnskab", result_text)
+        _LOGGER.debug(f"Done getting billing details {status_code}")
+        return result_json
 
 
-    def _get_api_server(self):
+    async def _get_api_server(self):
         _LOGGER.debug(f"Getting api server at supplier {self._supplierid}")
         ## Get the URL to the REST API service
         settingsURL="umbraco/dff/dffapi/GetVaerkSettings?forsyningid="
-        result = None
+        await self._schedule(self._base_url, "GetVaerkSettings")
+        started = time.monotonic()
         try:
-            result = requests.get(self._base_url + settingsURL + self._supplierid, headers=self._create_headers())
-        except requests.exceptions.RequestException:
-            raise HTTPFailed(result.raise_for_status())
-
-        result_json = result.json()
-        self._api_server = result_json['AppServerUri']
-
-        _LOGGER.debug(f"Done getting api server {self._api_server}")
+            async with self._get_session().get(self._base_url + settingsURL + self._supplierid, headers=self._create_headers()) as result:
+                body = await result.read()
+                result_text = body.decode(result.get_encoding())
+                status_code = result.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self._record_request("GetVaerkSettings", started, _failure_status(err))
+            raise HTTPFailed(err)
+        self._record_request("GetVaerkSettings", started, status_code, len(body))
+
+        check_status("GetVaerkSettings", status_code, result_text)
+        result_json = self._decode("GetVaerkSettings", result_text)
+        self._metadata.api_server = result_json['AppServerUri']
+        self._metadata.mark_fetched("api_server")
+
+        _LOGGER.debug(f"Done getting api server {self._metadata.api_server}")
 
         return True
 
-    def _get_access_token(self):
+    async def _get_access_token(self):
         _LOGGER.debug(f"Getting access token")
 
         # With the API server URL we can authenticate and get a token:
-        security_token_url = self._api_server + "system/getsecuritytoken/project/app/consumer/" + self._username
+        security_token_url = self._metadata.api_server + "system/getsecuritytoken/project/app/consumer/" + self._username
 
-        result = None
+        await self._schedule(security_token_url, "getsecuritytoken")
+        started = time.monotonic()
         try:
-            result = requests.get(security_token_url, headers=self._create_headers())
-        except requests.exceptions.RequestException as err:
-            raise LoginFailed(f"Failure on HTTP request during access token aquisition: {err}")
-            return False
-
-        if result.status_code != 200:
-            raise LoginFailed(f"Not able to get access token. HTTP status: {result.status_code}.  Probably a wrong username.")
-
-        result_json = result.json()
+            async with self._get_session().get(security_token_url, headers=self._create_headers()) as result:
+                body = await result.read()
+                result_text = body.decode(result.get_encoding())
+                status_code = result.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self._record_request("getsecuritytoken", started, _failure_status(err))
+            raise HTTPFailed(f"Failure on HTTP request during access token aquisition: {err}")
+        self._record_request("getsecuritytoken", started, status_code, len(body))
+
+        if status_code != 200:
+            raise LoginFailed(f"Not able to get access token. HTTP status: {status_code}.  Probably a wrong username.")
+
+        result_json = self._decode("getsecuritytoken", result_text)
         token = result_json['Token']
         if token == '':
             raise LoginFailed("Not able to get access token, it was empty.  Probably a wrong username.")
@@ -353,16 +680,23 @@ class Eforsyning:
 
         return True
 
-    def _login(self):
+    async def _login(self):
         # Use the new token to login to the API service
         auth_url = "system/login/project/app/consumer/"+self._username+"/installation/1/id/"
-        result = None
+        await self._schedule(self._metadata.api_server, "login")
+        started = time.monotonic()
         try:
-            result = requests.get(self._api_server + auth_url + self._access_token, headers=self._create_headers())
-        except requests.exceptions.RequestException:
-            raise HTTPFailed(result.raise_for_status())
-
-        result_json = result.json()
+            async with self._get_session().get(self._metadata.api_server + auth_url + self._access_token, headers=self._create_headers()) as result:
+                body = await result.read()
+                result_text = body.decode(result.get_encoding())
+                status_code = result.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self._record_request("login", started, _failure_status(err))
+            raise HTTPFailed(err)
+        self._record_request("login", started, status_code, len(body))
+
+        check_status("login", status_code, result_text)
+        result_json = self._decode("login", result_text)
         result_status = result_json['Result']
         if result_status == 1:
             _LOGGER.debug("Login success")
@@ -371,56 +705,348 @@ class Eforsyning:
 
         return True
 
-    def authenticate(self):
+    async def authenticate(self):
         """ Perform the login process:
             First retrieve the API server, next get an access token, last use the token to authenticate.
             If any of these raises an exception, login failed miserably.
         """
         try:
-            self._x_session_id = ''.join(random.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ") for i in range(8))
-            self._get_api_server()
-            self._get_access_token()
-            self._login()
+            await self._authenticate()
         except (LoginFailed, HTTPFailed) as err:
             _LOGGER.error(err)
             return False
         return True
 
+    async def _authenticate(self):
+        try:
+            await self._login_sequence()
+        except (LoginFailed, HTTPFailed):
+            self._metrics.record_login(False)
+            raise
+        self._metrics.record_login(True)
+
+    async def _login_sequence(self):
+        self._authenticated_at = None
+        self._x_session_id = ''.join(random.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ") for i in range(8))
+        if self._metadata.is_fresh("api_server"):
+            try:
+                await self._get_access_token()
+                await self._login()
+            except LoginFailed:
+                # The API server answered and rejected the credentials.  Another server would too.
+                raise
+            except HTTPFailed as err:
+                # The supplier may have moved to another API server. Get it and try once more.
+                _LOGGER.debug(f"Login using cached API server failed: {err}")
+                self._metadata.invalidate("api_server")
+        if not self._metadata.is_fresh("api_server"):
+            await self._get_api_server()
+            await self._get_access_token()
+            await self._login()
+        self._authenticated_at = time.monotonic()
+        self._logins += 1
+
+    @property
+    def metadata(self):
+        '''
+        The cached account metadata.  Persist metadata.to_dict() and hand it back to the constructor
+        using EforsyningMetadata.from_dict() to avoid fetching it again after a restart.
+        '''
+        return self._metadata
+
+    @property
+    def is_authenticated(self):
+        '''
+        True when a login has succeeded and the token has not been found expired since.
+        '''
+        return self._authenticated_at is not None
+
+    async def _reauthenticate(self, expired_token):
+        '''
+        Login again after a data endpoint rejected expired_token.
+        Concurrent callers wait on the same login, and if the token was already renewed
+        by someone else no new login is made.
+        '''
+        async with self._auth_lock:
+            if self._access_token != expired_token and self.is_authenticated:
+                return
+            if self._authenticated_at is not None:
+                self._token_lifetimes.append(time.monotonic() - self._authenticated_at)
+            self._reauthentications += 1
+            self._metrics.reauthentications.inc()
+            _LOGGER.debug(f"Access token expired, logging in again")
+            await self._authenticate()
+
+    @property
+    def token_stats(self):
+        '''
+        Login counts and the observed lifetime of access tokens in seconds.
+        A lifetime is recorded each time a data endpoint rejects the token.
+        '''
+        lifetimes = list(self._token_lifetimes)
+        return {
+            "logins": self._logins,
+            "reauthentications": self._reauthentications,
+            "token_age": None if self._authenticated_at is None else round(time.monotonic() - self._authenticated_at),
+            "token_lifetimes": [round(lifetime) for lifetime in lifetimes],
+            "average_token_lifetime": round(sum(lifetimes)/len(lifetimes)) if lifetimes else None,
+        }
+
+    def _is_token_expired(self, status_code, result_text):
+        '''
+        The API answers 401/403 on a rejected token.  Some servers answer 200 with a
+        {"response": "<message>"} body instead, so look for token related messages there as well.
+        '''
+        if status_code in (401, 403):
+            return True
+        if status_code == 200 and result_text.startswith('{"response"'):
+            message = result_text.lower()
+            return any(marker in message for marker in TOKEN_EXPIRED_MARKERS)
+        return False
+
+    def _is_unchanged(self, key, result_text, fingerprint=None):
+        '''
+        Compare a response with the last one fetched for the fingerprint key.
+        It only counts as unchanged if the result parsed from the last one was kept in
+        self._parsed, so a response which failed to parse or was rejected is parsed again.
+        A streamed response gives the fingerprint of the whole body, as result_text is not all of it.
+        '''
+        if key is None:
+            return False
+        if fingerprint is None:
+            fingerprint = hashlib.blake2b(result_text.encode(), digest_size=16).digest()
+        if self._fingerprints.get(key) == fingerprint and key in self._parsed:
+            self._unchanged_responses += 1
+            return True
+        self._fingerprints[key] = fingerprint
+        self._parsed.pop(key, None)
+        return False
+
+    async def _api_request(self, method, endpoint, params=None, data=None, timeout=10, consumer=None):
+        '''
+        Call a data endpoint on the API server: <api server>/api/<endpoint>?id=<access token>&<params>
+        If the token is rejected, login once more and repeat the request with the new token.
+        Returns the HTTP status and the response body.  Raises HTTPStatusError for a status other than 200.
+        With a consumer (see streaming.JSONArrayStream) the body is fed to it in chunks as it
+        arrives, and the text returned by consumer.close() is returned as the body.
+        '''
+        for attempt in range(2):
+            token = self._access_token
+            query = {"id": token}
+            if params:
+                query.update(params)
+            _LOGGER.debug(f"Trying: {endpoint} {method}")
+            await self._schedule(self._metadata.api_server, endpoint)
+            try:
+                async with self._request_semaphore:
+                    # The latency is timed from when the request may be sent, not from when it is queued
+                    started = time.monotonic()
+                    async with self._get_session().request(method,
+                                                           self._metadata.api_server + "api/" + endpoint,
+                                                           params = query,
+                                                           data = None if data is None else json.dumps(data),
+                                                           timeout = aiohttp.ClientTimeout(total=timeout),
+                                                           headers = self._create_headers()
+                                                          ) as result:
+                        if consumer is None:
+                            body = await result.read()
+                            result_text = body.decode(result.get_encoding())
+                            size = len(body)
+                        else:
+                            consumer.reset()
+                            try:
+                                async for chunk in result.content.iter_chunked(STREAM_CHUNK_SIZE):
+                                    consumer.feed(chunk)
+                                result_text = consumer.close()
+                            except ValueError as err:
+                                self._record_request(endpoint, started, "invalid", consumer.size)
+                                raise InvalidResponse(endpoint, err) from err
+                            size = consumer.size
+                        status_code = result.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                self._record_request(endpoint, started, _failure_status(err))
+                # A timeout of the whole request is left to the caller
+                if not isinstance(err, aiohttp.ClientError):
+                    raise
+                _LOGGER.warning(f"ClientError {err}")
+                raise HTTPFailed(err)
+            self._record_request(endpoint, started, status_code, size)
+
+            if not self._is_token_expired(status_code, result_text):
+                check_status(endpoint, status_code, result_text)
+                return status_code, result_text
+            if attempt == 0:
+                await self._reauthenticate(token)
+
+        self._authenticated_at = None
+        raise LoginFailed(f"Access token rejected by {endpoint} right after login. HTTP status: {status_code}")
+
+    def _decode(self, endpoint, result_text, size=None, seconds=0.0):
+        '''
+        Decode a response body once, recording the time spent in the decode stats.
+        '''
+        return decode_json(endpoint, result_text, self._decode_stats, size, seconds)
+
+    async def _schedule(self, url, endpoint):
+        '''
+        Wait for the process wide scheduler of the API host to allow a request.
+        '''
+        await get_scheduler(urlsplit(url).hostname).acquire(endpoint)
+
+    def scheduler_usage(self):
+        '''
+        Fair use budget usage of the API hosts used by this object.  The hosts are shared with
+        all other objects in the process.
+        '''
+        hosts = {urlsplit(self._base_url).hostname, urlsplit(self._metadata.api_server).hostname}
+        return [get_scheduler(host).usage() for host in hosts if host]
+
     def _create_headers(self):
         return {
                 #'Content-Type': 'application/json',
                 'Accept': 'application/json',
                 'X-Session-ID': self._x_session_id,
                 'X-Correlation-ID': ''.join(random.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ") for i in range(8)),
-                'User-Agent': 'HomeAssistant - eforsyning integration, Python requests module'
+                'User-Agent': 'HomeAssistant - eforsyning integration, Python aiohttp module'
                 }
 
-    def get_latest(self):
+    @property
+    def installations(self):
+        '''
+        Keys ("<InstallationNr>-<AktivNr>") of the installations of the account.  The first one
+        is the default installation.  Only known after the metadata has been fetched.
+        '''
+        if not self._metadata.installations:
+            return [f"{self._metadata.installation_id}-{self._metadata.asset_id}"]
+        return [f"{installation['installation_id']}-{installation['asset_id']}"
+                for installation in self._metadata.installations]
+
+    async def get_latest_all(self):
         '''
-        Get latest data.
+        Get latest data of all installations of the account: {installation key: data}
+        The metadata is refreshed once, then the installations are fetched concurrently.  The
+        requests of all of them together are limited by the max_concurrency of the object.
+        '''
+        started = time.monotonic()
+        api_calls = self._api_calls
+        traced = self.start_trace()
+        results = None
+        try:
+            await self._refresh_metadata()
+            installations = self.installations
+            results = await asyncio.gather(*(self.get_latest(installation) for installation in installations))
+        finally:
+            ok = results is not None and None not in results
+            self._metrics.record_update(ok, time.monotonic() - started, self._api_calls - api_calls)
+            if traced:
+                self.finish_trace(ok)
+        return dict(zip(installations, results))
+
+    async def get_latest(self, installation=None):
+        '''
+        Get latest data of an installation, by default the first one of the account.
+        The requests after the metadata is in place are independent and run concurrently,
+        limited by the max_concurrency of the object.  The result is the same as fetching
+        them one after another.
+
+        Responses which are byte-identical to the last ones are not parsed again.  The parsed
+        sections (the daily data, billing and year data) are then the same objects as last time,
+        and if nothing changed at all the previous result object itself is returned.
         '''
         _LOGGER.debug(f"Getting latest data")
-        self._get_ebrugerinfo()
-        self._get_installations()
-        self._get_latest_year()
+        context = await self._refresh_metadata(installation)
+        billing_key = f"{context.installation_key}/billing"
 
         # This is for heating data only - fetch yearly stats
+        year_tasks = []
         if self._is_water_supply == False:
-            # Retrieve year data for the past max. 5 years.
-            year_result = []
-            years_to_fetch = min(self._latest_year - self._first_year, 5)
-            start_year = self._latest_year - years_to_fetch
+            # Retrieve year data for the past years within the history horizon.
+            # Closed years come from the cache, so normally only the open year is fetched.
+            years_to_fetch = min(context.latest_year - context.first_year, self._history_years)
+            start_year = context.latest_year - years_to_fetch
             for year_count in range(years_to_fetch + 1):
-                year_data = self._get_time_series(year=start_year + year_count)
-                result = self._parse_result_totals_line(year_data)
-                year_result.append(result)
+                year_tasks.append(self.get_year_totals(start_year + year_count, context))
+            billing_task = self._get_billing_details(context, fingerprint=billing_key)
+        else:
+            # Pretty sure the billing record will *not* look the same for water data
+            billing_task = asyncio.sleep(0, None)
+
+        *year_result, (day_key, day_data), billing_data = await asyncio.gather(*year_tasks,
+                                                                               self._get_day_series(context),
+                                                                               billing_task)
+
+        # if there is a connection error, no data is returned, so don't try to parse it.
+        # The daily data is parsed while it arrives.
+        if day_data is UNCHANGED:
+            result = self._parsed[day_key]
+        elif day_data:
+            result = self._parsed[day_key] = day_data
+        else:
+            return None
 
+        if self._is_water_supply == False:
+            # Handle data from the billing
+            if billing_data is UNCHANGED:
+                billing_result = self._parsed[billing_key]
+            else:
+                started = time.perf_counter()
+                billing_result = self._parsed[billing_key] = self._parse_result_billing(billing_data)
+                self._record_parse("billing", time.perf_counter() - started)
             # Format data so Homeassistant sensor can understand it.
-            year_data = {
-                'year': year_result,
-                'temp-return-year': year_result[-1]['Temp-Return']
-            }
+            # The year totals are the cached objects when unchanged, so keep the previous dict then.
+            year_key = f"{context.installation_key}/year"
+            year_data = self._parsed.get(year_key)
+            if year_data is None or len(year_data['year']) != len(year_result) \
+               or any(new is not old for new, old in zip(year_result, year_data['year'])):
+                year_data = self._parsed[year_key] = {
+                    'year': year_result,
+                    'temp-return-year': year_result[-1]['Temp-Return']
+                }
+        else:
+            billing_result = {}
+            year_data = {}
+
+        _LOGGER.debug("Done parsing latest data")
+        # Return the previous result if all sections are the same objects as last time
+        latest_key = f"{context.installation_key}/latest"
+        sections = (result, billing_result, year_data)
+        previous = self._parsed.get(latest_key)
+        if previous is not None and all(new is old or not (new or old) for new, old in zip(sections, previous[0])):
+            _LOGGER.debug("Latest data unchanged")
+            return previous[1]
+        latest = result | billing_result | year_data
+        self._parsed[latest_key] = (sections, latest)
+        return latest
+
+    async def _refresh_metadata(self, installation=None):
+        '''
+        Fetch the metadata which is stale and return a snapshot of it for the requests of one update
+        of an installation (key, see installations), by default the first one of the account.
+        In steady state nothing is fetched, leaving only the time series and billing calls.
+        The lock makes concurrent updates wait for one refresh instead of doing their own.
+        '''
+        async with self._metadata_lock:
+            if not self._metadata.is_fresh("user_info"):
+                await self._get_ebrugerinfo()
+            # Metadata saved before all installations were kept has none
+            if not self._metadata.is_fresh("installation") or not self._metadata.installations:
+                await self._get_installations()
+            if self._metadata.year_marker_due():
+                await self._get_latest_year()
+            installation_id, asset_id = self._metadata.installation_id, self._metadata.asset_id
+            if installation is not None:
+                for known in self._metadata.installations:
+                    if f"{known['installation_id']}-{known['asset_id']}" == installation:
+                        installation_id, asset_id = known['installation_id'], known['asset_id']
+                        break
+                else:
+                    raise HTTPFailed(f"Unknown installation {installation}")
+            return _RequestContext(installation_id,
+                                   asset_id,
+                                   self._metadata.latest_year,
+                                   self._metadata.first_year)
 
+    async def _get_day_series(self, context):
         # NOTE:
         # If the current year is later than the latest year it _may_ mean that data fetched is no longer valid
         # For people with January-December payment years this means trouble because monthly and yearly totals
@@ -442,65 +1068,140 @@ class Eforsyning:
         # If none of these, all should be okay actually.
         #
         # The latest year marker is set by the heating company but could be a manual process on their side.
+        #
+        # Returns the fingerprint key of the year used along with the parsed data, which is UNCHANGED
+        # if the response is the same as the one parsed last time.
         day_data = None
+        series = self._daily_series.setdefault(context.installation_key, {})
 
         # Try "invalid" year first if January and the year marker is not updated.
-        _LOGGER.debug(f"{datetime.now().month} - {datetime.now().year} - {self._latest_year}")
-        if datetime.now().month == 1 and datetime.now().year > self._latest_year:
-            day_data = self._get_time_series(year=datetime.now().year,
-                                            day=True, # NOTE: Pulling daily data is required to get non-averaged temperature measurements
-                                            from_date=datetime.now()-timedelta(days=1),
-                                            to_date=datetime.now())
-            if 'response' in day_data or day_data['ForbrugsLinjer']['AntLinjer'] == "0":
-                _LOGGER.debug("Fetching new year data did not result in valid data.  Getting current dataset from %s", self._latest_year)
-                day_data = None
+        _LOGGER.debug(f"{datetime.now().month} - {datetime.now().year} - {context.latest_year}")
+        if datetime.now().month == 1 and datetime.now().year > context.latest_year:
+            day_key = f"{context.installation_key}/day/{datetime.now().year}"
+            day_data = await self._get_day_result(context, datetime.now().year, series, fingerprint=day_key, valid_only=True)
+            if day_data is None:
+                _LOGGER.debug("Fetching new year data did not result in valid data.  Getting current dataset from %s", context.latest_year)
 
-        
         if day_data == None:
             # Fetch the daily use data using the API based yearly marker
-            day_data = self._get_time_series(year=self._latest_year,
-                                            day=True, # NOTE: Pulling daily data is required to get non-averaged temperature measurements
-                                            from_date=datetime.now()-timedelta(days=1),
-                                            to_date=datetime.now())
+            day_key = f"{context.installation_key}/day/{context.latest_year}"
+            day_data = await self._get_day_result(context, context.latest_year, series, fingerprint=day_key)
+        return day_key, day_data
 
-        # if there is a connection error, no data is returned, so don't try to parse it.
-        if day_data:
+    async def _get_day_result(self, context, year, series=None, fingerprint=None, valid_only=False):
+        '''
+        Fetch the daily data of a billing year and parse the lines while they arrive.
+        The lines are synced into the series if given, see _DailySeriesSync.  If the stored series
+        turns out not to match, the year is fetched once more and parsed in full.
+        Returns the parsed data, UNCHANGED or None.  With valid_only, an error response or
+        a response without lines gives None as well.
+        '''
+        for resume in (True, False):
             if self._is_water_supply == False:
-                result = self._parse_result_heating(day_data)
-                # Handle data from the billing
-                billing_data = self._get_billing_details()
-                billing_result = self._parse_result_billing(billing_data)
+                sync = _DailySeriesSync(series, self._parse_heating_lines, HEATING_SERIES_FIELDS, DATE_FORMAT_DAY, resume)
             else:
-                result = self._parse_result_water(day_data)
-                # Pretty sure the billing record will *not* look the same for water data
-                billing_result = {}
-                year_data = {}
-
-            _LOGGER.debug("Done parsing latest data")
-            return result | billing_result | year_data
-        else:
+                sync = _DailySeriesSync(series, self._parse_water_lines, WATER_SERIES_FIELDS, DATE_FORMAT_TIMESTAMP, resume)
+            day_data = await self._get_time_series(context,
+                                                   year=year,
+                                                   day=True, # NOTE: Pulling daily data is required to get non-averaged temperature measurements
+                                                   from_date=datetime.now()-timedelta(days=1),
+                                                   to_date=datetime.now(),
+                                                   fingerprint=fingerprint,
+                                                   sync=sync)
+            if day_data is None or day_data is UNCHANGED:
+                return day_data
+            if valid_only and ('response' in day_data or day_data['ForbrugsLinjer']['AntLinjer'] == "0"):
+                return None
+            started = time.perf_counter()
+            if self._is_water_supply == False:
+                result = self._parse_result_heating(day_data, sync=sync)
+            else:
+                result = self._parse_result_water(day_data, sync=sync)
+            # The lines parsed while the response arrived count as well
+            self._record_parse("water" if self._is_water_supply else "heating",
+                               time.perf_counter() - started + sync.parse_seconds)
+            if result is not None:
+                if sync.changed:
+                    self._revisions["daily_series"] += 1
+                return result
+        return None
+
+    async def get_daily_series(self, year, context=None, installation=None):
+        '''
+        Get the daily data points of a billing year of an installation as a DailySeries.
+        Meant for fetching history, so the year is parsed in full and not kept in the daily series.
+        Returns None if the API has no daily data for the year.
+        '''
+        if context is None:
+            context = await self._refresh_metadata(installation)
+        result = await self._get_day_result(context, year, valid_only=True)
+        if result is None:
+            _LOGGER.debug(f"No daily data for {year}")
             return None
+        return result['data']
+
+    async def get_year_totals(self, year, context=None, installation=None):
+        '''
+        Get the totals line for a billing year of an installation.
+        Years before the current year marker are closed and never change, so they are
+        fetched once and kept in the year totals cache.  Years outside the history horizon
+        are only fetched when asked for here.  The open year is parsed again only when
+        the response changed, otherwise the same totals object is returned.
+        '''
+        if context is None:
+            context = await self._refresh_metadata(installation)
+        installation_totals = self._year_totals.setdefault(context.installation_key, {})
+        cached = installation_totals.get(str(year))
+        if cached is not None and year < context.latest_year:
+            return cached
+
+        year_key = f"{context.installation_key}/year/{year}"
+        year_data = await self._get_time_series(context, year=year, fingerprint=year_key)
+        if year_data is UNCHANGED:
+            return self._parsed[year_key]
+        if year_data is None:
+            raise HTTPFailed(f"No yearly data retrieved for {year}")
+        started = time.perf_counter()
+        result = self._parsed[year_key] = self._parse_result_totals_line(year_data)
+        self._record_parse("year-totals", time.perf_counter() - started)
+        if year < context.latest_year:
+            _LOGGER.debug(f"Caching totals of closed year {year}")
+            installation_totals[str(year)] = result
+            self._revisions["year_totals"] += 1
+        return result
+
+    @property
+    def year_totals(self):
+        '''
+        The cache of closed year totals: {"<InstallationNr>-<AktivNr>": {"<year>": totals}}.
+        It is plain JSON data, hand it back to the constructor after a restart.
+        '''
+        return self._year_totals
+
+    @property
+    def revisions(self):
+        '''
+        Revisions of year_totals and daily_series: {"year_totals": n, "daily_series": n}.
+        A revision is counted up when the data changes, so it only has to be persisted again then.
+        '''
+        return dict(self._revisions)
+
+    @property
+    def daily_series(self):
+        '''
+        The synced daily data points per installation: {"<InstallationNr>-<AktivNr>": series}.
+        It is plain JSON data, hand it back to the constructor after a restart.
+        '''
+        return {key: series | {'rows': series['rows'].as_dict()} for key, series in self._daily_series.items()}
 
     def _stof(self, fstr, filter_above=None, scale=1):
         """Convert string with ',' string float to float.
            If the string is empty just return 0.0.
            If the value is above the filter_above value, return 0.0
            The scaling factor multiplies the value and rounds off to 3 decimals.
+           Use decoders.decode_numbers() for a column of values.
         """
-        if fstr == "":
-            return 0.0
-
-        # Remove thousand . and convert decimal , to . - then convert to float value
-        val = float(fstr.replace('.','').replace(',', '.'))
-        
-        # Cull values above filter_above.  Some times data deliverd are missing decimal comma!
-        if filter_above and val > filter_above:
-            return 0.0
-
-        # Scale value and round value to remove float artifacts resulting in small decimal errors
-        val = round(val*scale, 3)
-
-        return val
+        return decode_number(fstr, filter_above, scale)
 
     def _parse_result_totals_line(self, result):
         '''
@@ -579,9 +1280,12 @@ class Eforsyning:
 
         return metering_data
 
-    def _parse_result_heating(self, result):
+    def _parse_result_heating(self, result, series=None, sync=None):
         '''
         Parse result from API call. This is a JSON dict.
+        If series is given, the daily lines are synced into it incrementally, see _sync_daily_series().
+        If the lines were streamed to a sync, it is finished instead.  None is returned if it
+        did not match its series.
 
         The data fields ENG2 and TV2 is energy sent into the heating unit and energy returned to the network.
         The unit is typically M3*T (volume * temperature).
@@ -598,99 +1302,150 @@ class Eforsyning:
         metering_data['year_end']   = result['AarSlut']
 
         # Save all relevant day data so it can be extracted by users of the API (like HomeAssistant attributes)
-        metering_data['data'] = []
-        for fl in result['ForbrugsLinjer']['TForbrugsLinje']:
-            metering_data['temp-forward'] = self._stof(fl['Tempfrem'], filter_above=150)
-            metering_data['temp-return'] = self._stof(fl['TempRetur'], filter_above=150)
-            metering_data['temp-exp-return'] = self._stof(fl['Forv_Retur'], filter_above=150)
-            metering_data['temp-cooling'] = self._stof(fl['Afkoling'], filter_above=150)
-
-            ## NOTE: No longer putting the ENG2 ans TV2 fields in the attributes.
-            ##       They are numbers for energy delivered and sent back supposedly in units of M3*T
-            ##       Hence dividing the number by M3 used the temperature in and out can be calculated.
-            ##       The numbers have no real meaning for tracking the consumption and just
-            ##       clutter the attributes.
-            ##       If you want them back, unceommen the relevant lines.
-            # Some may not have these fields.
-            #metering_data['energy-eng2-start'] = None
-            #metering_data['energy-eng2-end'] = None
-            #metering_data['energy-eng2-used'] = None
-            #metering_data['energy-tv2-start'] = None
-            #metering_data['energy-tv2-end'] = None
-            #metering_data['energy-tv2-used'] = None
+        # The values of the latest data point are left in the line state.
+        if sync is None:
+            sync = self._sync_daily_series(result, series, self._parse_heating_lines,
+                                           HEATING_SERIES_FIELDS, DATE_FORMAT_DAY)
+        synced = sync.finish(result['AarStart'])
+        if synced is None:
+            return None
+        metering_data['data'], line_state = synced
+        metering_data.update(line_state)
 
-            for reading in fl['TForbrugsTaellevaerk']:
-                unit = reading['Enhed_Txt']
-                #_LOGGER.debug(f"Energy use unit is: {unit}")
-                multiplier = 1
-                if unit == "MWh":
-                    multiplier = 1000
-                elif unit == "Gj":
-                    # 1 kWh = 0.0036 GJ, so the conversion is <n GJ> * 1/0.0036 = m kWh
-                    multiplier = float(1/0.0036)
+        _LOGGER.debug(f"Done parsing results")
+        return metering_data
 
+    def _parse_heating_lines(self, lines, metering_data):
+        '''
+        Parse daily heating lines into the columns of their data points.  Each field is decoded
+        for all lines at once, see decoders.decode_numbers().
+        metering_data holds the values of the line before the first one and is left with the
+        values of the last line.  Readings missing in a line keep the value from the line before.
+        The dates of the data points are day ordinals, the series formats them.
+        '''
+        # The dates of a line are usually those of the lines next to it, so decode them with one memo
+        dates = {}
+        columns = {
+            "DateFrom" : decode_dates([fl["FraDatoStr"] for fl in lines], dates),
+            "DateTo" : decode_dates([fl["TilDatoStr"] for fl in lines], dates),
+        }
+        if not lines:
+            return columns | {field: [] for field in HEATING_SERIES_FIELDS}
+
+        for key, field, line_field in (('temp-forward', "Temp-Forward", 'Tempfrem'),
+                                       ('temp-return', "Temp-Return", 'TempRetur'),
+                                       ('temp-exp-return', "Temp-ExpReturn", 'Forv_Retur'),
+                                       ('temp-cooling', "Temp-Cooling", 'Afkoling')):
+            columns[field] = decode_numbers([fl[line_field] for fl in lines], filter_above=150)
+            metering_data[key] = columns[field][-1]
+
+        ## NOTE: No longer putting the ENG2 ans TV2 fields in the attributes.
+        ##       They are numbers for energy delivered and sent back supposedly in units of M3*T
+        ##       Hence dividing the number by M3 used the temperature in and out can be calculated.
+        ##       The numbers have no real meaning for tracking the consumption and just
+        ##       clutter the attributes.
+        ##       If you want them back, parse the "ENG2" and "TV2" readings like "ENG1" below.
+        # Find the readings of each line.  Anything but M3 and ENG1 would be "TIME_", which
+        # is only kept in the line state of the last line having it.
+        water_readings = [None] * len(lines)
+        energy_readings = [None] * len(lines)
+        extra_reading = None
+        for index, fl in enumerate(lines):
+            for reading in fl['TForbrugsTaellevaerk']:
                 if reading['IndexNavn'] == "M3":
-                    metering_data['water-start'] = self._stof(reading['Start'])
-                    metering_data['water-end'] = self._stof(reading['Slut'])
-                    metering_data['water-used'] = self._stof(reading['Forbrug'])
-                    metering_data['water-exp-used'] = self._stof(fl['ForventetForbrugM3'])
-                    metering_data['water-exp-end'] = self._stof(fl['ForventetAflaesningM3'])
+                    water_readings[index] = reading
                 elif reading['IndexNavn'] == "ENG1":
-                    metering_data['energy-start'] = self._stof(reading['Start'], scale=multiplier)
-                    metering_data['energy-end'] = self._stof(reading['Slut'], scale=multiplier)
-                    metering_data['energy-used'] = self._stof(reading['Forbrug'], scale=multiplier)
-                    metering_data['energy-exp-used'] = self._stof(fl['ForventetForbrugENG1'], scale=multiplier)
-                    metering_data['energy-exp-end'] = self._stof(fl['ForventetAflaesningENG1'], scale=multiplier)
-                #elif reading['IndexNavn'] == "ENG2":
-                #    metering_data['energy-eng2-start'] = self._stof(reading['Start'], scale=multiplier)
-                #    metering_data['energy-eng2-end'] = self._stof(reading['Slut'], scale=multiplier)
-                #    metering_data['energy-eng2-used'] = self._stof(reading['Forbrug'], filter_above=10000, scale=multiplier)
-                #elif reading['IndexNavn'] == "TV2":
-                #    metering_data['energy-tv2-start'] = self._stof(reading['Start'], scale=multiplier)
-                #    metering_data['energy-tv2-end'] = self._stof(reading['Slut'], scale=multiplier)
-                #    metering_data['energy-tv2-used'] = self._stof(reading['Forbrug'], filter_above=10000, scale=multiplier)
+                    energy_readings[index] = reading
                 else:
-                    # This would be "TIME_"
-                    metering_data['extra-start'] = self._stof(reading['Start'])
-                    metering_data['extra-end'] = self._stof(reading['Slut'])
-                    metering_data['extra-used'] = self._stof(reading['Forbrug'])
-
-            metering_data['data'].append({
-                "DateFrom" : datetime.strptime(fl["FraDatoStr"], "%d-%m-%Y").strftime("%Y-%m-%d"),
-                "DateTo" : datetime.strptime(fl["TilDatoStr"], "%d-%m-%Y").strftime("%Y-%m-%d"),
- 
-                "kWh-Start" : metering_data['energy-start'],
-                "kWh-End" : metering_data['energy-end'],
-                "kWh-Used" : metering_data['energy-used'],
-                "kWh-ExpUsed" : metering_data['energy-exp-used'],
-                "kWh-ExpEnd" : metering_data['energy-exp-end'],
-
-                "M3-Start" : metering_data['water-start'],
-                "M3-End" : metering_data['water-end'],
-                "M3-Used" : metering_data['water-used'],
-                "M3-ExpUsed" : metering_data['water-exp-used'],
-                "M3-ExpEnd" : metering_data['water-exp-end'],
-
-                "Temp-Forward" : metering_data['temp-forward'],
-                "Temp-Return" : metering_data['temp-return'],
-                "Temp-ExpReturn" : metering_data['temp-exp-return'],
-                "Temp-Cooling" : metering_data['temp-cooling'],
-
-                #"kWh-ENG2-Start" : metering_data['energy-eng2-start'],
-                #"kWh-ENG2-End" : metering_data['energy-eng2-end'],
-                #"kWh-ENG2-Used" : metering_data['energy-eng2-used'],
-
-                #"kWh-TV2-Start" : metering_data['energy-tv2-start'],
-                #"kWh-TV2-End" : metering_data['energy-tv2-end'],
-                #"kWh-TV2-Used" : metering_data['energy-tv2-used'],
+                    extra_reading = reading
+
+        water_lines = [index for index, reading in enumerate(water_readings) if reading is not None]
+        water_values = {
+            'water-start': decode_numbers([water_readings[index]['Start'] for index in water_lines]),
+            'water-end': decode_numbers([water_readings[index]['Slut'] for index in water_lines]),
+            'water-used': decode_numbers([water_readings[index]['Forbrug'] for index in water_lines]),
+            'water-exp-used': decode_numbers([lines[index]['ForventetForbrugM3'] for index in water_lines]),
+            'water-exp-end': decode_numbers([lines[index]['ForventetAflaesningM3'] for index in water_lines]),
+        }
+        for key, field in (('water-start', "M3-Start"), ('water-end', "M3-End"), ('water-used', "M3-Used"),
+                           ('water-exp-used', "M3-ExpUsed"), ('water-exp-end', "M3-ExpEnd")):
+            columns[field] = self._fill_forward(len(lines), water_lines, water_values[key], metering_data, key)
+
+        energy_lines = [index for index, reading in enumerate(energy_readings) if reading is not None]
+        energy_values = self._decode_energy(
+            energy_lines,
+            [self._energy_multiplier(energy_readings[index]) for index in energy_lines],
+            {
+                'energy-start': [energy_readings[index]['Start'] for index in energy_lines],
+                'energy-end': [energy_readings[index]['Slut'] for index in energy_lines],
+                'energy-used': [energy_readings[index]['Forbrug'] for index in energy_lines],
+                'energy-exp-used': [lines[index]['ForventetForbrugENG1'] for index in energy_lines],
+                'energy-exp-end': [lines[index]['ForventetAflaesningENG1'] for index in energy_lines],
             })
-
-        _LOGGER.debug(f"Done parsing results")
-        return metering_data
-
-    def _parse_result_water(self, result):
+        for key, field in (('energy-start', "kWh-Start"), ('energy-end', "kWh-End"), ('energy-used', "kWh-Used"),
+                           ('energy-exp-used', "kWh-ExpUsed"), ('energy-exp-end', "kWh-ExpEnd")):
+            columns[field] = self._fill_forward(len(lines), energy_lines, energy_values[key], metering_data, key)
+
+        if extra_reading is not None:
+            metering_data['extra-start'] = self._stof(extra_reading['Start'])
+            metering_data['extra-end'] = self._stof(extra_reading['Slut'])
+            metering_data['extra-used'] = self._stof(extra_reading['Forbrug'])
+
+        return columns
+
+    def _energy_multiplier(self, reading):
+        unit = reading['Enhed_Txt']
+        #_LOGGER.debug(f"Energy use unit is: {unit}")
+        multiplier = 1
+        if unit == "MWh":
+            multiplier = 1000
+        elif unit == "Gj":
+            # 1 kWh = 0.0036 GJ, so the conversion is <n GJ> * 1/0.0036 = m kWh
+            multiplier = float(1/0.0036)
+        return multiplier
+
+    def _decode_energy(self, energy_lines, multipliers, texts):
+        '''
+        Decode the energy columns to kWh.  The unit is the same in all lines in practice,
+        otherwise the lines of each unit are decoded separately.
+        '''
+        if len(set(multipliers)) <= 1:
+            scale = multipliers[0] if multipliers else 1
+            return {key: decode_numbers(column, scale=scale) for key, column in texts.items()}
+        values = {key: [0.0] * len(energy_lines) for key in texts}
+        for scale in set(multipliers):
+            positions = [position for position, multiplier in enumerate(multipliers) if multiplier == scale]
+            for key, column in texts.items():
+                for position, value in zip(positions, decode_numbers([column[position] for position in positions], scale=scale)):
+                    values[key][position] = value
+        return values
+
+    def _fill_forward(self, line_count, positions, values, metering_data, key):
+        '''
+        Spread values found in the lines at positions over all lines.  A line without a value gets
+        the one from the line before, the first line the one in metering_data.
+        metering_data is left with the value of the last line.
+        '''
+        if len(positions) == line_count:
+            column = values
+        else:
+            column = []
+            value = metering_data[key] if not positions or positions[0] > 0 else None
+            next_values = iter(zip(positions, values))
+            position, next_value = next(next_values, (None, None))
+            for index in range(line_count):
+                if index == position:
+                    value = next_value
+                    position, next_value = next(next_values, (None, None))
+                column.append(value)
+        metering_data[key] = column[-1]
+        return column
+
+    def _parse_result_water(self, result, series=None, sync=None):
         '''
         Parse result from API call. This is a JSON dict.
+        If series is given, the daily lines are synced into it incrementally, see _sync_daily_series().
+        If the lines were streamed to a sync, it is finished instead, see _parse_result_heating().
         In the JSON these are the data points:
           ForbrugsLinjer.TForbrugsLinje[last].TForbrugsTaellevaerk[0].Slut|Start|Forbrug  (water-start, water-end, water-used)
           ForbrugsLinjer.TForbrugsLinje[last].ForventetAflaesningM3|ForventetForbrugM3 (water-exp-end, water-exp-used)
@@ -701,6 +1456,10 @@ class Eforsyning:
         '''
         _LOGGER.debug(f"Parsing results - water metering")
 
+        if sync is None:
+            sync = self._sync_daily_series(result, series, self._parse_water_lines,
+                                           WATER_SERIES_FIELDS, DATE_FORMAT_TIMESTAMP)
+
         metering_data = {}
         # Extract data from the latest data point
         metering_data['year_start'] = result['AarStart']
@@ -708,38 +1467,75 @@ class Eforsyning:
         metering_data['water-ytd-used'] = self._stof(result['IaltLinje']['TForbrugsTaellevaerk'][0]['Forbrug'])
         metering_data['water-exp-fy-used'] = self._stof(result['IaltLinje']['ForventetForbrugM3'])
         # Calculate expected year to date consumption
-        start = self._stof(result['ForbrugsLinjer']['TForbrugsLinje'][0]['ForventetAflaesningM3'])
-        end = self._stof(result['ForbrugsLinjer']['TForbrugsLinje'][-1]['ForventetAflaesningM3'])
+        start = self._stof(sync.first_line['ForventetAflaesningM3'])
+        end = self._stof(sync.last_line['ForventetAflaesningM3'])
         metering_data['water-exp-ytd-used'] = end - start
 
         # Save all relevant day data so it can be extracted by users of the API (like HomeAssistant attributes)
-        metering_data['data'] = []
-        for fl in result['ForbrugsLinjer']['TForbrugsLinje']:
-            metering_data['water-exp-used'] = self._stof(fl['ForventetForbrugM3'])
-            metering_data['water-exp-end'] = self._stof(fl['ForventetAflaesningM3'])
-            # Initialise data - just in case data is missing - which would be really weird
-            metering_data['water-start'] = 0.0
-            metering_data['water-end'] = 0.0
-            metering_data['water-used'] = 0.0
-            for reading in fl['TForbrugsTaellevaerk']:
-                if reading['IndexNavn'] == "M3":
-                    metering_data['water-start'] = self._stof(reading['Start'])
-                    metering_data['water-end'] = self._stof(reading['Slut'])
-                    metering_data['water-used'] = self._stof(reading['Forbrug'])
-
-            metering_data['data'].append({
-                "DateFrom" : datetime.strptime(fl["FraDatoStr"], "%d-%m-%Y").strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-                "DateTo" : datetime.strptime(fl["TilDatoStr"], "%d-%m-%Y").strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-                "Start" : metering_data['water-start'],
-                "End" : metering_data['water-start'],
-                "Used" : metering_data['water-used'],
-                "ExpUsed" : metering_data['water-exp-used'],
-                "ExpEnd" : metering_data['water-exp-end'],
-            })
+        # The values of the latest data point are left in the line state.
+        synced = sync.finish(result['AarStart'])
+        if synced is None:
+            return None
+        metering_data['data'], line_state = synced
+        metering_data.update(line_state)
 
         _LOGGER.debug(f"Done parsing results")
         return metering_data
 
+    def _parse_water_lines(self, lines, metering_data):
+        '''
+        Parse daily water lines into the columns of their data points, see _parse_heating_lines().
+        A line without an M3 reading gets zeroes, which would be really weird.
+        '''
+        # The dates of a line are usually those of the lines next to it, so decode them with one memo
+        dates = {}
+        columns = {
+            "DateFrom" : decode_dates([fl["FraDatoStr"] for fl in lines], dates),
+            "DateTo" : decode_dates([fl["TilDatoStr"] for fl in lines], dates),
+        }
+        if not lines:
+            return columns | {field: [] for field in WATER_SERIES_FIELDS}
+
+        water_readings = [None] * len(lines)
+        for index, fl in enumerate(lines):
+            for reading in fl['TForbrugsTaellevaerk']:
+                if reading['IndexNavn'] == "M3":
+                    water_readings[index] = reading
+        water_lines = [index for index, reading in enumerate(water_readings) if reading is not None]
+
+        values = {}
+        for key, reading_field in (('water-start', 'Start'), ('water-end', 'Slut'), ('water-used', 'Forbrug')):
+            # Initialise data - just in case data is missing
+            values[key] = [0.0] * len(lines)
+            for index, value in zip(water_lines, decode_numbers([water_readings[index][reading_field] for index in water_lines])):
+                values[key][index] = value
+        values['water-exp-used'] = decode_numbers([fl['ForventetForbrugM3'] for fl in lines])
+        values['water-exp-end'] = decode_numbers([fl['ForventetAflaesningM3'] for fl in lines])
+        for key, column in values.items():
+            metering_data[key] = column[-1]
+
+        columns["Start"] = values['water-start']
+        columns["End"] = values['water-start']
+        columns["Used"] = values['water-used']
+        columns["ExpUsed"] = values['water-exp-used']
+        columns["ExpEnd"] = values['water-exp-end']
+        return columns
+
+    def _sync_daily_series(self, result, series, parse_lines, fields, date_format):
+        '''
+        Give all the daily lines of a getforbrug result to a _DailySeriesSync of the series.
+        A stored series which does not match the lines is left out, so the sync always finishes.
+        '''
+        lines = result['ForbrugsLinjer']['TForbrugsLinje']
+        resume = series is not None and series.get('period') == result['AarStart']
+        sync = _DailySeriesSync(series, parse_lines, fields, date_format, resume)
+        if resume and (series['seed_index'] > len(lines) or
+                       (series['seed_index'] > 0 and lines[series['seed_index'] - 1]['TilDatoStr'] != series['seed_date'])):
+            _LOGGER.debug(f"Daily series does not match the stored series.  Parsing all lines.")
+            sync = _DailySeriesSync(series, parse_lines, fields, date_format, resume=False)
+        sync.add_lines(lines)
+        return sync
+
     def _parse_result_billing(self, result):
         '''
         Parse result from API call. This is a JSON dict.
@@ -982,140 +1778,61 @@ class Eforsyning:
         '''
         _LOGGER.debug(f"Parsing results - billing")
 
-        # Only one field - which has an array of data
-        result = result['faktlini']
-
-        energy_prognosis = 0.0
-        energy_price = 0.0
-        energy_total_used = 0.0
-        energy_total_used_price = 0.0
-        m3_prognosis = 0.0
-        m3_price = 0.0
-        m3_total_used = 0.0
-        m3_prognosis_price = 0.0
-        m3_prognosis_price = 0.0
-        amount_vat = 0.0
-        amount_energy = 0.0
-        amount_total = 0.0
-        amount_advance = 0.0
-        amount_remaining = 0.0
-
-        multiplier = 1000 # scaling factor to kWh frm MWh
-        multiplier_gj = 227.78 # Scaling factor to kWh from from GJ
-
-        for record in result:
-            if record['linieType'] == "0":
-                continue
-            elif record['linieType'] == "1":
-                # Fixed payment - differences here, some have a unit price
-                m3_prognosis_price = self._stof(record['ialt'])
-                if record['enhed'] == "m3":
-                    m3_prognosis = self._stof(record['antalEnheder'])
-                    m3_price = round(m3_prognosis_price/m3_prognosis, 2)
-                continue
-            elif record['linieType'] == "3":
-                if "Afkøling" in record['tekst']:
-                    # Average cooling - not used
-                    continue
-                elif any(test_str in record['tekst'] for test_str in ["Prognose", "Forventet forbrug"]):
-                    if record['enhed'] == "MWh":
-                        # Prognosis heating in MWh scaled to kWh
-                        energy_prognosis = self._stof(record['antalEnheder'], scale=multiplier)
-                        continue
-                    elif record['enhed'] == "Gj":
-                        # Prognosis heating in GJ scaled to kWh
-                        energy_prognosis = self._stof(record['antalEnheder'], scale=multiplier_gj)
-                        continue
-                    else:
-                        # Not a prognosis in MWh or GJ - not used
-                        continue
-                elif record['enhed'] == "MWh":
-                    # Price of comsumption of energy.
-                    # If there are more records like these, it would seen the price may have been adjusted.
-                    # Calculate the average MWh price in that case.
-                    energy_total_used_price += self._stof(record['ialt'])
-                    energy_total_used += self._stof(record['antalEnheder'], scale=multiplier)
-                    energy_price = round(multiplier*energy_total_used_price/energy_total_used, 2)
-                    continue
-                elif record['enhed'] == "Gj":
-                    # Price of comsumption of energy.
-                    # If there are more records like these, it would seen the price may have been adjusted.
-                    # Calculate the average GJ price in that case.
-                    energy_total_used_price += self._stof(record['ialt'])
-                    energy_total_used += self._stof(record['antalEnheder'], scale=multiplier_gj)
-                    energy_price = round(multiplier_gj*energy_total_used_price/energy_total_used, 2)
-                    continue
-                elif record['enhed'] == "M3":
-                    # Consumption in M3 (water passed through the system)
-                    m3_total_used += self._stof(record['antalEnheder'])
-                    continue
-                else:
-                    # Something else
-                    continue
-            elif record['linieType'] == "10":
-                # Amount VAT
-                amount_vat = self._stof(record['ialt'])
-                continue
-            elif record['linieType'] == "12":
-                if record['tekst'] == "Samlet varmeforbrug":
-                    # Price of MWh totalled
-                    amount_energy = self._stof(record['ialt'])
-                    continue
-                elif any(test_str in record['tekst'] for test_str in ["Total (incl.moms)", "Total, inkl. moms"]):
-                    # Price totalled incl. VAT
-                    amount_total = self._stof(record['ialt'])
-                    continue
-                elif record['tekst'] == "\u00c5rets forventede resultat":
-                    # Price totalled incl. VAT
-                    amount_total = self._stof(record['ialt'])
-                    continue
-                elif any(test_str in record['tekst'] for test_str in ["Til udbetaling", "Tilbagebetaling"]):
-                    # Remaining expected remuneration (indicated by a negative number)
-                    amount_remaining = -self._stof(record['ialt'])
-                    continue
-                elif any(test_str in record['tekst'] for test_str in ["Til indbetaling", "For lidt opkr\u00e6vet", "Forel\u00f8big beregnet efterbetaling"]):
-                    # Remaining expected payment (indicated by a positive number)
-                    amount_remaining = self._stof(record['ialt'])
-                    continue
-                else:
-                    # Something else, like amount excl. VAT, too much paid, too little paid - not used
-                    continue
-            elif record['linieType'] == "13":
-                continue
-            elif record['linieType'] == "18":
-                if "Restance" in record['tekst']:
-                    continue
-                else:
-                    # Advance payments (negative number in the report)
-                    amount_advance = -self._stof(record['ialt'])
-                    continue
-            elif record['linieType'] == "20":
-                # Expected future payments (positive), or paid-back (negative)
-                # Not used
-                continue
-            elif record['linieType'] == "22":
-                # If return temperature is too high, you have to pay a extra fee.
-                continue
+        # Only one field - which has an array of data.  The lines are recognized by the rules in billing.py.
+        totals, unmatched = classify_billing_lines(result['faktlini'], self._billing_classifier)
+        if unmatched:
+            _LOGGER.debug(f"Billing lines not recognized: {[(record['linieType'], record['tekst']) for record in unmatched]}")
+        self._unmatched_billing_lines = unmatched
 
         metering_data = {}
-        metering_data['energy-total-used'] = energy_total_used
-        metering_data['energy-use-prognosis'] =  energy_total_used + energy_prognosis
-        metering_data['water-total-used'] = m3_total_used
-        metering_data['water-use-prognosis'] = m3_prognosis
-        metering_data['amount-remaining'] = amount_remaining
+        metering_data['energy-total-used'] = totals.energy_total_used
+        metering_data['energy-use-prognosis'] =  totals.energy_total_used + totals.energy_prognosis
+        metering_data['water-total-used'] = totals.m3_total_used
+        metering_data['water-use-prognosis'] = totals.m3_prognosis
+        metering_data['amount-remaining'] = totals.amount_remaining
 
         # Save all relevant other data so it can be extracted by users of the API (like HomeAssistant attributes)
         metering_data['billing'] = {
             "Date": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-            "MWh-Price" : energy_price,
-            "M3-Price" : m3_price,
-            "Amount-MWh" : amount_energy,
-            "Amount-M3" : m3_prognosis_price,
-            "Amount-VAT" : amount_vat,
-            "Amount-Total" : amount_total,
-            "Amount-Paid" : amount_advance,
-            "Amount-Remaining" : amount_remaining,
+            "MWh-Price" : totals.energy_price,
+            "M3-Price" : totals.m3_price,
+            "Amount-MWh" : totals.amount_energy,
+            "Amount-M3" : totals.m3_prognosis_price,
+            "Amount-VAT" : totals.amount_vat,
+            "Amount-Total" : totals.amount_total,
+            "Amount-Paid" : totals.amount_advance,
+            "Amount-Remaining" : totals.amount_remaining,
         }
 
         _LOGGER.debug(f"Done parsing results")
         return metering_data
+
+
+class Eforsyning:
+    '''
+    Synchronous interface for eforsyning.dk API wrapper.
+    Runs an AsyncEforsyning on a private event loop.  Use it from scripts and other code which is
+    not running in an event loop.  Home Assistant uses AsyncEforsyning directly.
+    '''
+    def __init__(self, username, password, supplierid, billing_period_skew, is_water_supply, pool_size=DEFAULT_POOL_SIZE,
+                 base_url=DEFAULT_BASE_URL):
+        self._loop = asyncio.new_event_loop()
+        self._client = AsyncEforsyning(username, password, supplierid, billing_period_skew, is_water_supply,
+                                       pool_size=pool_size, base_url=base_url)
+
+    def authenticate(self):
+        return self._loop.run_until_complete(self._client.authenticate())
+
+    def get_latest(self, installation=None):
+        return self._loop.run_until_complete(self._client.get_latest(installation))
+
+    def get_latest_all(self):
+        return self._loop.run_until_complete(self._client.get_latest_all())
+
+    @property
+    def metrics(self):
+        return self._client.metrics
+
+    def close(self):
+        self._loop.run_until_complete(self._client.close())
+        self._loop.close()
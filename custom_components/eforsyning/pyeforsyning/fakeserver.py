@@ -0,0 +1,499 @@
+'''
+Local stand-in for the eforsyning.dk API, for working without the real services.
+
+FakeEforsyningServer answers every request the client makes: GetVaerkSettings as eforsyning.dk,
+and getsecuritytoken, login and the data endpoints getebrugerinfo, FindInstallationer,
+getaktuelaarsmaerke, getforbrug and getberegnregnskab as the supplier API server.  The data is
+made up per username by SyntheticData (see synthetic.py), or replayed from a Recording.  Latency,
+errors, rate limiting and token expiry can be added to see how the client copes.
+
+RecordingProxy sits between the client and the real API and records the responses of the data
+endpoints, anonymized, so the session can be replayed later.
+
+Run with:
+  python -m pyeforsyning.fakeserver [--port 8080] serve [--water] [--years N] [--installations N] [--billing-layout mwh|gj]
+  python -m pyeforsyning.fakeserver [--port 8080] replay session.json
+  python -m pyeforsyning.fakeserver [--port 8080] record session.json [--upstream https://eforsyning.dk/]
+and give the printed base URL to the client: python -m pyeforsyning --base-url http://127.0.0.1:8080/ ...
+The faults are options before the mode: --latency, --jitter, --error-rate, --rate-limit, --burst, --token-lifetime
+'''
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import secrets
+import sys
+import time
+import zlib
+
+import aiohttp
+from aiohttp import web
+
+from .eforsyning import DEFAULT_BASE_URL
+from .synthetic import (BILLING_LAYOUTS, no_year_result, synthetic_billing_result, synthetic_heating_result,
+                        synthetic_water_result, synthetic_year_result)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Path of the fake API server below the base URL
+API_SITE = "fake/"
+
+SETTINGS_PATH = "/umbraco/dff/dffapi/GetVaerkSettings"
+
+# Request headers of the client passed on by the recording proxy
+FORWARDED_HEADERS = ("Accept", "X-Session-ID", "X-Correlation-ID", "User-Agent")
+
+RECORDING_VERSION = 1
+
+def response_key(endpoint, query, body):
+    '''
+    The key of the responses of a data endpoint in a recording.  The responses of getforbrug
+    and getberegnregnskab depend on the installation, and those of getforbrug on the filter
+    and year as well.
+    '''
+    if endpoint not in ("getforbrug", "getberegnregnskab"):
+        return endpoint
+    key = f"{endpoint}/{query.get('inr', '')}-{query.get('anr', '')}"
+    if endpoint == "getforbrug":
+        key += f"/{body.get('Aflaesningsfilter', '')}/{body.get('AarsMaerke', '')}"
+    return key
+
+class SyntheticData:
+    '''
+    Made up data of any username.  Each account has daily data of the number of billing years
+    given, the current one running up to yesterday, and the number of installations given.
+    The values differ between the usernames but are the same every time.
+    '''
+    def __init__(self, is_water_supply=False, years=3, installations=1, billing_layout="mwh", seed=0, today=None):
+        if billing_layout not in BILLING_LAYOUTS:
+            raise ValueError(f"Unknown billing layout: {billing_layout}")
+        self._is_water_supply = is_water_supply
+        self._years = years
+        self._installations = installations
+        self._billing_layout = billing_layout
+        self._seed = seed
+        self._today = today
+
+    def _latest_year(self):
+        # The current billing year has data up to yesterday
+        return ((self._today or date.today()) - timedelta(days=1)).year
+
+    def _daily_result(self, username, installation, year):
+        first_date = date(year, 1, 1)
+        year_end = date(year, 12, 31)
+        if year < self._latest_year():
+            days = (year_end - first_date).days + 1
+        else:
+            days = ((self._today or date.today()) - first_date).days
+        return _synthetic_result(self._is_water_supply, f"{self._seed}/{username}/{installation}/{year}",
+                                 first_date, days, year_end)
+
+    def respond(self, endpoint, username, query, body):
+        '''
+        The HTTP status and the JSON data of a data endpoint.
+        '''
+        latest_year = self._latest_year()
+        if endpoint == "getebrugerinfo":
+            return 200, {"id": zlib.crc32(f"{self._seed}/{username}".encode()),
+                         "indflyttet": f"01-01-{latest_year - self._years + 1}"}
+        if endpoint == "FindInstallationer":
+            return 200, {"Installationer": [
+                {"EjendomNr": 1000 + number, "Adresse": f"Testvej {number}", "InstallationNr": number,
+                 "ForbrugerNr": str(2000 + number), "MålerNr": str(3000 + number), "By": "Testby",
+                 "PostNr": "9999", "AktivNr": 10 + number, "Målertype": "Vand" if self._is_water_supply else "Varme"}
+                for number in range(1, self._installations + 1)
+            ]}
+        if endpoint == "getaktuelaarsmaerke":
+            return 200, {"aarsmaerke": latest_year, "aarsmaerke_start": f"01-01-{latest_year}",
+                         "aarsmaerke_slut": f"31-12-{latest_year}"}
+        if endpoint == "getforbrug":
+            year = int(body.get("AarsMaerke", latest_year))
+            if not latest_year - self._years < year <= latest_year:
+                return 200, no_year_result(year)
+            result = self._daily_result(username, query.get("inr"), year)
+            if body.get("Aflaesningsfilter") == "afDagsvis":
+                return 200, result
+            return 200, synthetic_year_result(result)
+        if endpoint == "getberegnregnskab":
+            if self._is_water_supply:
+                return 200, {"faktlini": []}
+            result = self._daily_result(username, query.get("inr"), latest_year)
+            return 200, synthetic_billing_result(result, self._billing_layout)
+        return 404, f"Unknown endpoint {endpoint}"
+
+@lru_cache(maxsize=32)
+def _synthetic_result(is_water_supply, seed, first_date, days, year_end):
+    if is_water_supply:
+        return synthetic_water_result(days, seed, first_date, year_end, water=50.0 + 100.0 * (first_date.year - 2000))
+    return synthetic_heating_result(days, seed, first_date, year_end, energy=100.0 + 10.0 * (first_date.year - 2000),
+                                    water=500.0 + 150.0 * (first_date.year - 2000))
+
+class Recording:
+    '''
+    Recorded responses of the data endpoints by response_key().  The responses recorded more
+    than once under a key are replayed in the order they were recorded, and the last one is repeated.
+    '''
+    def __init__(self, responses=None):
+        self.responses = {} if responses is None else responses
+        self._replayed = Counter()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version: {data.get('version')}")
+        return cls(data["responses"])
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"version": RECORDING_VERSION, "responses": self.responses}, file, ensure_ascii=False, indent=1)
+
+    def add(self, key, status, body):
+        self.responses.setdefault(key, []).append({"status": status, "body": body})
+
+    def respond(self, endpoint, username, query, body):
+        '''
+        The HTTP status and the JSON data (or text) of a data endpoint.  The same data is
+        replayed for all usernames.
+        '''
+        key = response_key(endpoint, query, body)
+        responses = self.responses.get(key)
+        if not responses:
+            if endpoint == "getforbrug":
+                return 200, no_year_result(body.get("AarsMaerke"))
+            return 404, f"Nothing recorded for {key}"
+        response = responses[min(self._replayed[key], len(responses) - 1)]
+        self._replayed[key] += 1
+        return response["status"], response["body"]
+
+class Anonymizer:
+    '''
+    Removes what identifies the consumer from the recorded responses.
+    The numbers of the user, property, meters and installations are replaced by a running
+    number per field, so they still match between the responses and the requests of a replay.
+    Addresses are replaced, of the user info only the fields used are kept, and long runs of
+    digits in texts (like meter numbers in the billing lines) are zeroed.
+    '''
+    NUMBER_FIELDS = ("id", "EjendomNr", "InstallationNr", "ForbrugerNr", "MålerNr", "AktivNr")
+    TEXT_FIELDS = {"Adresse": "Testvej 1", "By": "Testby", "PostNr": "9999"}
+    USER_INFO_FIELDS = ("id", "indflyttet")
+    # Query parameters holding the numbers of NUMBER_FIELDS
+    QUERY_FIELDS = {"inr": "InstallationNr", "anr": "AktivNr"}
+    _DIGIT_RUN = re.compile(r"\d{6,}")
+
+    def __init__(self):
+        self._numbers = {}
+
+    def _number(self, field, value):
+        numbers = self._numbers.setdefault(field, {})
+        number = numbers.setdefault(str(value), len(numbers) + 1)
+        return number if isinstance(value, int) else str(number)
+
+    def query(self, query):
+        return {name: self._number(self.QUERY_FIELDS[name], value) if name in self.QUERY_FIELDS else value
+                for name, value in query.items()}
+
+    def response(self, endpoint, data):
+        if endpoint == "getebrugerinfo" and isinstance(data, dict):
+            data = {key: value for key, value in data.items() if key in self.USER_INFO_FIELDS}
+        return self._anonymize(data)
+
+    def _anonymize(self, data):
+        if isinstance(data, dict):
+            return {key: self._field(key, value) for key, value in data.items()}
+        if isinstance(data, list):
+            return [self._anonymize(value) for value in data]
+        if isinstance(data, str):
+            return self._DIGIT_RUN.sub(lambda match: "0" * len(match.group()), data)
+        return data
+
+    def _field(self, key, value):
+        if key in self.NUMBER_FIELDS and isinstance(value, (int, str)):
+            return self._number(key, value)
+        if key in self.TEXT_FIELDS:
+            return self.TEXT_FIELDS[key]
+        return self._anonymize(value)
+
+class _Server:
+    '''
+    An aiohttp server on a local port.  Use it as an async context manager or start() and stop() it.
+    '''
+    def __init__(self):
+        self._runner = None
+        self.base_url = None
+
+    def _make_app(self):
+        raise NotImplementedError
+
+    async def start(self, host="127.0.0.1", port=0):
+        '''
+        Start serving.  With port 0 a free port is picked.  The client base URL is in base_url.
+        '''
+        self._runner = web.AppRunner(self._make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.base_url = f"http://{host}:{self._runner.addresses[0][1]}/"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+def _json_response(status, data):
+    if isinstance(data, str):
+        return web.Response(status=status, text=data)
+    return web.Response(status=status, text=json.dumps(data, ensure_ascii=False), content_type="application/json")
+
+async def _request_body(request):
+    text = await request.text()
+    if not text:
+        return {}
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise web.HTTPBadRequest(text="Body is not JSON")
+
+class FakeEforsyningServer(_Server):
+    '''
+    Fake eforsyning.dk and supplier API server.  data is a SyntheticData or a Recording,
+    by default SyntheticData().
+    Any username and password can log in, unless passwords ({username: password}) is given.  Then
+    the login of other usernames or with a wrong password is rejected.  A data request with an unknown token, or one older than
+    token_lifetime seconds, is answered with HTTP 401.  Every request is delayed by latency seconds
+    plus up to jitter seconds, fails with HTTP 500 at random at error_rate, and is answered with
+    HTTP 429 when more than rate_limit requests per second (bursts of burst) arrive.
+    The number of requests per endpoint and of the faults are counted in requests and faults.
+    '''
+    def __init__(self, data=None, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None, burst=10,
+                 token_lifetime=None, seed=0, passwords=None):
+        super().__init__()
+        self._passwords = passwords
+        self.data = SyntheticData() if data is None else data
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._rate_limit = rate_limit
+        self._burst = burst
+        self._token_lifetime = token_lifetime
+        self._random = random.Random(seed)
+        self._allowance = float(burst)
+        self._allowance_updated = time.monotonic()
+        # Access tokens logged in: {token: (username, login time)}, and the last security token by username
+        self._tokens = {}
+        self._security_tokens = {}
+        self.requests = Counter()
+        self.faults = Counter()
+
+    def _make_app(self):
+        @web.middleware
+        async def faults(request, handler):
+            return await self._faults(request, handler)
+
+        app = web.Application(middlewares=[faults])
+        app.router.add_get(SETTINGS_PATH, self._settings, name="GetVaerkSettings")
+        app.router.add_get(f"/{API_SITE}system/getsecuritytoken/project/app/consumer/{{username}}",
+                           self._security_token, name="getsecuritytoken")
+        app.router.add_get(f"/{API_SITE}system/login/project/app/consumer/{{username}}/installation/{{installation}}"
+                           "/id/{token}", self._login, name="login")
+        app.router.add_route("*", f"/{API_SITE}api/{{endpoint}}", self._api)
+        return app
+
+    def _is_rate_limited(self):
+        if self._rate_limit is None:
+            return False
+        now = time.monotonic()
+        self._allowance = min(self._burst, self._allowance + (now - self._allowance_updated) * self._rate_limit)
+        self._allowance_updated = now
+        if self._allowance < 1:
+            return True
+        self._allowance -= 1
+        return False
+
+    async def _faults(self, request, handler):
+        self.requests[request.match_info.get("endpoint") or request.match_info.route.name or request.path] += 1
+        delay = self._latency + self._random.uniform(0, self._jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self._is_rate_limited():
+            self.faults["rate_limited"] += 1
+            return web.Response(status=429, text="Too many requests", headers={"Retry-After": "1"})
+        if self._error_rate and self._random.random() < self._error_rate:
+            self.faults["errors"] += 1
+            return web.Response(status=500, text="Internal server error")
+        return await handler(request)
+
+    async def _settings(self, request):
+        return _json_response(200, {"AppServerUri": f"{request.url.origin()}/{API_SITE}"})
+
+    async def _security_token(self, request):
+        token = self._security_tokens[request.match_info["username"]] = secrets.token_hex(16)
+        return _json_response(200, {"Token": token})
+
+    async def _login(self, request):
+        username = request.match_info["username"]
+        if self._passwords is not None:
+            # The access token is md5(md5(password) + security token), see AsyncEforsyning._get_access_token()
+            password = self._passwords.get(username)
+            security_token = self._security_tokens.get(username)
+            expected = None if password is None or security_token is None else \
+                hashlib.md5((hashlib.md5(password.encode()).hexdigest() + security_token).encode()).hexdigest()
+            if request.match_info["token"] != expected:
+                self.faults["logins_rejected"] += 1
+                return _json_response(200, {"Result": 0})
+        self._tokens[request.match_info["token"]] = (username, time.monotonic())
+        return _json_response(200, {"Result": 1})
+
+    async def _api(self, request):
+        token = self._tokens.get(request.query.get("id", ""))
+        if token is not None and self._token_lifetime is not None \
+           and time.monotonic() - token[1] > self._token_lifetime:
+            del self._tokens[request.query["id"]]
+            self.faults["tokens_expired"] += 1
+            token = None
+        if token is None:
+            return web.Response(status=401, text="Unauthorized")
+        status, data = self.data.respond(request.match_info["endpoint"], token[0], request.query,
+                                         await _request_body(request))
+        return _json_response(status, data)
+
+class RecordingProxy(_Server):
+    '''
+    Passes the requests of the client on to the real API at upstream and records the responses
+    of the data endpoints, anonymized, in a Recording.  It is saved to path when stopped.
+    The API server named by GetVaerkSettings is replaced by the proxy, so all requests pass it.
+    '''
+    def __init__(self, path, upstream=DEFAULT_BASE_URL):
+        super().__init__()
+        self._path = path
+        self._upstream = upstream if upstream.endswith("/") else upstream + "/"
+        self._api_servers = []
+        self._session = None
+        self.recording = Recording()
+        self._anonymizer = Anonymizer()
+
+    def _make_app(self):
+        app = web.Application()
+        app.router.add_get(SETTINGS_PATH, self._settings)
+        app.router.add_route("*", "/upstream/{index}/{tail:.*}", self._forward)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._session = aiohttp.ClientSession()
+        return await super().start(host, port)
+
+    async def stop(self):
+        await super().stop()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self.recording.save(self._path)
+        _LOGGER.info(f"Saved {sum(map(len, self.recording.responses.values()))} responses to {self._path}")
+
+    async def _request(self, request, url):
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        async with self._session.request(request.method, url, params=request.query, headers=headers,
+                                         data=await request.read() or None) as result:
+            return result.status, await result.text()
+
+    async def _settings(self, request):
+        status, text = await self._request(request, self._upstream + SETTINGS_PATH[1:])
+        if status != 200:
+            return web.Response(status=status, text=text)
+        settings = json.loads(text)
+        if settings["AppServerUri"] not in self._api_servers:
+            self._api_servers.append(settings["AppServerUri"])
+        settings["AppServerUri"] = f"{request.url.origin()}/upstream/{self._api_servers.index(settings['AppServerUri'])}/"
+        return _json_response(200, settings)
+
+    async def _forward(self, request):
+        index = int(request.match_info["index"])
+        if index >= len(self._api_servers):
+            return web.Response(status=404, text="Unknown API server")
+        tail = request.match_info["tail"]
+        status, text = await self._request(request, self._api_servers[index] + tail)
+        if tail.startswith("api/"):
+            endpoint = tail[len("api/"):]
+            try:
+                data = json.loads(text)
+            except ValueError:
+                data = text
+            key = response_key(endpoint, self._anonymizer.query(dict(request.query)), await _request_body(request))
+            self.recording.add(key, status, self._anonymizer.response(endpoint, data))
+            _LOGGER.debug(f"Recorded {key}: {status}")
+        return web.Response(status=status, text=text, content_type="application/json")
+
+async def _serve(server, host, port):
+    await server.start(host, port)
+    print(f"Serving at {server.base_url}", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main():
+    '''
+    Main method
+    '''
+    parser = argparse.ArgumentParser("pyeforsyning.fakeserver")
+    parser.add_argument("--log", action="store", required=False)
+    parser.add_argument("--host", action="store", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Max. random seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with HTTP 500")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before HTTP 429")
+    parser.add_argument("--burst", type=int, default=10, help="Requests allowed in a burst with --rate-limit")
+    parser.add_argument("--token-lifetime", type=float, default=None, help="Seconds before a login expires")
+    parser.add_argument("--seed", type=int, default=0)
+    modes = parser.add_subparsers(dest="mode", required=True)
+    serve = modes.add_parser("serve", help="Serve synthetic data")
+    serve.add_argument("--water", action="store_true", help="Water supply instead of heating")
+    serve.add_argument("--years", type=int, default=3, help="Billing years of data")
+    serve.add_argument("--installations", type=int, default=1, help="Installations of each account")
+    serve.add_argument("--billing-layout", choices=BILLING_LAYOUTS, default="mwh")
+    replay = modes.add_parser("replay", help="Serve a recording")
+    replay.add_argument("recording")
+    record = modes.add_parser("record", help="Record the responses of the real API")
+    record.add_argument("recording")
+    record.add_argument("--upstream", default=DEFAULT_BASE_URL)
+
+    args = parser.parse_args()
+
+    if args.log:
+        numeric_level = getattr(logging, args.log.upper(), None)
+        if not isinstance(numeric_level, int):
+            raise ValueError('Invalid log level: %s' % args.log)
+        logging.basicConfig(level=numeric_level)
+
+    if args.mode == "record":
+        server = RecordingProxy(args.recording, args.upstream)
+    else:
+        if args.mode == "serve":
+            data = SyntheticData(args.water, args.years, args.installations, args.billing_layout, args.seed)
+        else:
+            data = Recording.load(args.recording)
+        server = FakeEforsyningServer(data, args.latency, args.jitter, args.error_rate, args.rate_limit,
+                                      args.burst, args.token_lifetime, args.seed)
+    try:
+        asyncio.run(_serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+'''
+Cache of the account metadata which rarely or never changes.
+'''
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field, fields
+import copy
+from datetime import datetime, timedelta
+import time
+
+# How long each section of the metadata is trusted before it is fetched again.
+METADATA_TTL = {
+    "api_server": timedelta(days=30),    # GetVaerkSettings - AppServerUri
+    "user_info": timedelta(days=7),      # getebrugerinfo - ebruger id and move-in date
+    "installation": timedelta(days=7),   # FindInstallationer - InstallationNr and AktivNr
+    "year_marker": timedelta(days=7),    # getaktuelaarsmaerke - current billing year
+}
+
+# The year marker is fetched on every update from this long before aarsmaerke_slut,
+# and until the supplier has moved it to the next billing year.
+YEAR_MARKER_REFRESH_WINDOW = timedelta(days=2)
+
+@dataclass
+class EforsyningMetadata:
+    '''
+    Metadata used to build the API requests.  The fetched field keeps the time
+    (seconds since epoch) each section was retrieved from the API.
+    Use to_dict()/from_dict() to persist it between restarts.
+    '''
+    api_server: str = ""
+    user_id: int | None = None
+    first_year: int | None = None
+    ## Must be strings - see where they are used.
+    ## The default installation, the first one of the account
+    installation_id: str = "1"
+    asset_id: str = "1"
+    ## All installations of the account: [{"installation_id", "asset_id", "meter_id", "address"}]
+    installations: list[dict[str, str]] = field(default_factory=list)
+    latest_year: int = 2000
+    latest_year_begin: str = ""
+    latest_year_end: str = ""
+    fetched: dict[str, float] = field(default_factory=dict)
+
+    def mark_fetched(self, section):
+        self.fetched[section] = time.time()
+
+    def invalidate(self, section=None):
+        '''
+        Forget when a section (or all of them) was fetched so it is fetched again on next use.
+        '''
+        if section is None:
+            self.fetched.clear()
+        else:
+            self.fetched.pop(section, None)
+
+    def is_fresh(self, section, now=None):
+        fetched = self.fetched.get(section)
+        if fetched is None:
+            return False
+        now = time.time() if now is None else now
+        return now - fetched < METADATA_TTL[section].total_seconds()
+
+    def year_marker_due(self, now=None):
+        '''
+        True if the year marker must be fetched: it is stale, or the end of the billing year is near or passed.
+        '''
+        now = time.time() if now is None else now
+        if not self.is_fresh("year_marker", now):
+            return True
+        try:
+            year_end = datetime.strptime(self.latest_year_end, "%d-%m-%Y")
+        except ValueError:
+            return True
+        return datetime.fromtimestamp(now) >= year_end - YEAR_MARKER_REFRESH_WINDOW
+
+    def to_dict(self):
+        # A copy, so the data handed out does not change with the metadata
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        known = {f.name for f in fields(cls)}
+        return cls(**{key: copy.deepcopy(value) for key, value in data.items() if key in known})
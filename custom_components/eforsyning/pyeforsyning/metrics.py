@@ -0,0 +1,257 @@
+'''
+Metrics of the API calls.
+
+A MetricsRegistry holds counters, gauges and histograms, each with a set of labels, and dumps
+them in the OpenMetrics text format for monitoring systems.  AsyncEforsyning records into an
+EforsyningMetrics: the requests, latency and response size per endpoint, the logins, the time
+spent parsing each section of the responses, and the duration of each update.  Objects can
+share one EforsyningMetrics to get the totals of many accounts, like the fleet CLI does.
+'''
+from __future__ import annotations
+
+import math
+
+# Histogram buckets: request latency in seconds, response sizes in bytes and parse time in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 16384, 131072, 1048576, 8388608)
+PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels):
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, not {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def labelsets(self):
+        '''
+        The label values recorded, as dicts.
+        '''
+        return [dict(zip(self.labelnames, key)) for key in self._values]
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def openmetrics(self):
+        lines = [f"# TYPE {self.name} {self.type}", f"# HELP {self.name} {_escape(self.documentation)}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    '''
+    A value which only goes up.
+    '''
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def total(self, **labels):
+        '''
+        Sum over the label values not given.
+        '''
+        return sum(value for key, value in self._values.items()
+                   if all(key[self.labelnames.index(name)] == str(label) for name, label in labels.items()))
+
+    def _samples(self):
+        if not self.labelnames and not self._values:
+            yield "_total", [], 0
+        for key, value in self._values.items():
+            yield "_total", list(zip(self.labelnames, key)), value
+
+class Gauge(_Metric):
+    '''
+    A value which is set.
+    '''
+    type = "gauge"
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield "", list(zip(self.labelnames, key)), value
+
+class Histogram(_Metric):
+    '''
+    Counts of observed values by bucket, with their count and sum.
+    '''
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        observed = self._values.get(key)
+        if observed is None:
+            # Counts per bucket (not cumulative), then the count and sum of all values
+            observed = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                observed[index] += 1
+                break
+        observed[-2] += 1
+        observed[-1] += value
+
+    def count(self, **labels):
+        observed = self._values.get(self._key(labels))
+        return 0 if observed is None else observed[-2]
+
+    def sum(self, **labels):
+        observed = self._values.get(self._key(labels))
+        return 0.0 if observed is None else observed[-1]
+
+    def mean(self, **labels):
+        count = self.count(**labels)
+        return self.sum(**labels) / count if count else None
+
+    def _samples(self):
+        for key, observed in self._values.items():
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, observed):
+                cumulative += count
+                yield "_bucket", labels + [("le", _format_value(float(bound)))], cumulative
+            yield "_count", labels, observed[-2]
+            yield "_sum", labels, observed[-1]
+
+class MetricsRegistry:
+    '''
+    The metrics by name.  Asking for a metric with a name already registered returns that one.
+    '''
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"{name} is registered as a {metric.type}")
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def openmetrics(self):
+        '''
+        All metrics in the OpenMetrics text format.
+        '''
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.openmetrics())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+class EforsyningMetrics(MetricsRegistry):
+    '''
+    The metrics recorded by AsyncEforsyning.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.requests = self.counter("eforsyning_requests", "API requests by endpoint and HTTP status",
+                                     ("endpoint", "status"))
+        self.request_seconds = self.histogram("eforsyning_request_seconds", "Latency of the API requests",
+                                              ("endpoint",), LATENCY_BUCKETS)
+        self.response_bytes = self.histogram("eforsyning_response_bytes", "Size of the API responses",
+                                             ("endpoint",), SIZE_BUCKETS)
+        self.logins = self.counter("eforsyning_logins", "Logins by result", ("result",))
+        self.reauthentications = self.counter("eforsyning_reauthentications",
+                                              "Logins because a data endpoint rejected the access token")
+        self.parse_seconds = self.histogram("eforsyning_parse_seconds", "Time spent parsing a section of the data",
+                                            ("section",), PARSE_BUCKETS)
+        self.updates = self.counter("eforsyning_updates", "Updates of all installations by result", ("result",))
+        self.update_seconds = self.histogram("eforsyning_update_seconds", "Duration of the updates")
+        self.update_requests = self.gauge("eforsyning_update_requests", "API requests of the last update")
+        self.last_update_seconds = self.gauge("eforsyning_last_update_seconds", "Duration of the last update")
+
+    def record_request(self, endpoint, status, seconds, size=None):
+        '''
+        Record a request.  The status is the HTTP status, or "error" or "timeout" when there was no response.
+        '''
+        self.requests.inc(endpoint=endpoint, status=status)
+        self.request_seconds.observe(seconds, endpoint=endpoint)
+        if size is not None:
+            self.response_bytes.observe(size, endpoint=endpoint)
+
+    def record_login(self, ok):
+        self.logins.inc(result="ok" if ok else "failed")
+
+    def record_parse(self, section, seconds):
+        self.parse_seconds.observe(seconds, section=section)
+
+    def record_update(self, ok, seconds, requests):
+        self.updates.inc(result="ok" if ok else "failed")
+        self.update_seconds.observe(seconds)
+        self.last_update_seconds.set(round(seconds, 3))
+        self.update_requests.set(requests)
+
+    def summary(self):
+        '''
+        The totals of the metrics as plain data, with the numbers per endpoint and parsed section.
+        '''
+        endpoints = {}
+        for labels in self.request_seconds.labelsets():
+            endpoint = labels["endpoint"]
+            mean = self.request_seconds.mean(endpoint=endpoint)
+            endpoints[endpoint] = {
+                "requests": self.requests.total(endpoint=endpoint),
+                "failed": self.requests.total(endpoint=endpoint) - self.requests.value(endpoint=endpoint, status=200),
+                "mean_ms": round(mean * 1000, 1),
+                "bytes": round(self.response_bytes.sum(endpoint=endpoint)),
+            }
+        requests = sum(endpoint["requests"] for endpoint in endpoints.values())
+        request_seconds = sum(self.request_seconds.sum(endpoint=endpoint) for endpoint in endpoints)
+        return {
+            "requests": requests,
+            "failed_requests": sum(endpoint["failed"] for endpoint in endpoints.values()),
+            "mean_latency_ms": round(request_seconds * 1000 / requests, 1) if requests else None,
+            "response_bytes": sum(endpoint["bytes"] for endpoint in endpoints.values()),
+            "logins": self.logins.value(result="ok"),
+            "failed_logins": self.logins.value(result="failed"),
+            "reauthentications": self.reauthentications.value(),
+            "updates": self.updates.total(),
+            "last_update_seconds": self.last_update_seconds.value(),
+            "last_update_requests": self.update_requests.value(),
+            "endpoints": endpoints,
+            "parse_ms": {labels["section"]: round(self.parse_seconds.mean(**labels) * 1000, 3)
+                         for labels in self.parse_seconds.labelsets()},
+        }
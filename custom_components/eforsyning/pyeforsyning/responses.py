@@ -0,0 +1,94 @@
+'''
+Decoding of the API responses.
+
+Every response body is checked and decoded in one place, exactly once.  orjson is used for the
+decoding when it is installed (Home Assistant ships it), else the json module.  The time spent
+decoding is recorded per endpoint in DecodeStats, so the cost of each response can be seen.
+'''
+import json
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Max. length of a response body quoted in an exception
+ERROR_BODY_LENGTH = 200
+
+class HTTPFailed(Exception):
+    """Exception class for API HTTP failures"""
+
+class HTTPStatusError(HTTPFailed):
+    """Exception class for responses with an HTTP status other than 200"""
+    def __init__(self, endpoint, status, body=""):
+        super().__init__(f"{endpoint} answered HTTP status {status}: {body[:ERROR_BODY_LENGTH]}")
+        self.endpoint = endpoint
+        self.status = status
+
+class InvalidResponse(HTTPFailed):
+    """Exception class for response bodies which are not the expected JSON"""
+    def __init__(self, endpoint, error, body=""):
+        super().__init__(f"{endpoint} answered with invalid JSON ({error}): {body[:ERROR_BODY_LENGTH]}")
+        self.endpoint = endpoint
+
+def loads(text):
+    '''
+    Decode JSON text with orjson if installed.
+    '''
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+class DecodeStats:
+    '''
+    Number of responses, bytes and decoding time per endpoint.
+    '''
+    def __init__(self):
+        self._endpoints = {}
+
+    def record(self, endpoint, size, seconds):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = {"responses": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0}
+        stats["responses"] += 1
+        stats["bytes"] += size
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def as_dict(self):
+        '''
+        {endpoint: {"responses", "bytes", "total_ms", "mean_ms", "max_ms"}}
+        '''
+        return {
+            endpoint: {
+                "responses": stats["responses"],
+                "bytes": stats["bytes"],
+                "total_ms": round(stats["seconds"] * 1000, 3),
+                "mean_ms": round(stats["seconds"] * 1000 / stats["responses"], 3),
+                "max_ms": round(stats["max_seconds"] * 1000, 3),
+            }
+            for endpoint, stats in self._endpoints.items()
+        }
+
+def check_status(endpoint, status_code, text):
+    '''
+    Raise HTTPStatusError unless the status is 200.
+    '''
+    if status_code != 200:
+        raise HTTPStatusError(endpoint, status_code, text)
+
+def decode_json(endpoint, text, stats=None, size=None, seconds=0.0):
+    '''
+    Decode a JSON response body.  Raises InvalidResponse if it is not JSON.
+    The decoding time is recorded in stats.  For a streamed body, where text is the rest of the
+    body, give the size of the whole body and the seconds spent decoding the streamed part.
+    '''
+    start = time.perf_counter()
+    try:
+        result = loads(text)
+    except ValueError as err:
+        raise InvalidResponse(endpoint, err, text) from err
+    if stats is not None:
+        stats.record(endpoint, len(text) if size is None else size, seconds + time.perf_counter() - start)
+    return result
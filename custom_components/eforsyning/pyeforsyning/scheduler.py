@@ -0,0 +1,172 @@
+'''
+Process wide scheduling of requests to the eforsyning.dk API hosts.
+
+The API owner will IP-ban clients which do not adhere to fair use.  All API objects in a
+process (like several config entries in Home Assistant) share one scheduler per API host.
+The scheduler spreads requests out using a token bucket and keeps a ledger of the number
+of calls per endpoint per day, which can be persisted using ledgers()/load_ledgers().
+'''
+from __future__ import annotations
+
+from datetime import date
+import asyncio
+import logging
+import time
+import weakref
+
+_LOGGER = logging.getLogger(__name__)
+
+# Token bucket defaults: a burst of requests is allowed, after that one request per second.
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 10
+# Soft limit on the number of calls per host per day.  A warning is logged when it is passed.
+DEFAULT_DAILY_BUDGET = 2000
+# Number of days kept in the ledger
+LEDGER_DAYS = 7
+
+class TokenBucket:
+    '''
+    Token bucket rate limiter.  Waiters are served in the order they arrive.
+    The tokens are shared by all event loops of the process, like the sync Eforsyning objects
+    which each run their own loop.  An asyncio.Lock is bound to one loop, so each loop gets its own.
+    '''
+    def __init__(self, rate, capacity):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._locks = weakref.WeakKeyDictionary()
+        self.waiting = 0
+
+    def _lock(self):
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    @property
+    def tokens(self):
+        self._refill()
+        return self._tokens
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            async with self._lock():
+                self._refill()
+                if self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self._rate)
+                    self._refill()
+                self._tokens -= 1
+        finally:
+            self.waiting -= 1
+
+class RequestScheduler:
+    '''
+    Scheduler of the requests to one API host.
+    '''
+    def __init__(self, host, rate=DEFAULT_RATE, burst=DEFAULT_BURST, daily_budget=DEFAULT_DAILY_BUDGET):
+        self.host = host
+        self.daily_budget = daily_budget
+        self._bucket = TokenBucket(rate, burst)
+        # {"<iso date>": {"<endpoint>": <calls>}}
+        self._ledger = {}
+        self._budget_warned = None
+
+    async def acquire(self, endpoint):
+        '''
+        Wait for a slot to send a request to endpoint and count it in the ledger.
+        '''
+        await self._bucket.acquire()
+        today = date.today().isoformat()
+        calls = self._ledger.setdefault(today, {})
+        calls[endpoint] = calls.get(endpoint, 0) + 1
+        if len(self._ledger) > LEDGER_DAYS:
+            for day in sorted(self._ledger)[:-LEDGER_DAYS]:
+                del self._ledger[day]
+
+        if self._budget_warned != today and sum(calls.values()) > self.daily_budget:
+            self._budget_warned = today
+            _LOGGER.warning(f"More than {self.daily_budget} calls to {self.host} today.  Consider polling less often to avoid an IP-ban.")
+
+    def usage(self):
+        '''
+        Current budget usage: calls today, per endpoint, and the state of the token bucket.
+        '''
+        calls = self._ledger.get(date.today().isoformat(), {})
+        total = sum(calls.values())
+        return {
+            "host": self.host,
+            "calls_today": total,
+            "daily_budget": self.daily_budget,
+            "budget_used": round(100 * total / self.daily_budget, 1) if self.daily_budget else None,
+            "endpoints": dict(calls),
+            "tokens_available": round(self._bucket.tokens, 2),
+            "queued": self._bucket.waiting,
+        }
+
+    @property
+    def ledger(self):
+        return self._ledger
+
+    def load_ledger(self, ledger):
+        '''
+        Merge a persisted ledger into this one, keeping the largest count seen.
+        '''
+        for day, calls in ledger.items():
+            day_calls = self._ledger.setdefault(day, {})
+            for endpoint, count in calls.items():
+                day_calls[endpoint] = max(day_calls.get(endpoint, 0), count)
+
+_SCHEDULERS: dict[str, RequestScheduler] = {}
+_PENDING_LEDGERS: dict[str, dict] = {}
+_LIMITS = {"rate": DEFAULT_RATE, "burst": DEFAULT_BURST, "daily_budget": DEFAULT_DAILY_BUDGET}
+
+def configure(rate=None, burst=None, daily_budget=None):
+    '''
+    Set the limits used for schedulers created from now on.
+    '''
+    for key, value in (("rate", rate), ("burst", burst), ("daily_budget", daily_budget)):
+        if value is not None:
+            _LIMITS[key] = value
+
+def get_scheduler(host):
+    '''
+    Get the process wide scheduler for an API host.
+    '''
+    scheduler = _SCHEDULERS.get(host)
+    if scheduler is None:
+        scheduler = _SCHEDULERS[host] = RequestScheduler(host, **_LIMITS)
+        if host in _PENDING_LEDGERS:
+            scheduler.load_ledger(_PENDING_LEDGERS.pop(host))
+    return scheduler
+
+def ledgers():
+    '''
+    The ledgers of all hosts as plain JSON data: {"<host>": {"<iso date>": {"<endpoint>": <calls>}}}
+    '''
+    data = dict(_PENDING_LEDGERS)
+    data.update({host: scheduler.ledger for host, scheduler in _SCHEDULERS.items()})
+    return data
+
+def load_ledgers(data):
+    '''
+    Load persisted ledgers.  Hosts without a scheduler yet get the ledger when it is created.
+    '''
+    for host, ledger in (data or {}).items():
+        if host in _SCHEDULERS:
+            _SCHEDULERS[host].load_ledger(ledger)
+        else:
+            _PENDING_LEDGERS[host] = ledger
+
+def usage():
+    '''
+    Budget usage of all hosts.
+    '''
+    return {host: scheduler.usage() for host, scheduler in _SCHEDULERS.items()}
@@ -0,0 +1,148 @@
+'''
+Compact columnar storage of the daily data points.
+
+A year of daily data as a list of dicts repeats every key string and keeps a boxed float per
+value.  DailySeries keeps one array('d') per field and the dates as day ordinals in array('i'),
+so a data point costs 8 bytes per field and 4 per date.  Rows in the dict shape used so far
+are made on demand.
+'''
+from __future__ import annotations
+
+from array import array
+from datetime import date
+
+from .decoders import iso_dates
+
+# Date formats of the data points.  Heating data uses plain dates, water data a timestamp.
+DATE_FORMAT_DAY = "%Y-%m-%d"
+DATE_FORMAT_TIMESTAMP = "%Y-%m-%dT%H:%M:%S.000Z"
+
+DATE_FIELDS = ("DateFrom", "DateTo")
+# The formats above are ISO dates with a suffix, which are made faster than by strftime
+_ISO_SUFFIXES = {DATE_FORMAT_DAY: "", DATE_FORMAT_TIMESTAMP: "T00:00:00.000Z"}
+
+class DailySeries:
+    '''
+    Daily data points stored by column.
+
+       fields       - names of the numeric fields, in the order of the row dicts
+       date_format  - strftime format of DateFrom and DateTo in the row dicts
+
+    Index or iterate it like the list of rows it replaces.  Slicing returns a new series.
+    column() and ordinals() give read-only views of the underlying arrays without copying.
+    '''
+    __slots__ = ("fields", "date_format", "_dates", "_columns")
+
+    def __init__(self, fields, date_format=DATE_FORMAT_DAY):
+        self.fields = tuple(fields)
+        self.date_format = date_format
+        self._dates = {name: array('i') for name in DATE_FIELDS}
+        self._columns = {name: array('d') for name in self.fields}
+
+    def append(self, row):
+        '''
+        Add a data point.  DateFrom and DateTo are day ordinals (date.toordinal()).
+        '''
+        for name, column in self._dates.items():
+            column.append(row[name])
+        for name, column in self._columns.items():
+            column.append(row[name])
+
+    def extend(self, columns):
+        '''
+        Add data points given by column: {"<field>": [values]} with all the fields and dates.
+        '''
+        for name, column in self._dates.items():
+            column.extend(columns[name])
+        for name, column in self._columns.items():
+            column.extend(columns[name])
+
+    def __len__(self):
+        return len(self._dates["DateTo"])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            result = DailySeries(self.fields, self.date_format)
+            result._dates = {name: column[index] for name, column in self._dates.items()}
+            result._columns = {name: column[index] for name, column in self._columns.items()}
+            return result
+        row = {name: self.format_date(column[index]) for name, column in self._dates.items()}
+        for name, column in self._columns.items():
+            row[name] = column[index]
+        return row
+
+    def __iter__(self):
+        return iter(self.to_rows())
+
+    def __eq__(self, other):
+        if not isinstance(other, DailySeries):
+            return NotImplemented
+        return (self.fields == other.fields and self.date_format == other.date_format
+                and self._dates == other._dates and self._columns == other._columns)
+
+    def column(self, field):
+        '''
+        Read-only view of the values of a field.
+        '''
+        return memoryview(self._columns[field]).toreadonly()
+
+    def ordinals(self, field="DateTo"):
+        '''
+        Read-only view of a date field as day ordinals.
+        '''
+        return memoryview(self._dates[field]).toreadonly()
+
+    def dates(self, field="DateTo"):
+        '''
+        A date field formatted as in the row dicts.
+        '''
+        suffix = _ISO_SUFFIXES.get(self.date_format)
+        if suffix is not None:
+            return iso_dates(self._dates[field], suffix)
+        return [self.format_date(ordinal) for ordinal in self._dates[field]]
+
+    def to_rows(self):
+        '''
+        The data points as the list of dicts returned before the series was columnar.
+        '''
+        columns = [(name, self.dates(name)) for name in self._dates]
+        columns += [(name, column.tolist()) for name, column in self._columns.items()]
+        names = [name for name, _ in columns]
+        return [dict(zip(names, values)) for values in zip(*(values for _, values in columns))]
+
+    @property
+    def nbytes(self):
+        '''
+        Size of the stored values in bytes.
+        '''
+        return sum(column.itemsize * len(column)
+                   for columns in (self._dates, self._columns) for column in columns.values())
+
+    def as_dict(self):
+        '''
+        Plain JSON data for persisting the series.  Load it again with from_dict().
+        '''
+        return {
+            "fields": list(self.fields),
+            "date_format": self.date_format,
+            "dates": {name: column.tolist() for name, column in self._dates.items()},
+            "columns": {name: column.tolist() for name, column in self._columns.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        result = cls(data["fields"], data["date_format"])
+        result._dates = {name: array('i', data["dates"][name]) for name in DATE_FIELDS}
+        # Values are never missing, but a JSON encoder may have written a NaN as null
+        result._columns = {name: array('d', (float("nan") if value is None else value for value in data["columns"][name]))
+                           for name in result.fields}
+        return result
+
+    def format_date(self, ordinal):
+        '''
+        A day ordinal formatted as the dates in the row dicts.
+        '''
+        suffix = _ISO_SUFFIXES.get(self.date_format)
+        if suffix is not None:
+            return date.fromordinal(ordinal).isoformat() + suffix
+        return date.fromordinal(ordinal).strftime(self.date_format)
@@ -0,0 +1,137 @@
+'''
+Streaming decoding of large JSON responses.
+
+A getforbrug response with daily lines for years is megabytes of JSON, and json.loads() of it
+makes all the lines as nested dicts before any of them is parsed.  JSONArrayStream decodes the
+elements of the array of lines one at a time as the body arrives, so only a batch of lines
+is held as dicts at any time.
+'''
+import codecs
+import hashlib
+import json
+import re
+import time
+
+_WHITESPACE_AND_COMMAS = re.compile(r"[\s,]*")
+
+_BEFORE_ARRAY = 0
+_IN_ARRAY = 1
+_AFTER_ARRAY = 2
+
+class JSONArrayStream:
+    '''
+    Incremental decoder of the array under key in a JSON document.
+    feed() the body in chunks of bytes as it arrives.  Each element of the array is decoded as
+    soon as it is complete and handed to on_elements in batches of batch_size elements.
+    The rest of the document is kept as text with the array left empty, and close() returns it.
+    The elements must be objects or arrays, which can not be mistaken for complete too early.
+    '''
+    def __init__(self, key, on_elements, batch_size=128):
+        self._marker = f'"{key}"'
+        self._on_elements = on_elements
+        self._batch_size = batch_size
+        self._decoder = json.JSONDecoder()
+        self.reset()
+
+    def reset(self):
+        '''
+        Start over on a new body.
+        '''
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._hash = hashlib.blake2b(digest_size=16)
+        self._buffer = ""
+        self._position = 0
+        self._state = _BEFORE_ARRAY
+        self._document = []
+        self._batch = []
+        self.size = 0
+        self.elements = 0
+        # Time spent decoding, not counting on_elements
+        self.decode_seconds = 0.0
+        self._handler_seconds = 0.0
+
+    @property
+    def fingerprint(self):
+        '''
+        BLAKE2b digest (16 bytes) of the body fed so far.
+        '''
+        return self._hash.digest()
+
+    def feed(self, data):
+        start = time.perf_counter()
+        self._hash.update(data)
+        self.size += len(data)
+        self._buffer = self._buffer[self._position:] + self._utf8.decode(data)
+        self._position = 0
+        self._process()
+        self._account(start)
+
+    def close(self):
+        '''
+        Hand over the last elements and return the document without them.
+        '''
+        start = time.perf_counter()
+        self._buffer = self._buffer[self._position:] + self._utf8.decode(b"", final=True)
+        self._position = 0
+        self._process()
+        if self._state == _IN_ARRAY:
+            raise json.JSONDecodeError("Unterminated array", self._buffer, 0)
+        self._document.append(self._buffer)
+        self._buffer = ""
+        self._flush()
+        self._account(start)
+        return "".join(self._document)
+
+    def _account(self, start):
+        self.decode_seconds += time.perf_counter() - start - self._handler_seconds
+        self._handler_seconds = 0.0
+
+    def _process(self):
+        if self._state == _BEFORE_ARRAY:
+            index = self._buffer.find(self._marker)
+            bracket = -1 if index < 0 else self._buffer.find("[", index + len(self._marker))
+            if bracket < 0:
+                # Keep what could be the start of the marker, the rest is part of the document
+                keep = max(len(self._buffer) - len(self._marker), 0) if index < 0 else index
+                self._document.append(self._buffer[:keep])
+                self._buffer = self._buffer[keep:]
+                return
+            self._document.append(self._buffer[:bracket + 1])
+            self._position = bracket + 1
+            self._state = _IN_ARRAY
+
+        if self._state == _IN_ARRAY:
+            buffer = self._buffer
+            position = self._position
+            while True:
+                position = _WHITESPACE_AND_COMMAS.match(buffer, position).end()
+                if position == len(buffer):
+                    break
+                if buffer[position] == "]":
+                    self._state = _AFTER_ARRAY
+                    break
+                try:
+                    element, position_after = self._decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Not complete yet, wait for more of the body
+                    break
+                position = position_after
+                self._batch.append(element)
+                self.elements += 1
+                if len(self._batch) >= self._batch_size:
+                    self._flush()
+            self._position = position
+
+        if self._state == _AFTER_ARRAY:
+            self._document.append(self._buffer[self._position:])
+            self._buffer = ""
+            self._position = 0
+            self._flush()
+
+    def _flush(self):
+        if self._batch:
+            batch = self._batch
+            self._batch = []
+            start = time.perf_counter()
+            self._on_elements(batch)
+            self._handler_seconds += time.perf_counter() - start
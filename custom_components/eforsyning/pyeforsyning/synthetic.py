@@ -0,0 +1,259 @@
+'''
+Synthetic API responses.
+
+Makes getforbrug and getberegnregnskab responses looking like the real ones, with random but
+reproducible values: the same arguments give the same response.  They are used by the fake API
+server (fakeserver.py) and the benchmark.
+
+Both billing layouts seen from the suppliers are made: "mwh" is the long report with MWh lines
+in the order described in AsyncEforsyning._parse_result_billing(), "gj" is the short report
+with Gj lines in another order.
+'''
+from datetime import date, timedelta
+import random
+
+BILLING_LAYOUTS = ("mwh", "gj")
+
+# Expected daily use of the synthetic installations
+EXPECTED_DAILY_MWH = 0.03
+EXPECTED_DAILY_M3 = 0.3
+
+# Prices of the synthetic billing reports
+PRICE_MWH = 433.80
+PRICE_FIXED_M3 = 13.14
+VAT_PERCENT = 25
+
+# MWh to Gj
+GJ_PER_MWH = 3.6
+
+def danish(value, decimals):
+    '''
+    Format a number like the API: "1.458,00"
+    '''
+    return f"{value:,.{decimals}f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+def _number(text):
+    return float(text.replace(".", "").replace(",", "."))
+
+def _date_text(day):
+    return day.strftime("%d-%m-%Y")
+
+def synthetic_heating_result(days, seed=0, first_date=date(2020, 1, 1), year_end=None,
+                             energy=100.0, water=500.0):
+    '''
+    A getforbrug response of a heating installation with a daily line for each day.
+    energy (MWh) and water (M3) are the meter readings at the start of the first day.
+    year_end is the end of the billing year, by default the day after the last line.
+    '''
+    rng = random.Random(seed)
+    lines = []
+    forward = return_ = cooling = 0.0
+    energy_used_total = water_used_total = 0.0
+    for day in range(days):
+        energy_used = rng.uniform(0.005, 0.060)
+        water_used = rng.uniform(0.1, 1.0)
+        temperatures = (rng.uniform(55, 65), rng.uniform(28, 35), rng.uniform(25, 35))
+        lines.append({
+            "FraDatoStr": _date_text(first_date + timedelta(days=day)),
+            "TilDatoStr": _date_text(first_date + timedelta(days=day + 1)),
+            "Tempfrem": danish(temperatures[0], 2),
+            "TempRetur": danish(temperatures[1], 2),
+            "Forv_Retur": "37,00",
+            "Afkoling": danish(temperatures[2], 2),
+            "ForventetForbrugM3": danish(EXPECTED_DAILY_M3, 3),
+            "ForventetAflaesningM3": danish(water + EXPECTED_DAILY_M3, 3),
+            "ForventetForbrugENG1": danish(EXPECTED_DAILY_MWH, 3),
+            "ForventetAflaesningENG1": danish(energy + EXPECTED_DAILY_MWH, 3),
+            "TForbrugsTaellevaerk": [
+                {"IndexNavn": "ENG1", "Enhed_Txt": "MWh", "Start": danish(energy, 3),
+                 "Slut": danish(energy + energy_used, 3), "Forbrug": danish(energy_used, 3)},
+                {"IndexNavn": "M3", "Enhed_Txt": "M3", "Start": danish(water, 3),
+                 "Slut": danish(water + water_used, 3), "Forbrug": danish(water_used, 3)},
+            ],
+        })
+        energy += energy_used
+        water += water_used
+        energy_used_total += energy_used
+        water_used_total += water_used
+        forward += temperatures[0]
+        return_ += temperatures[1]
+        cooling += temperatures[2]
+    count = max(days, 1)
+    totals = {
+        "FraDatoStr": _date_text(first_date),
+        "TilDatoStr": _date_text(first_date + timedelta(days=days)),
+        "Tempfrem": danish(forward / count, 2),
+        "TempRetur": danish(return_ / count, 2),
+        "Forv_Retur": "37",
+        "Afkoling": danish(cooling / count, 2),
+        "NeutraltOmraadeOvre": "37",
+        "NeutraltOmraadeNedre": "37",
+        "ForventetForbrugM3": danish(EXPECTED_DAILY_M3 * days, 3),
+        "ForventetForbrugENG1": danish(EXPECTED_DAILY_MWH * days, 3),
+        "TForbrugsTaellevaerk": [
+            {"IndexNavn": "ENG1", "Enhed_Txt": "MWh", "Forbrug": danish(energy_used_total, 3)},
+            {"IndexNavn": "M3", "Enhed_Txt": "M3", "Forbrug": danish(water_used_total, 3)},
+        ],
+    }
+    return _result(lines, totals, first_date, days, year_end)
+
+def synthetic_water_result(days, seed=0, first_date=date(2020, 1, 1), year_end=None, water=50.0):
+    '''
+    A getforbrug response of a water installation with a daily line for each day.
+    water (M3) is the meter reading at the start of the first day.
+    '''
+    rng = random.Random(seed)
+    lines = []
+    water_used_total = 0.0
+    for day in range(days):
+        water_used = rng.uniform(0.05, 0.6)
+        lines.append({
+            "FraDatoStr": _date_text(first_date + timedelta(days=day)),
+            "TilDatoStr": _date_text(first_date + timedelta(days=day + 1)),
+            "ForventetForbrugM3": danish(EXPECTED_DAILY_M3, 3),
+            "ForventetAflaesningM3": danish(water + EXPECTED_DAILY_M3, 3),
+            "TForbrugsTaellevaerk": [
+                {"IndexNavn": "M3", "Enhed_Txt": "M3", "Start": danish(water, 3),
+                 "Slut": danish(water + water_used, 3), "Forbrug": danish(water_used, 3)},
+            ],
+        })
+        water += water_used
+        water_used_total += water_used
+    totals = {
+        "FraDatoStr": _date_text(first_date),
+        "TilDatoStr": _date_text(first_date + timedelta(days=days)),
+        # The expected use of the full year
+        "ForventetForbrugM3": danish(EXPECTED_DAILY_M3 * 365, 3),
+        "TForbrugsTaellevaerk": [
+            {"IndexNavn": "M3", "Enhed_Txt": "M3", "Forbrug": danish(water_used_total, 3)},
+        ],
+    }
+    return _result(lines, totals, first_date, days, year_end)
+
+def _result(lines, totals, first_date, days, year_end):
+    if year_end is None:
+        year_end = first_date + timedelta(days=days)
+    return {
+        "AarStart": _date_text(first_date),
+        "AarSlut": _date_text(year_end),
+        "ForbrugsLinjer": {"AktuelLinjeNr": "0", "AntLinjer": str(days), "TForbrugsLinje": lines},
+        "IaltLinje": totals,
+    }
+
+def synthetic_year_result(result):
+    '''
+    The getforbrug response of the year reading (afMaanedsvis) matching a daily response.
+    '''
+    totals = result["IaltLinje"]
+    return {
+        "AarStart": result["AarStart"],
+        "AarSlut": result["AarSlut"],
+        "ForbrugsLinjer": {"AktuelLinjeNr": "0", "AntLinjer": "1", "TForbrugsLinje": [totals]},
+        "IaltLinje": totals,
+    }
+
+def no_year_result(year):
+    '''
+    The getforbrug response to a year without data.
+    '''
+    return {"response": f"TForb: Opslag på årsmærke fejlede(TForbrug.Beregn): {year}"}
+
+def _billing_line(line_type, tekst="", ialt="", units="", unit="", unit_price="", price_unit="",
+                  ekstra="", opl1="", opl2="", opl3="", opl4=""):
+    return {"ekstra": ekstra, "enhedPris": unit_price, "linieType": line_type, "antalEnheder": units,
+            "enhed": unit, "tekst": tekst, "prisEnhed": price_unit,
+            "opl4": opl4, "opl3": opl3, "opl2": opl2, "opl1": opl1, "ialt": ialt}
+
+def _amount(line_type, tekst, value):
+    return _billing_line(line_type, tekst, danish(value, 2), ekstra="kr.")
+
+def synthetic_billing_result(result, layout="mwh", year_days=365):
+    '''
+    A getberegnregnskab response matching a daily heating response, in the layout of BILLING_LAYOUTS.
+    The prognosis covers the rest of a billing year of year_days days, and the advance payments
+    are made monthly.
+    '''
+    if layout not in BILLING_LAYOUTS:
+        raise ValueError(f"Unknown billing layout: {layout}")
+    lines = result["ForbrugsLinjer"]["TForbrugsLinje"]
+    days = len(lines)
+    meters = {meter["IndexNavn"]: meter["Forbrug"] for meter in result["IaltLinje"]["TForbrugsTaellevaerk"]}
+    energy_used = _number(meters["ENG1"])
+    water_used = _number(meters["M3"])
+    energy_start = lines[0]["TForbrugsTaellevaerk"][0]["Start"] if lines else "0,000"
+    energy_end = lines[-1]["TForbrugsTaellevaerk"][0]["Slut"] if lines else "0,000"
+    water_start = lines[0]["TForbrugsTaellevaerk"][1]["Start"] if lines else "0,000"
+    water_end = lines[-1]["TForbrugsTaellevaerk"][1]["Slut"] if lines else "0,000"
+    prognosis = EXPECTED_DAILY_MWH * max(year_days - days, 0)
+    prognosis_period = f"{lines[-1]['TilDatoStr'] if lines else result['AarStart']} til {result['AarSlut']}"
+
+    fixed_m3 = EXPECTED_DAILY_M3 * year_days
+    amount_fixed = round(fixed_m3 * PRICE_FIXED_M3, 2)
+    amount_used = round(energy_used * PRICE_MWH, 2)
+    amount_prognosis = round(prognosis * PRICE_MWH, 2)
+    amount_energy = amount_used + amount_prognosis
+    amount_vat = round((amount_energy + amount_fixed) * VAT_PERCENT / 100, 2)
+    amount_total = amount_energy + amount_fixed + amount_vat
+    amount_advance = round(amount_total / 12, -1) * (days * 12 // year_days)
+    amount_remaining = amount_total - amount_advance
+
+    if layout == "mwh":
+        faktlini = [
+            _billing_line("0", "Varmeregnskab"),
+            _billing_line("0", f"Periode: {result['AarStart']} til {result['AarSlut']}"),
+            _billing_line("3", "MWh", danish(amount_used, 2), danish(energy_used, 3), "MWh",
+                          danish(PRICE_MWH, 2), "kr./MWh", "kr.", energy_start, "MWh", energy_end, "MWh"),
+            _billing_line("3", "", "", danish(water_used, 2), "M3", opl1=water_start, opl2="M3",
+                          opl3=water_end, opl4="M3"),
+            _billing_line("3", "Afkøling", "", result["IaltLinje"]["Afkoling"], "°C"),
+            _billing_line("0", ""),
+            _billing_line("3", f"Prognose: {prognosis_period}", danish(amount_prognosis, 2),
+                          danish(prognosis, 3), "MWh", danish(PRICE_MWH, 2), "kr./MWh", "kr."),
+            _amount("12", "Samlet varmeforbrug", amount_energy),
+            _billing_line("1", "Fastbidrag", danish(amount_fixed, 2), danish(fixed_m3, 2), "m3",
+                          danish(PRICE_FIXED_M3, 2), "kr./m3", "kr.", str(year_days), "dage"),
+            _billing_line("0", ""),
+            _billing_line("10", "Moms", danish(amount_vat, 2), danish(VAT_PERCENT, 2), "%",
+                          danish(amount_energy + amount_fixed, 2), "kr.", "kr."),
+            _billing_line("13"),
+            _amount("12", "Total (incl.moms)", amount_total),
+            _amount("18", "Tidl. opkrævet (incl. moms)", -amount_advance),
+            _billing_line("0", ""),
+            _amount("18", "Restance", 0.0),
+            _amount("20", "Forventede fremtidige betalinger", -amount_remaining),
+            _billing_line("0", ""),
+            _amount("12", "Til indbetaling " if amount_remaining >= 0 else "Til udbetaling ", abs(amount_remaining)),
+            _billing_line("0", "Temperaturer"),
+            _billing_line("22", "Fremløbstemperatur", units=result["IaltLinje"]["Tempfrem"], unit="°C"),
+            _billing_line("22", "Returtemperatur", units=result["IaltLinje"]["TempRetur"], unit="°C"),
+            _billing_line("22", "Forventet returtemperatur", units=result["IaltLinje"]["Forv_Retur"], unit="°C"),
+            _billing_line("22", "Returtemperaturtillæg", "0,00", ekstra="kr."),
+        ]
+    else:
+        price_gj = PRICE_MWH / GJ_PER_MWH
+        faktlini = [
+            _billing_line("0", "Forbrugsregnskab"),
+            # The text is the meter number
+            _billing_line("3", "12345678", danish(amount_used, 2), danish(energy_used * GJ_PER_MWH, 2), "Gj",
+                          danish(price_gj, 2), "kr./Gj", "kr.", danish(_number(energy_start) * GJ_PER_MWH, 2),
+                          "Gj", danish(_number(energy_end) * GJ_PER_MWH, 2), "Gj"),
+            _billing_line("3", f"Forventet forbrug: {prognosis_period}", danish(amount_prognosis, 2),
+                          danish(prognosis * GJ_PER_MWH, 2), "Gj", danish(price_gj, 2), "kr./Gj", "kr."),
+            _billing_line("3", "", "", danish(water_used, 2), "M3", opl1=water_start, opl2="M3",
+                          opl3=water_end, opl4="M3"),
+            _billing_line("1", "Fastbidrag", danish(amount_fixed, 2), danish(fixed_m3, 2), "m3",
+                          danish(PRICE_FIXED_M3, 2), "kr./m3", "kr.", str(year_days), "dage"),
+            _billing_line("0", ""),
+            _billing_line("10", "Moms", danish(amount_vat, 2), danish(VAT_PERCENT, 2), "%",
+                          danish(amount_energy + amount_fixed, 2), "kr.", "kr."),
+            _amount("12", "Årets forventede resultat", amount_total),
+            _amount("18", "Acontobetalinger", -amount_advance),
+            _billing_line("0", ""),
+            _amount("12", "Foreløbig beregnet efterbetaling" if amount_remaining >= 0 else "Tilbagebetaling",
+                    abs(amount_remaining)),
+            _billing_line("13"),
+            _amount("20", "Tilbagebetalt", 0.0),
+            _billing_line("0", "Beløbene er vejledende"),
+            _billing_line("0", ""),
+        ]
+    return {"faktlini": faktlini}
@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import Any, cast
 #from datetime import datetime
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 #from homeassistant.const import CONF_NAME
@@ -18,6 +18,7 @@ import logging
 _LOGGER = logging.getLogger(__name__)
 
 from .const import DOMAIN, WATER_SENSOR_TYPES, HEATING_TEMP_SENSOR_TYPES, HEATING_ENERGY_SENSOR_TYPES, HEATING_WATER_SENSOR_TYPES, BILLING_SENSOR_TYPES
+from .const import DIAGNOSTIC_SENSOR_TYPES
 from .model import EforsyningSensorDescription
 
 import uuid
@@ -97,21 +98,22 @@ async def async_setup_entry(
     #   ForbrugsLinjer.TForbrugsLinje[last].ForventetAflaesningM3 - ForbrugsLinjer.TForbrugsLinje[0].ForventetAflaesningM3
 
     # The sensors are defined in the const.py file
-    sensors: list[EforsyningSensor] = []
     if(config.data['is_water_supply']):
-        for description in WATER_SENSOR_TYPES:
-            sensors.append(EforsyningSensor(name, coordinator, description, config))
+        descriptions = WATER_SENSOR_TYPES
     else:
-        for description in HEATING_TEMP_SENSOR_TYPES:
-            sensors.append(EforsyningSensor(name, coordinator, description, config))
-        for description in HEATING_ENERGY_SENSOR_TYPES:
-            sensors.append(EforsyningSensor(name, coordinator, description, config))
-        for description in HEATING_WATER_SENSOR_TYPES:
-            sensors.append(EforsyningSensor(name, coordinator, description, config))
-        for description in BILLING_SENSOR_TYPES:
-            sensors.append(EforsyningSensor(name, coordinator, description, config))
+        descriptions = HEATING_TEMP_SENSOR_TYPES + HEATING_ENERGY_SENSOR_TYPES + HEATING_WATER_SENSOR_TYPES + BILLING_SENSOR_TYPES
+
+    # A set of sensors per installation of the account.  The installations are known after the first refresh.
+    sensors: list[EforsyningSensor] = []
+    for index, installation in enumerate(coordinator.api.installations):
+        for description in descriptions:
+            sensors.append(EforsyningSensor(name, coordinator, description, config, installation, default=index == 0))
 
-    async_add_entities(sensors)
+    # The diagnostic sensors cover the API calls of the whole account
+    diagnostic_sensors = [EforsyningDiagnosticSensor(name, coordinator, description, config)
+                          for description in DIAGNOSTIC_SENSOR_TYPES]
+
+    async_add_entities(sensors + diagnostic_sensors)
 
 
 class EforsyningSensor(CoordinatorEntity, SensorEntity):
@@ -126,22 +128,63 @@ class EforsyningSensor(CoordinatorEntity, SensorEntity):
     """
     entity_description: EforsyningSensorDescription
 
-    def __init__(self, name, coordinator, description, config):
+    def __init__(self, name, coordinator, description, config, installation, default=True):
         """Initialise the coordinator"""
         super().__init__(coordinator)
 
         """Initialize the sensor."""
         self.entity_description = description
+        self._installation = installation
         self._attrs: dict[str, Any] = {}
+        # What the state was written from last time - see _handle_coordinator_update()
+        self._written: tuple | None = None
 
         _LOGGER.debug(f"Registering Sensor for {self.entity_description.name}")
 
-        self._attr_name = f"{name} {description.name}"
         # Select a uuid based in username and supplierid as more instances can be loaded
         my_uuid = str(uuid.uuid3(uuid.NAMESPACE_URL, f"{config.data['username']}-{config.data['supplierid']}"))
-        self._attr_unique_id = f"eforsyning-{my_uuid}-{description.key}"
+        if default:
+            # The sensors of the default installation keep the names and ids they had with one installation
+            self._attr_name = f"{name} {description.name}"
+            self._attr_unique_id = f"eforsyning-{my_uuid}-{description.key}"
+        else:
+            self._attr_name = f"{name} {installation} {description.name}"
+            self._attr_unique_id = f"eforsyning-{my_uuid}-{installation}-{description.key}"
 
-        # Note: Data is stored in self.coordinator.data
+        # Note: Data is stored in self.coordinator.data by installation
+
+    @property
+    def _data(self) -> dict[str, Any] | None:
+        """The data of the installation of this sensor."""
+        if not self.coordinator.data:
+            return None
+        return self.coordinator.data.get(self._installation)
+
+    def _attribute_source(self):
+        """The part of the installation data the attributes are made from."""
+        data = self._data
+        if not data:
+            return None
+        if self.entity_description.key == "amount-remaining":
+            return data["billing"]
+        if self.entity_description.key == "temp-return-year":
+            return data["year"]
+        if self.entity_description.attribute_data:
+            return data["data"]
+        return None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only when the data of this sensor changed.
+           The API does not parse responses which are the same as last time, so the
+           attribute data is then the very same object as at the last write.
+        """
+        written = (self.available, self.native_value, self._attribute_source())
+        if self._written is not None \
+           and written[:2] == self._written[:2] and written[2] is self._written[2]:
+            return
+        self._written = written
+        super()._handle_coordinator_update()
 
     @property
     def extra_state_attributes(self):
@@ -149,24 +192,56 @@ class EforsyningSensor(CoordinatorEntity, SensorEntity):
            Filter attributes so they are relevant for the individual sensor.
         """
         self._attrs = {}
-        if self.coordinator.data:
+        data = self._data
+        if data:
             if self.entity_description.key == "amount-remaining":
-                self._attrs["data"] = self.coordinator.data["billing"]
+                self._attrs["data"] = data["billing"]
             elif self.entity_description.key == "temp-return-year":
-                self._attrs["data"] = self.coordinator.data["year"]
+                self._attrs["data"] = data["year"]
             elif self.entity_description.attribute_data:
-                self._attrs["data"] = []
-                for data_point in self.coordinator.data["data"]:
-                    self._attrs["data"].append({
-                        "date" : data_point["DateTo"],
-                        "value" : data_point[self.entity_description.attribute_data],
-                    })
+                # Built once per update by the coordinator and shared with the other sensors
+                self._attrs["data"] = self.coordinator.attribute_series(self._installation,
+                                                                        self.entity_description.attribute_data)
 
         return self._attrs
 
     @property
     def native_value(self) -> StateType:
-        if self.coordinator.data:
-            return cast(float, self.coordinator.data[self.entity_description.key])
+        data = self._data
+        if data:
+            return cast(float, data[self.entity_description.key])
         else:
             return None
+
+
+class EforsyningDiagnosticSensor(CoordinatorEntity, SensorEntity):
+    """Diagnostic sensor of the API calls of a config entry.
+       The value is read from the metrics summary of the API object, see pyeforsyning/metrics.py.
+    """
+    entity_description: EforsyningSensorDescription
+
+    def __init__(self, name, coordinator, description, config):
+        """Initialise the coordinator"""
+        super().__init__(coordinator)
+
+        """Initialize the sensor."""
+        self.entity_description = description
+        my_uuid = str(uuid.uuid3(uuid.NAMESPACE_URL, f"{config.data['username']}-{config.data['supplierid']}"))
+        self._attr_name = f"{name} {description.name}"
+        self._attr_unique_id = f"eforsyning-{my_uuid}-diagnostic-{description.key}"
+
+    @property
+    def available(self) -> bool:
+        """The metrics are there when the updates fail as well, which is when they are most useful."""
+        return True
+
+    @property
+    def extra_state_attributes(self):
+        """Return the part of the metrics summary set by attribute_data."""
+        if not self.entity_description.attribute_data:
+            return {}
+        return {"data": self.coordinator.api.metrics.summary()[self.entity_description.attribute_data]}
+
+    @property
+    def native_value(self) -> StateType:
+        return self.coordinator.api.metrics.summary()[self.entity_description.key]
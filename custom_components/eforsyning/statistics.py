@@ -0,0 +1,131 @@
+"""Import of the daily data into Home Assistant long-term statistics."""
+from __future__ import annotations
+from bisect import bisect_right
+from datetime import date
+from typing import Any
+import uuid
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+from homeassistant.util import slugify
+
+from .const import DOMAIN, HEATING_STATISTICS, WATER_STATISTICS, STATISTICS_BACKFILL_YEARS
+from .model import EforsyningStatisticDescription
+from .store import EforsyningStore
+from .pyeforsyning.eforsyning import AsyncEforsyning, SERIES_REVISION_WINDOW
+from .pyeforsyning.series import DailySeries
+
+import logging
+_LOGGER = logging.getLogger(__name__)
+
+class EforsyningStatistics:
+    """Import the daily data points of an installation as external statistics, one statistic per description.
+
+       Each data point becomes the hourly statistic starting at local midnight of its DateFrom.
+       Data points are imported once they are newer than the last settled one.  The newest
+       SERIES_REVISION_WINDOW points may still be revised by the supplier, so they are imported
+       again on the next update.  The import state is kept in the entry store:
+         backfill_year - next billing year to fetch history for, from the move-in year
+         settled       - day ordinal of the last data point which is not imported again
+         sums          - the sum of each statistic up to and including the settled data point
+       The default installation keeps the statistic ids and store section it had before the other
+       installations of the account were added, the others have the installation in them.
+    """
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, store: EforsyningStore,
+                 installation: str, default: bool = True) -> None:
+        self.hass = hass
+        self.store = store
+        self.installation = installation
+        self.descriptions: tuple[EforsyningStatisticDescription, ...] = \
+            WATER_STATISTICS if entry.data['is_water_supply'] else HEATING_STATISTICS
+        # Same as the sensors, to tell entries with the same name apart
+        my_uuid = str(uuid.uuid3(uuid.NAMESPACE_URL, f"{entry.data['username']}-{entry.data['supplierid']}"))
+        self._id_prefix = f"{DOMAIN}:{slugify(entry.data['entityname'])}_{my_uuid[:8]}"
+        self._name = entry.data['entityname']
+        self._section = "statistics"
+        if not default:
+            self._id_prefix = f"{self._id_prefix}_{slugify(installation)}"
+            self._name = f"{self._name} {installation}"
+            self._section = f"statistics_{installation}"
+        self._state: dict[str, Any] = store.get(self._section) or {}
+        # The latest daily series imported.  The API returns the same object when the data is unchanged.
+        self._imported: DailySeries | None = None
+
+    async def async_update(self, api: AsyncEforsyning, data: dict[str, Any] | None) -> None:
+        """Import new data points from the latest data.
+           Until the history is backfilled, a few past years are fetched and imported per update instead.
+           The sums run from the first imported day, so the latest data waits until the history is in.
+        """
+        if "recorder" not in self.hass.config.components:
+            return
+
+        metadata = api.metadata
+        backfill_year = self._state.setdefault("backfill_year", metadata.first_year or metadata.latest_year)
+        for _ in range(STATISTICS_BACKFILL_YEARS):
+            if backfill_year >= metadata.latest_year:
+                break
+            _LOGGER.debug(f"Backfilling statistics of {backfill_year}")
+            series = await api.get_daily_series(backfill_year, installation=self.installation)
+            if series is not None:
+                # A closed year is not revised any more
+                self._import(series, revision_window=0)
+            backfill_year = self._state["backfill_year"] = backfill_year + 1
+            self._save()
+
+        if backfill_year >= metadata.latest_year and data and data.get("data") \
+           and data["data"] is not self._imported:
+            if self._import(data["data"], revision_window=SERIES_REVISION_WINDOW):
+                self._save()
+            self._imported = data["data"]
+
+    def _import(self, series: DailySeries, revision_window: int) -> bool:
+        """Import the data points after the settled one and settle all but the revision window.
+           Returns False if there was nothing to import.
+        """
+        settled = self._state.get("settled", 0)
+        sums: dict[str, float] = self._state.setdefault("sums", {})
+        ordinals = series.ordinals("DateFrom")
+        first = bisect_right(ordinals, settled)
+        if first == len(series):
+            return False
+        # The last data point to settle in this import, or first - 1 if none
+        settle = max(len(series) - revision_window, first) - 1
+        starts = [dt_util.start_of_local_day(date.fromordinal(ordinal)) for ordinal in ordinals[first:]]
+
+        for description in self.descriptions:
+            values = series.column(description.field)[first:]
+            statistics: list[StatisticData] = []
+            if description.state_field:
+                states = series.column(description.state_field)[first:]
+                total = sums.get(description.key, 0.0)
+                for index, (start, value, state) in enumerate(zip(starts, values, states)):
+                    total += value
+                    statistics.append(StatisticData(start=start, state=state, sum=total))
+                    if first + index == settle:
+                        sums[description.key] = total
+            else:
+                for start, value in zip(starts, values):
+                    statistics.append(StatisticData(start=start, mean=value, min=value, max=value))
+
+            async_add_external_statistics(self.hass, self._metadata(description), statistics)
+
+        if settle >= first:
+            self._state["settled"] = ordinals[settle]
+        _LOGGER.debug(f"Imported {len(starts)} data points to statistics from {starts[0]}")
+        return True
+
+    def _metadata(self, description: EforsyningStatisticDescription) -> StatisticMetaData:
+        return StatisticMetaData(
+            has_mean=description.state_field is None,
+            has_sum=description.state_field is not None,
+            name=f"{self._name} {description.name}",
+            source=DOMAIN,
+            statistic_id=f"{self._id_prefix}_{description.key}",
+            unit_of_measurement=description.unit,
+        )
+
+    def _save(self) -> None:
+        self.store.set(self._section, self._state)
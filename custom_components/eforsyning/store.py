@@ -0,0 +1,69 @@
+"""Persistent storage for the Eforsyning integration."""
+from __future__ import annotations
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_VERSION, STORAGE_SAVE_DELAY, STORAGE_SEPARATE_SECTIONS, LEDGER_STORE
+from .pyeforsyning.scheduler import load_ledgers
+
+import logging
+_LOGGER = logging.getLogger(__name__)
+
+class EforsyningStore:
+    """Data kept between restarts for one config entry.
+       The data is a dictionary of sections, like the cached API metadata.
+       Saving is delayed so several sections changed in one update are written once.
+       The large sections (STORAGE_SEPARATE_SECTIONS) have a store file each and are only written
+       when they are set.
+    """
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store: Store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self._section_stores: dict[str, Store] = {
+            section: Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.{section}")
+            for section in STORAGE_SEPARATE_SECTIONS
+        }
+        self._data: dict[str, Any] = {}
+
+    async def async_load(self) -> None:
+        self._data = await self._store.async_load() or {}
+        for section, store in self._section_stores.items():
+            value = await store.async_load()
+            if value is not None:
+                self._data[section] = value
+            elif section in self._data:
+                # Saved in the main file before the section had its own.  Move it.
+                self.set(section, self._data[section])
+        _LOGGER.debug(f"Loaded stored sections: {list(self._data)}")
+
+    def get(self, section: str, default: Any = None) -> Any:
+        return self._data.get(section, default)
+
+    def set(self, section: str, value: Any) -> None:
+        self._data[section] = value
+        store = self._section_stores.get(section)
+        if store is not None:
+            store.async_delay_save(lambda: value, STORAGE_SAVE_DELAY)
+        else:
+            self._store.async_delay_save(self._main_data, STORAGE_SAVE_DELAY)
+
+    def _main_data(self) -> dict[str, Any]:
+        return {section: value for section, value in self._data.items() if section not in self._section_stores}
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
+        for store in self._section_stores.values():
+            await store.async_remove()
+
+async def async_get_ledger_store(hass: HomeAssistant) -> Store:
+    """Get the store of the request ledger.
+       The scheduler and its ledger of API calls are shared by all config entries,
+       so the ledger is loaded once when the first entry is set up.
+    """
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if LEDGER_STORE not in domain_data:
+        store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{LEDGER_STORE}")
+        load_ledgers(await store.async_load())
+        domain_data[LEDGER_STORE] = store
+    return domain_data[LEDGER_STORE]
@@ -0,0 +1,29 @@
+"""Test setup.
+
+The pyeforsyning library has no Home Assistant imports, so it is tested on its own.  Importing it
+as custom_components.eforsyning.pyeforsyning would load the integration and Home Assistant.
+The tests of the integration modules are skipped when Home Assistant is not installed.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "custom_components", "eforsyning"))
+sys.path.insert(0, ROOT)
+
+from pyeforsyning import scheduler
+
+
+@pytest.fixture(autouse=True)
+def fresh_schedulers():
+    """Give each test its own process wide schedulers, without rate limiting."""
+    saved = (dict(scheduler._SCHEDULERS), dict(scheduler._PENDING_LEDGERS), dict(scheduler._LIMITS))
+    scheduler._SCHEDULERS.clear()
+    scheduler._PENDING_LEDGERS.clear()
+    scheduler.configure(rate=1000, burst=1000, daily_budget=10**6)
+    yield
+    for registry, values in zip((scheduler._SCHEDULERS, scheduler._PENDING_LEDGERS, scheduler._LIMITS), saved):
+        registry.clear()
+        registry.update(values)
@@ -0,0 +1,62 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.eforsyning.attributes import build_attribute_data, compact, downsample_indices
+from custom_components.eforsyning.const import (ATTRIBUTE_MODE_COMPACT, ATTRIBUTE_MODE_DOWNSAMPLE,
+                                                ATTRIBUTE_MODE_FULL, ATTRIBUTE_MODE_WINDOW)
+from custom_components.eforsyning.pyeforsyning.series import DailySeries
+
+FIRST = date(2024, 1, 1).toordinal()
+
+
+def _series(days):
+    series = DailySeries(("Used",))
+    for day in range(days):
+        series.append({"DateFrom": FIRST + day - 1, "DateTo": FIRST + day, "Used": float(day % 7)})
+    return series
+
+
+def test_full_and_window():
+    series = _series(40)
+    full = build_attribute_data(series, "Used", ATTRIBUTE_MODE_FULL, 31, 60)
+    assert len(full) == 40
+    assert full[0] == {"date": series.format_date(FIRST), "value": 0.0}
+    assert build_attribute_data(series, "Used", ATTRIBUTE_MODE_WINDOW, 31, 60) == full[-31:]
+
+
+def test_downsample_keeps_short_series():
+    series = _series(40)
+    full = build_attribute_data(series, "Used", ATTRIBUTE_MODE_FULL, 31, 60)
+    assert build_attribute_data(series, "Used", ATTRIBUTE_MODE_DOWNSAMPLE, 31, 60) == full
+    downsampled = build_attribute_data(series, "Used", ATTRIBUTE_MODE_DOWNSAMPLE, 31, 10)
+    assert len(downsampled) == 10
+    assert downsampled[0] == full[0] and downsampled[-1] == full[-1]
+
+
+def test_compact():
+    series = _series(3)
+    assert build_attribute_data(series, "Used", ATTRIBUTE_MODE_COMPACT, 31, 60) == \
+           {"start": "2024-01-01", "values": [0.0, 1.0, 2.0]}
+    assert compact([FIRST, FIRST + 2], [1.0, 3.0]) == {"start": "2024-01-01", "values": [1.0, None, 3.0]}
+    assert compact([], []) == {"start": None, "values": []}
+
+
+def test_downsample_indices_keep_the_peaks():
+    x = list(range(100))
+    y = [0.0] * 100
+    y[37] = 10.0
+    y[71] = -10.0
+    indices = downsample_indices(x, y, 10)
+    assert len(indices) == 10
+    assert indices == sorted(indices)
+    assert indices[0] == 0 and indices[-1] == 99
+    assert 37 in indices and 71 in indices
+
+
+def test_downsample_indices_edge_cases():
+    assert downsample_indices([0, 1, 2], [0, 1, 2], 5) == [0, 1, 2]
+    assert downsample_indices(list(range(10)), list(range(10)), 2) == [0, 9]
+    assert downsample_indices(list(range(10)), list(range(10)), 0) == []
@@ -0,0 +1,73 @@
+import pytest
+
+from pyeforsyning import billing
+from pyeforsyning.billing import (BillingClassifier, BillingRule, DEFAULT_BILLING_RULES, classify_billing_lines,
+                                  get_billing_classifier)
+from pyeforsyning.synthetic import BILLING_LAYOUTS, synthetic_billing_result, synthetic_heating_result
+
+
+def line(line_type, tekst="", ialt="", units="", unit=""):
+    return {"linieType": line_type, "tekst": tekst, "ialt": ialt, "antalEnheder": units, "enhed": unit}
+
+
+@pytest.mark.parametrize("layout", BILLING_LAYOUTS)
+def test_synthetic_layouts_are_fully_classified(layout):
+    result = synthetic_billing_result(synthetic_heating_result(100), layout)
+    totals, unmatched = classify_billing_lines(result["faktlini"], BillingClassifier(DEFAULT_BILLING_RULES))
+    assert unmatched == []
+    assert totals.amount_total == pytest.approx(totals.amount_advance + totals.amount_remaining)
+    assert totals.energy_total_used > 0 and totals.energy_prognosis > 0
+    assert totals.m3_total_used > 0 and totals.m3_price > 0
+
+
+def test_first_matching_rule_wins():
+    classifier = BillingClassifier(DEFAULT_BILLING_RULES)
+    assert classifier.classify(line("3", "Afkøling")).action == "ignore"
+    assert classifier.classify(line("3", "Prognose: 01.05.2024 til 30.04.2025")).action == "prognosis"
+    assert classifier.classify(line("3", "MWh")).action == "consumption"
+    assert classifier.classify(line("18", "Restance")).action == "ignore"
+    assert classifier.classify(line("18", "Tidl. opkrævet (incl. moms)")).action == "advance_payment"
+
+
+def test_exact_rules_match_the_whole_text():
+    classifier = BillingClassifier(DEFAULT_BILLING_RULES)
+    assert classifier.classify(line("12", "Samlet varmeforbrug")).action == "energy_amount"
+    assert classifier.classify(line("12", "Samlet varmeforbrug i alt")) is None
+
+
+def test_unmatched_lines_are_returned():
+    lines = [line("12", "Total (incl.moms)", "1.234,50"), line("99", "Ukendt"), line("12", "Noget andet")]
+    totals, unmatched = classify_billing_lines(lines, BillingClassifier(DEFAULT_BILLING_RULES))
+    assert totals.amount_total == 1234.5
+    assert unmatched == lines[1:]
+
+
+def test_refund_and_payment_due_signs():
+    classifier = BillingClassifier(DEFAULT_BILLING_RULES)
+    totals, _ = classify_billing_lines([line("12", "Til udbetaling ", "100,00")], classifier)
+    assert totals.amount_remaining == -100.0
+    totals, _ = classify_billing_lines([line("12", "Til indbetaling ", "100,00")], classifier)
+    assert totals.amount_remaining == 100.0
+
+
+def test_consumption_lines_give_the_average_price():
+    lines = [line("3", "MWh", "500,00", "1,000", "MWh"), line("3", "MWh", "1.100,00", "2,000", "MWh")]
+    totals, _ = classify_billing_lines(lines, BillingClassifier(DEFAULT_BILLING_RULES))
+    assert totals.energy_total_used == 3000.0
+    assert totals.energy_price == pytest.approx(533.33)
+
+
+def test_unknown_action_is_rejected():
+    with pytest.raises(ValueError):
+        BillingClassifier((BillingRule("12", "no_such_action"),))
+
+
+def test_supplier_rules_are_tried_first(monkeypatch):
+    monkeypatch.setattr(billing, "_classifiers", {})
+    monkeypatch.setitem(billing.SUPPLIER_BILLING_RULES, "supplier",
+                        (BillingRule("12", "total_amount", ("I alt inkl. moms",)),))
+    record = line("12", "I alt inkl. moms")
+    classifier = get_billing_classifier("supplier")
+    assert classifier is get_billing_classifier("supplier")
+    assert classifier.classify(record).action == "total_amount"
+    assert get_billing_classifier("other").classify(record) is None
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+
+from pyeforsyning.eforsyning import AsyncEforsyning, Eforsyning
+from pyeforsyning.fakeserver import FakeEforsyningServer
+
+
+def test_requests_share_pooled_connections():
+    async def run():
+        async with FakeEforsyningServer() as server:
+            api = AsyncEforsyning("user", "secret", "supplier", False, False, base_url=server.base_url)
+            try:
+                assert await api.authenticate()
+                first = await api.get_latest()
+                second = await api.get_latest()
+                return first, second, api.connection_stats
+            finally:
+                await api.close()
+
+    first, second, stats = asyncio.run(run())
+    assert first["data"] == second["data"]
+    assert stats["requests"] > 5
+    assert stats["connections"] < stats["requests"]
+
+
+class _ServerThread:
+    """A fake server on its own thread and event loop, for the synchronous client."""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self.server = FakeEforsyningServer()
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self._loop).result(10)
+        return self.server
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop.close()
+
+
+def test_sequential_synchronous_clients():
+    # Each Eforsyning runs on its own event loop, while the scheduler of the host is shared
+    with _ServerThread() as server:
+        results = []
+        for _ in range(2):
+            api = Eforsyning("user", "secret", "supplier", False, False, base_url=server.base_url)
+            try:
+                assert api.authenticate()
+                results.append(api.get_latest())
+            finally:
+                api.close()
+    assert results[0]["data"] == results[1]["data"]
+    assert len(results[0]["data"]) > 0
+
+
+def test_concurrent_update_equals_the_sequential_one():
+    latency = 0.2
+
+    async def run(max_concurrency):
+        async with FakeEforsyningServer(latency=latency) as server:
+            api = AsyncEforsyning("user", "secret", "supplier", False, False, base_url=server.base_url,
+                                  history_years=2, max_concurrency=max_concurrency)
+            try:
+                assert await api.authenticate()
+                started = time.monotonic()
+                result = await api.get_latest()
+                return result, time.monotonic() - started
+            finally:
+                await api.close()
+
+    sequential, sequential_seconds = asyncio.run(run(1))
+    concurrent, concurrent_seconds = asyncio.run(run(4))
+    # The billing date is the time of the update
+    sequential["billing"].pop("Date")
+    concurrent["billing"].pop("Date")
+    assert concurrent == sequential
+    # The years, the daily data and the billing are fetched together instead of one by one
+    assert concurrent_seconds < sequential_seconds - 2 * latency
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import date
+
+from pyeforsyning.eforsyning import AsyncEforsyning, _DailySeriesSync, HEATING_SERIES_FIELDS
+from pyeforsyning.fakeserver import FakeEforsyningServer, SyntheticData
+from pyeforsyning.series import DailySeries, DATE_FORMAT_DAY
+from pyeforsyning.synthetic import synthetic_heating_result
+
+
+def _api():
+    return AsyncEforsyning("", "", "", False, False)
+
+
+def _sync(api, result, series, resume=True):
+    sync = _DailySeriesSync(series, api._parse_heating_lines, HEATING_SERIES_FIELDS, DATE_FORMAT_DAY, resume)
+    sync.add_lines(result["ForbrugsLinjer"]["TForbrugsLinje"])
+    return sync
+
+
+def test_series_round_trips_and_slices():
+    data = _api()._parse_result_heating(synthetic_heating_result(30))["data"]
+    assert len(data) == 30
+    assert DailySeries.from_dict(data.as_dict()) == data
+    assert data[1:3].to_rows() == data.to_rows()[1:3]
+    assert data[-1]["DateTo"] == list(data)[-1]["DateTo"]
+
+
+def test_resumed_sync_equals_a_full_parse():
+    api = _api()
+    series = {}
+    api._parse_result_heating(synthetic_heating_result(100), series)
+    longer = synthetic_heating_result(101)
+    resumed = api._parse_result_heating(longer, series)
+    assert series["seed_index"] > 0
+    assert resumed["data"] == api._parse_result_heating(longer)["data"]
+    assert {key: value for key, value in resumed.items() if key != "data"} == \
+           {key: value for key, value in api._parse_result_heating(longer).items() if key != "data"}
+
+
+def test_sync_reports_new_and_revised_days_only():
+    api = _api()
+    series = {}
+    result = synthetic_heating_result(60)
+    sync = _sync(api, result, series)
+    sync.finish(result["AarStart"])
+    assert sync.changed
+
+    # The same lines again
+    sync = _sync(api, result, series)
+    sync.finish(result["AarStart"])
+    assert not sync.changed
+
+    # A revised day within the revision window
+    line = result["ForbrugsLinjer"]["TForbrugsLinje"][-2]
+    line["Tempfrem"] = "99,9"
+    sync = _sync(api, result, series)
+    sync.finish(result["AarStart"])
+    assert sync.changed
+
+    # One day more
+    longer = synthetic_heating_result(61)
+    sync = _sync(api, longer, series)
+    sync.finish(longer["AarStart"])
+    assert sync.changed
+
+
+def test_revisions_count_only_changed_data():
+    data = SyntheticData(years=3, today=date(2024, 6, 1))
+
+    async def run():
+        async with FakeEforsyningServer(data) as server:
+            api = AsyncEforsyning("user", "password", "supplier", False, False, base_url=server.base_url)
+            try:
+                assert await api.authenticate()
+                await api.get_latest_all()
+                first = api.revisions
+                await api.get_latest_all()
+                unchanged = api.revisions
+                data._today = date(2024, 6, 2)
+                await api.get_latest_all()
+                return first, unchanged, api.revisions
+            finally:
+                await api.close()
+
+    first, unchanged, new_day = asyncio.run(run())
+    # Two closed years were cached and the daily series was synced
+    assert first == {"year_totals": 2, "daily_series": 1}
+    assert unchanged == first
+    assert new_day == {"year_totals": 2, "daily_series": 2}
@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.eforsyning import diagnostics
+from custom_components.eforsyning.const import DOMAIN
+from pyeforsyning.eforsyning import AsyncEforsyning
+from pyeforsyning.fakeserver import FakeEforsyningServer
+
+REDACTED = "**REDACTED**"
+
+
+def test_token_lifetimes_survive_the_redaction(monkeypatch):
+    monkeypatch.setattr(diagnostics, "_attribute_sizes", lambda hass, entry: {})
+    entry = SimpleNamespace(entry_id="entry", title="eforsyning",
+                            data={"username": "user", "password": "secret", "supplierid": "supplier"}, options={})
+
+    async def run():
+        async with FakeEforsyningServer(token_lifetime=0.2) as server:
+            api = AsyncEforsyning("user", "secret", "supplier", False, False, base_url=server.base_url)
+            try:
+                assert await api.authenticate()
+                data = await api.get_latest_all()
+                await asyncio.sleep(0.3)
+                data = await api.get_latest_all()
+                coordinator = SimpleNamespace(api=api, data=data, last_update_success=True, update_interval=None)
+                hass = SimpleNamespace(data={DOMAIN: {entry.entry_id: {"coordinator": coordinator}}})
+                return await diagnostics.async_get_config_entry_diagnostics(hass, entry), api.token_stats
+            finally:
+                await api.close()
+
+    result, token_stats = asyncio.run(run())
+    assert result["entry"]["data"]["username"] == REDACTED
+    assert result["entry"]["data"]["password"] == REDACTED
+    assert result["token_stats"]["logins"] == token_stats["logins"] == 2
+    assert result["token_stats"]["reauthentications"] == 1
+    assert len(result["token_stats"]["token_lifetimes"]) == 1
+    assert result["token_stats"]["average_token_lifetime"] is not None
@@ -0,0 +1,94 @@
+import asyncio
+
+from pyeforsyning.eforsyning import AsyncEforsyning
+from pyeforsyning.fakeserver import FakeEforsyningServer
+from pyeforsyning.metadata import EforsyningMetadata
+
+PASSWORDS = {"user": "secret"}
+
+
+def _run(test, **server_options):
+    async def run():
+        async with FakeEforsyningServer(passwords=PASSWORDS, **server_options) as server:
+            return await test(server)
+    return asyncio.run(run())
+
+
+def _cached_metadata(api_server):
+    metadata = EforsyningMetadata(api_server=api_server)
+    metadata.mark_fetched("api_server")
+    return metadata
+
+
+def test_login_and_rejected_password():
+    async def test(server):
+        api = AsyncEforsyning("user", "secret", "supplier", False, False, base_url=server.base_url)
+        wrong = AsyncEforsyning("user", "wrong", "supplier", False, False, base_url=server.base_url)
+        try:
+            return await api.authenticate(), api.is_authenticated, await wrong.authenticate(), wrong.metrics.summary()
+        finally:
+            await api.close()
+            await wrong.close()
+
+    ok, authenticated, rejected, metrics = _run(test)
+    assert ok and authenticated
+    assert not rejected
+    assert metrics["failed_logins"] == 1
+
+
+def test_rejected_password_does_not_fetch_the_api_server_again():
+    async def test(server):
+        first = AsyncEforsyning("user", "secret", "supplier", False, False, base_url=server.base_url)
+        try:
+            assert await first.authenticate()
+        finally:
+            await first.close()
+        server.requests.clear()
+        api = AsyncEforsyning("user", "wrong", "supplier", False, False, base_url=server.base_url,
+                              metadata=_cached_metadata(first.metadata.api_server))
+        try:
+            assert not await api.authenticate()
+            return dict(server.requests), api.metadata.is_fresh("api_server")
+        finally:
+            await api.close()
+
+    requests, fresh = _run(test)
+    # One login sequence only, against the cached API server
+    assert requests == {"getsecuritytoken": 1, "login": 1}
+    assert fresh
+
+
+def test_moved_api_server_is_fetched_again():
+    async def test(server):
+        # Nothing listens on the discard port
+        api = AsyncEforsyning("user", "secret", "supplier", False, False, base_url=server.base_url,
+                              metadata=_cached_metadata("http://127.0.0.1:9/"))
+        try:
+            return await api.authenticate(), api.metadata.api_server, server.base_url
+        finally:
+            await api.close()
+
+    ok, api_server, base_url = _run(test)
+    assert ok
+    assert api_server.startswith(base_url)
+
+
+def test_expired_token_logs_in_again_once():
+    async def test(server):
+        api = AsyncEforsyning("user", "secret", "supplier", False, False, base_url=server.base_url)
+        try:
+            assert await api.authenticate()
+            await api.get_latest_all()
+            await asyncio.sleep(0.3)
+            latest = await api.get_latest_all()
+            return latest, api.token_stats, api.metrics.summary(), dict(server.faults)
+        finally:
+            await api.close()
+
+    latest, token_stats, metrics, faults = _run(test, token_lifetime=0.2)
+    assert all(data is not None for data in latest.values())
+    assert token_stats["logins"] == 2
+    assert token_stats["reauthentications"] == 1
+    assert len(token_stats["token_lifetimes"]) == 1
+    assert metrics["reauthentications"] == 1
+    assert faults["tokens_expired"] >= 1
@@ -0,0 +1,27 @@
+from pyeforsyning.metadata import EforsyningMetadata
+
+
+def test_dict_round_trip_is_a_copy():
+    metadata = EforsyningMetadata(api_server="https://api.example/", latest_year=2024,
+                                  installations=[{"installation_id": "1", "asset_id": "2"}])
+    metadata.mark_fetched("api_server")
+    stored = metadata.to_dict()
+    assert EforsyningMetadata.from_dict(stored) == metadata
+
+    # Changing the metadata does not change what was handed out, so a change can be told apart
+    metadata.mark_fetched("user_info")
+    metadata.installations.append({"installation_id": "3", "asset_id": "4"})
+    assert stored != metadata.to_dict()
+    loaded = EforsyningMetadata.from_dict(stored)
+    loaded.mark_fetched("installation")
+    assert "installation" not in stored["fetched"]
+
+
+def test_unknown_keys_are_ignored_and_sections_go_stale():
+    metadata = EforsyningMetadata.from_dict({"api_server": "https://api.example/", "removed_field": 1})
+    assert metadata.api_server == "https://api.example/"
+    assert not metadata.is_fresh("api_server")
+    metadata.mark_fetched("api_server")
+    assert metadata.is_fresh("api_server")
+    metadata.invalidate("api_server")
+    assert not metadata.is_fresh("api_server")
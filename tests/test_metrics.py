@@ -0,0 +1,92 @@
+import math
+
+import pytest
+
+from pyeforsyning.metrics import EforsyningMetrics, MetricsRegistry
+
+
+def test_counter_totals_over_labels():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests", "Requests", ("endpoint", "status"))
+    requests.inc(endpoint="a", status=200)
+    requests.inc(2, endpoint="a", status=500)
+    requests.inc(endpoint="b", status=200)
+    assert requests.value(endpoint="a", status=500) == 2
+    assert requests.total(endpoint="a") == 3
+    assert requests.total(status=200) == 2
+    assert requests.total() == 4
+
+
+def test_labels_must_match():
+    counter = MetricsRegistry().counter("requests", "Requests", ("endpoint",))
+    with pytest.raises(ValueError):
+        counter.inc(status=200)
+
+
+def test_registering_a_name_again_returns_the_metric():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests", "Requests")
+    assert registry.counter("requests", "Requests") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("requests", "Requests")
+
+
+def test_histogram_buckets_count_and_sum():
+    histogram = MetricsRegistry().histogram("latency", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.buckets == (0.1, 1.0, math.inf)
+    assert histogram.count() == 4
+    assert histogram.sum() == pytest.approx(6.05)
+    assert histogram.mean() == pytest.approx(6.05 / 4)
+    assert MetricsRegistry().histogram("empty", "Empty").mean() is None
+
+
+def test_openmetrics_format():
+    registry = MetricsRegistry()
+    registry.counter("logins", "Logins", ("result",)).inc(result="ok")
+    registry.counter("unused", "Not incremented")
+    registry.gauge("last", "Last \"update\"").set(1.5)
+    registry.histogram("latency", "Latency", ("endpoint",), (0.1, 1.0)).observe(0.5, endpoint="a")
+    text = registry.openmetrics()
+    lines = text.splitlines()
+    assert text.endswith("# EOF\n")
+    assert "# TYPE logins counter" in lines
+    assert 'logins_total{result="ok"} 1' in lines
+    assert "unused_total 0" in lines
+    assert '# HELP last Last \\"update\\"' in lines
+    assert "last 1.5" in lines
+    assert 'latency_bucket{endpoint="a",le="0.1"} 0' in lines
+    assert 'latency_bucket{endpoint="a",le="1.0"} 1' in lines
+    assert 'latency_bucket{endpoint="a",le="+Inf"} 1' in lines
+    assert 'latency_count{endpoint="a"} 1' in lines
+    assert 'latency_sum{endpoint="a"} 0.5' in lines
+
+
+def test_summary_by_endpoint():
+    metrics = EforsyningMetrics()
+    metrics.record_request("getforbrug", 200, 0.2, 1000)
+    metrics.record_request("getforbrug", 500, 0.4, 100)
+    metrics.record_request("login", "timeout", 0.6)
+    metrics.record_login(True)
+    metrics.record_login(False)
+    metrics.record_parse("data", 0.002)
+    metrics.record_update(True, 1.23456, 3)
+    summary = metrics.summary()
+    assert summary["requests"] == 3
+    assert summary["failed_requests"] == 2
+    assert summary["mean_latency_ms"] == pytest.approx(400.0)
+    assert summary["response_bytes"] == 1100
+    assert (summary["logins"], summary["failed_logins"]) == (1, 1)
+    assert summary["updates"] == 1
+    assert summary["last_update_seconds"] == 1.235
+    assert summary["last_update_requests"] == 3
+    assert summary["endpoints"]["getforbrug"] == {"requests": 2, "failed": 1, "mean_ms": 300.0, "bytes": 1100}
+    assert summary["parse_ms"] == {"data": 2.0}
+
+
+def test_empty_summary():
+    summary = EforsyningMetrics().summary()
+    assert summary["requests"] == 0
+    assert summary["mean_latency_ms"] is None
+    assert summary["endpoints"] == {}
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.eforsyning.const import (FAIR_USE_MIN_INTERVAL, POLL_CATCH_UP_INTERVAL,
+                                                POLL_CATCH_UP_MAX_INTERVAL, POLL_LEARNING_INTERVAL,
+                                                POLL_PUBLISH_MARGIN)
+from custom_components.eforsyning.polling import PublishTimeEstimator
+
+DAY = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def at(days, hours, minutes=0):
+    return DAY + timedelta(days=days, hours=hours, minutes=minutes)
+
+
+def test_learning_until_a_publish_time_is_seen():
+    estimator = PublishTimeEstimator()
+    estimator.observe("01-03-2024", at(0, 5))
+    assert estimator.publish_time(at(0, 5)) is None
+    assert estimator.next_interval(at(0, 5)) == POLL_LEARNING_INTERVAL
+
+
+def test_publish_time_is_bracketed_by_polls_and_the_next_poll_is_tomorrow():
+    estimator = PublishTimeEstimator()
+    estimator.observe("01-03-2024", at(0, 5))
+    estimator.observe("01-03-2024", at(1, 6))
+    estimator.observe("02-03-2024", at(1, 8))
+    # Published between 06:00 and 08:00
+    assert estimator.publish_time(at(1, 8)) == at(1, 7)
+    assert estimator.next_interval(at(1, 8)) == at(2, 7) + POLL_PUBLISH_MARGIN - at(1, 8)
+
+
+def test_late_data_is_polled_with_back_off():
+    estimator = PublishTimeEstimator()
+    estimator.observe("01-03-2024", at(0, 6))
+    estimator.observe("02-03-2024", at(1, 8))
+    intervals = []
+    for hours in (8, 9, 10, 11):
+        estimator.observe("02-03-2024", at(2, hours))
+        intervals.append(estimator.next_interval(at(2, hours)))
+    assert intervals == [POLL_CATCH_UP_INTERVAL, 2 * POLL_CATCH_UP_INTERVAL,
+                         4 * POLL_CATCH_UP_INTERVAL, 8 * POLL_CATCH_UP_INTERVAL]
+
+
+def test_failed_polls_are_retried_soon_with_back_off():
+    estimator = PublishTimeEstimator()
+    estimator.observe("01-03-2024", at(0, 6))
+    estimator.observe("02-03-2024", at(1, 8))
+    # A good poll plans most of a day ahead
+    assert estimator.next_interval(at(1, 8)) > timedelta(hours=20)
+    intervals = [estimator.failed() for _ in range(12)]
+    assert intervals[0] == max(POLL_CATCH_UP_INTERVAL, FAIR_USE_MIN_INTERVAL)
+    assert intervals[1] == 2 * intervals[0]
+    assert max(intervals) == POLL_CATCH_UP_MAX_INTERVAL
+    # A good poll resets the back off
+    estimator.observe("03-03-2024", at(2, 8))
+    assert estimator.failed() == intervals[0]
+
+
+def test_state_round_trips():
+    estimator = PublishTimeEstimator()
+    estimator.observe("01-03-2024", at(0, 6))
+    estimator.observe("02-03-2024", at(1, 8))
+    restored = PublishTimeEstimator(estimator.as_dict())
+    assert restored.as_dict() == estimator.as_dict()
+    assert restored.next_interval(at(1, 9)) == estimator.next_interval(at(1, 9))
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import time
+from datetime import date
+
+from pyeforsyning import scheduler
+
+
+def _acquire(host, endpoint, count):
+    async def run():
+        await asyncio.gather(*(scheduler.get_scheduler(host).acquire(endpoint) for _ in range(count)))
+    asyncio.run(run())
+
+
+def test_scheduler_is_shared_per_host():
+    assert scheduler.get_scheduler("a.example") is scheduler.get_scheduler("a.example")
+    assert scheduler.get_scheduler("a.example") is not scheduler.get_scheduler("b.example")
+
+
+def test_two_event_loops_one_after_the_other():
+    # Like two sync Eforsyning objects, or two asyncio.run() calls, in one process
+    scheduler.configure(burst=1)
+    _acquire("api.example", "getforbrug", 3)
+    _acquire("api.example", "getforbrug", 3)
+    assert scheduler.get_scheduler("api.example").usage()["endpoints"] == {"getforbrug": 6}
+
+
+def test_token_bucket_spreads_requests():
+    bucket = scheduler.TokenBucket(rate=50, capacity=2)
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(7)))
+        return time.monotonic() - start
+
+    # Two from the burst, then five more at 50 per second
+    assert asyncio.run(run()) >= 0.09
+    assert bucket.waiting == 0
+
+
+def test_ledger_counts_per_endpoint_and_warns_over_budget(caplog):
+    scheduler.configure(daily_budget=3)
+    with caplog.at_level(logging.WARNING):
+        _acquire("api.example", "login", 2)
+        _acquire("api.example", "getforbrug", 3)
+    usage = scheduler.get_scheduler("api.example").usage()
+    assert usage["calls_today"] == 5
+    assert usage["endpoints"] == {"login": 2, "getforbrug": 3}
+    assert [record.message for record in caplog.records].count(
+        "More than 3 calls to api.example today.  Consider polling less often to avoid an IP-ban.") == 1
+
+
+def test_ledgers_are_loaded_before_and_after_the_scheduler_exists():
+    today = date.today().isoformat()
+    scheduler.load_ledgers({"late.example": {today: {"login": 4}}})
+    assert scheduler.ledgers() == {"late.example": {today: {"login": 4}}}
+    _acquire("late.example", "login", 1)
+    # The largest count seen is kept
+    assert scheduler.get_scheduler("late.example").ledger == {today: {"login": 5}}
+    scheduler.load_ledgers({"late.example": {today: {"login": 2, "getforbrug": 1}}})
+    assert scheduler.ledgers()["late.example"] == {today: {"login": 5, "getforbrug": 1}}
+
+
+def test_ledger_keeps_the_last_days():
+    scheduler_ = scheduler.get_scheduler("api.example")
+    scheduler_.load_ledger({f"2020-01-{day:02}": {"login": 1} for day in range(1, 11)})
+    _acquire("api.example", "login", 1)
+    assert len(scheduler_.ledger) == scheduler.LEDGER_DAYS
+    assert date.today().isoformat() in scheduler_.ledger
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.eforsyning import statistics
+from custom_components.eforsyning.pyeforsyning.eforsyning import AsyncEforsyning
+from custom_components.eforsyning.pyeforsyning.metadata import EforsyningMetadata
+from custom_components.eforsyning.pyeforsyning.synthetic import synthetic_heating_result
+
+
+class FakeStore:
+    def __init__(self):
+        self.data = {}
+        self.sets = 0
+
+    def get(self, section, default=None):
+        return self.data.get(section, default)
+
+    def set(self, section, value):
+        self.data[section] = value
+        self.sets += 1
+
+
+def _series(days):
+    return AsyncEforsyning("", "", "", False, False)._parse_result_heating(synthetic_heating_result(days))["data"]
+
+
+def test_unchanged_data_is_not_imported_again(monkeypatch):
+    imported = []
+    monkeypatch.setattr(statistics, "async_add_external_statistics",
+                        lambda hass, metadata, data: imported.append((metadata["statistic_id"], len(data))))
+    hass = SimpleNamespace(config=SimpleNamespace(components={"recorder"}))
+    entry = SimpleNamespace(data={"is_water_supply": False, "username": "user", "supplierid": "supplier",
+                                  "entityname": "eforsyning"})
+    store = FakeStore()
+    api = SimpleNamespace(metadata=EforsyningMetadata(first_year=2020, latest_year=2020))
+    importer = statistics.EforsyningStatistics(hass, entry, store, "1-1")
+
+    series = _series(30)
+    asyncio.run(importer.async_update(api, {"data": series}))
+    assert len(imported) == len(statistics.HEATING_STATISTICS)
+    assert store.sets == 1
+
+    # The API returns the same series object when the data is unchanged
+    asyncio.run(importer.async_update(api, {"data": series}))
+    assert len(imported) == len(statistics.HEATING_STATISTICS)
+    assert store.sets == 1
+
+    # A new day imports the revision window and the new day
+    asyncio.run(importer.async_update(api, {"data": _series(31)}))
+    assert len(imported) == 2 * len(statistics.HEATING_STATISTICS)
+    assert imported[-1][1] == statistics.SERIES_REVISION_WINDOW + 1
+    assert store.sets == 2